@@ -16,6 +16,19 @@ python manage.py makemigrations
 echo "🔄 Aplicando migrações..."
 python manage.py migrate --fake-initial
 
+echo "🔄 Reconstruindo snapshot do inventário..."
+python manage.py reconstruir_inventario
+
+# Também roda a cada COMPACTAR_A_CADA gravações no livro de movimentos
+echo "📒 Compactando o livro de movimentos de estoque..."
+python manage.py compactar_estoque
+
+echo "🖼️ Gerando miniaturas que faltam..."
+python manage.py gerar_miniaturas
+
+echo "🔎 Reindexando a busca global..."
+python manage.py reindexar_busca
+
 
 # Cria superusuário automaticamente (se não existir)
 #echo "👤 Criando superusuário padrão (se não existir)..."
@@ -1,5 +1,8 @@
+from django import forms
 from django.contrib import admin
+from django.db import transaction
 from .models import Operador, Cliente, Material, Emprestimo, EmprestimoMaterial, Categoria, EmprestimoHistorico, Case, Assinante, FuncaoAssinante, ProntoArmamento
+from .services import recalcular_inventario, chave_inventario, registrar_entrada
 
 
 @admin.register(Operador)
@@ -17,12 +20,67 @@ class CategoriaAdmin(admin.ModelAdmin):
     list_display = ('nome', 'descricao')
 
 
+class MaterialAdminForm(forms.ModelForm):
+    # Entrada inicial no livro de movimentos (só no cadastro)
+    quantidade_inicial = forms.IntegerField(
+        min_value=0, required=False, initial=0,
+        help_text='Materiais com registro entram sempre com 1.')
+
+    class Meta:
+        model = Material
+        fields = '__all__'
+
+
 @admin.register(Material)
 class MaterialAdmin(admin.ModelAdmin):
-    list_display = ('nome', 'categoria', 'registro', 'quantidade_total',
-                    'quantidade_disponivel', 'quantidade_emprestada')
+    form = MaterialAdminForm
+    list_display = ('nome', 'categoria', 'registro', 'saldo_total',
+                    'saldo_disponivel', 'saldo_emprestada')
     list_filter = ('categoria',)
     search_fields = ('nome', 'registro')
+    # O saldo só muda pelo livro de movimentos (MovimentoEstoque)
+    readonly_fields = ('quantidade_total', 'quantidade_disponivel',
+                       'quantidade_emprestada', 'movimento_compactado')
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).com_saldo()
+
+    @admin.display(description='Quantidade total', ordering='saldo_total')
+    def saldo_total(self, obj):
+        return obj.saldo_total
+
+    @admin.display(description='Disponível', ordering='saldo_disponivel')
+    def saldo_disponivel(self, obj):
+        return obj.saldo_disponivel
+
+    @admin.display(description='Emprestada', ordering='saldo_emprestada')
+    def saldo_emprestada(self, obj):
+        return obj.saldo_emprestada
+
+    def get_fields(self, request, obj=None):
+        fields = super().get_fields(request, obj)
+        if obj is not None:
+            fields = [campo for campo in fields if campo != 'quantidade_inicial']
+        return fields
+
+    @transaction.atomic
+    def save_model(self, request, obj, form, change):
+        """
+        Registra a entrada inicial de um material novo, como o cadastro pelo
+        sistema, e mantém o InventarioSnapshot em dia com o cadastro.
+        """
+        chaves = [chave_inventario(obj)]
+        if change:
+            chaves.append(chave_inventario(Material.objects.get(pk=obj.pk)))
+        obj.save()
+        if not change:
+            registrar_entrada(obj, form.cleaned_data.get('quantidade_inicial'))
+        recalcular_inventario(chaves)
+
+    def delete_model(self, request, obj):
+        chave = chave_inventario(obj)
+        obj.delete()
+        recalcular_inventario([chave])
 
 
 # Inline para Materiais no Empréstimo
@@ -45,6 +103,7 @@ class EmprestimoAdmin(admin.ModelAdmin):
     list_display = ('cliente', 'operador', 'destino',
                     'data_emprestimo', 'data_devolucao', 'isAtiva')
     list_filter = ('isAtiva',)
+    list_select_related = ('cliente', 'operador')
     search_fields = ('cliente__nome', 'operador__user__username', 'destino')
     inlines = [EmprestimoMaterialInline, EmprestimoHistoricoInline]
 
@@ -57,6 +116,12 @@ class EmprestimoAdmin(admin.ModelAdmin):
         else:
             status = 'Ativado'
 
+        # Materiais e chaves do inventário antes das alterações nos itens
+        itens = list(obj.emprestimomaterial_set.select_related(
+            'material')) if change else []
+        obj._materiais_antes = {item.material_id for item in itens}
+        obj._chaves_inventario = {chave_inventario(item.material) for item in itens}
+
         obj.save()
         EmprestimoHistorico.objects.create(
             emprestimo=obj,
@@ -65,6 +130,23 @@ class EmprestimoAdmin(admin.ModelAdmin):
                 request.user, 'operador') else None
         )
 
+    def save_related(self, request, form, formsets, change):
+        """
+        Depois que os itens da cautela são salvos, registra no livro o ajuste
+        dos materiais que entraram, saíram ou mudaram e recalcula o
+        InventarioSnapshot.
+        """
+        super().save_related(request, form, formsets, change)
+        obj = form.instance
+        itens = list(obj.emprestimomaterial_set.select_related('material'))
+        Material.objects.filter(
+            id__in=getattr(obj, '_materiais_antes', set()) |
+            {item.material_id for item in itens}
+        ).recalcular_saldos()
+        chaves = getattr(obj, '_chaves_inventario', set())
+        chaves |= {chave_inventario(item.material) for item in itens}
+        recalcular_inventario(chaves)
+
 
 @admin.register(Case)
 class CaseAdmin(admin.ModelAdmin):
@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def garantir_indices_busca(sender, using, **kwargs):
+    from django.db import connections
+    from .busca import instalar_indices_busca
+
+    conexao = connections[using]
+    if conexao.vendor == 'sqlite':
+        instalar_indices_busca(conexao)
 
 
 class GuardiaoConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'guardiao'
+
+    def ready(self):
+        # A reconstrução de tabelas do SQLite descarta os gatilhos da busca
+        post_migrate.connect(garantir_indices_busca, sender=self)
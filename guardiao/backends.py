@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+
+def chave_usuario(user_id):
+    return f"usuario-operador:{user_id}"
+
+
+def invalidar_usuario(user_id):
+    """
+    Descarta o usuário em cache; a próxima requisição dele relê do banco.
+    """
+    cache.delete(chave_usuario(user_id))
+
+
+class OperadorBackend(ModelBackend):
+    """
+    Autenticação padrão do Django, mas o usuário da sessão vem com o
+    operador por select_related: middleware, decorador e templates leem
+    `user.operador` sem consulta extra. Com OPERADOR_CACHE_TTL > 0 o par
+    fica no cache por alguns segundos e a requisição só consulta a sessão.
+    """
+
+    def get_user(self, user_id):
+        ttl = settings.OPERADOR_CACHE_TTL
+        user = cache.get(chave_usuario(user_id)) if ttl else None
+        if user is None:
+            user = get_user_model()._default_manager.select_related(
+                'operador').filter(pk=user_id).first()
+            if user is None:
+                return None
+            if ttl:
+                cache.set(chave_usuario(user_id), user, ttl)
+        return user if self.user_can_authenticate(user) else None
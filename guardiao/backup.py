@@ -0,0 +1,227 @@
+import gzip
+import json
+import os
+from contextlib import contextmanager
+from datetime import datetime, time
+from itertools import islice
+
+from django.apps import apps
+from django.contrib.auth.models import Group, User
+from django.core import serializers
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+FORMATO = 'guardiao-backup'
+VERSAO_FORMATO = 1
+TAMANHO_LOTE = 1000
+
+# Derivados, reconstruídos depois da restauração (reindexar_busca)
+MODELOS_IGNORADOS = {'guardiao.documentobusca'}
+
+
+def modelos_backup():
+    """
+    Modelos incluídos no backup, com cada modelo depois dos que ele
+    referencia por chave estrangeira (a ordem em que são restaurados).
+    """
+    modelos = [Group, User] + [
+        modelo for modelo in apps.get_app_config('guardiao').get_models()
+        if modelo._meta.label_lower not in MODELOS_IGNORADOS
+    ]
+    return serializers.sort_dependencies(
+        [(None, modelos)], allow_cycles=True)
+
+
+def _lotes(iteravel, tamanho):
+    iterador = iter(iteravel)
+    while lote := list(islice(iterador, tamanho)):
+        yield lote
+
+
+class _Codificador(DjangoJSONEncoder):
+    # O DjangoJSONEncoder corta horários em milissegundos; aqui vão inteiros
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _linha(dados):
+    return json.dumps(dados, cls=_Codificador, ensure_ascii=False,
+                      separators=(',', ':')) + '\n'
+
+
+def exportar(caminho, tamanho_lote=TAMANHO_LOTE):
+    """
+    Grava o backup em NDJSON comprimido com gzip: um cabeçalho e depois uma
+    linha por registro, modelo a modelo. As linhas são lidas com
+    .iterator() e serializadas em lotes, então a memória não cresce com o
+    banco. O arquivo só aparece com o nome final quando está completo.
+    Retorna {label do modelo: registros}.
+    """
+    modelos = modelos_backup()
+    contagem = {}
+    temporario = f'{caminho}.parcial'
+
+    with gzip.open(temporario, 'wt', encoding='utf-8') as saida:
+        saida.write(_linha({
+            'formato': FORMATO,
+            'versao': VERSAO_FORMATO,
+            'modelos': [modelo._meta.label_lower for modelo in modelos],
+        }))
+        for modelo in modelos:
+            registros = modelo._default_manager.order_by('pk').iterator(
+                chunk_size=tamanho_lote)
+            contagem[modelo._meta.label_lower] = 0
+            for lote in _lotes(registros, tamanho_lote):
+                # Permissões e content types não vão no backup: as referências
+                # a eles (e a usuários/grupos) saem pela chave natural, que
+                # vale em qualquer banco migrado
+                for registro in serializers.serialize(
+                        'python', lote, use_natural_foreign_keys=True):
+                    saida.write(_linha(registro))
+                contagem[modelo._meta.label_lower] += len(lote)
+
+    os.replace(temporario, caminho)
+    return contagem
+
+
+def _ler_checkpoint(caminho):
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return int(arquivo.read().strip() or 0)
+    except FileNotFoundError:
+        return 0
+
+
+def _gravar_checkpoint(caminho, linha):
+    temporario = f'{caminho}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        arquivo.write(str(linha))
+    os.replace(temporario, caminho)
+
+
+@contextmanager
+def _datas_do_backup(modelo):
+    """
+    Desliga auto_now/auto_now_add durante o bulk_create, que senão trocaria
+    as datas gravadas no backup pela hora da restauração.
+    """
+    campos = [
+        (campo, campo.auto_now, campo.auto_now_add)
+        for campo in modelo._meta.concrete_fields
+        if getattr(campo, 'auto_now', False) or getattr(campo, 'auto_now_add', False)
+    ]
+    for campo, _, _ in campos:
+        campo.auto_now = campo.auto_now_add = False
+    try:
+        yield
+    finally:
+        for campo, auto_now, auto_now_add in campos:
+            campo.auto_now, campo.auto_now_add = auto_now, auto_now_add
+
+
+def _gravar_lote(registros, ignorar_conflitos):
+    """
+    Grava um lote de registros de um mesmo modelo. Retorna os objetos com
+    referências que ainda não puderam ser resolvidas.
+    """
+    objetos = list(serializers.deserialize(
+        'python', registros, handle_forward_references=True))
+    modelo = type(objetos[0].object)
+    with _datas_do_backup(modelo):
+        modelo._default_manager.bulk_create(
+            [objeto.object for objeto in objetos],
+            ignore_conflicts=ignorar_conflitos)
+
+    # ManyToMany automáticos (grupos/permissões do usuário) pela tabela
+    # intermediária, também em lote
+    for campo in modelo._meta.many_to_many:
+        intermediaria = campo.remote_field.through
+        if not intermediaria._meta.auto_created:
+            continue
+        origem = campo.m2m_field_name()
+        destino = campo.m2m_reverse_field_name()
+        intermediaria._default_manager.bulk_create([
+            intermediaria(**{f'{origem}_id': objeto.object.pk,
+                             f'{destino}_id': relacionado})
+            for objeto in objetos
+            for relacionado in objeto.m2m_data.get(campo.name, ())
+        ], ignore_conflicts=ignorar_conflitos)
+    return [objeto for objeto in objetos if objeto.deferred_fields]
+
+
+def importar(caminho, tamanho_lote=TAMANHO_LOTE, retomar=False, progresso=None):
+    """
+    Restaura um backup de `exportar` num banco migrado e vazio. Os registros
+    entram com bulk_create em lotes de um mesmo modelo, na ordem do arquivo
+    (dependências primeiro). Cada lote é uma transação e, depois dele, o
+    número da última linha aplicada vai para `<caminho>.checkpoint`; com
+    `retomar` a restauração continua dali. Retorna quantos registros foram
+    gravados.
+    """
+    checkpoint = f'{caminho}.checkpoint'
+    inicio = _ler_checkpoint(checkpoint) if retomar else 0
+    gravados = 0
+    pendentes = []
+    # Ao retomar, o primeiro lote pode ter sido gravado sem checkpoint
+    ignorar_conflitos = retomar
+
+    def aplicar(lote, ultima_linha):
+        nonlocal gravados, ignorar_conflitos
+        with transaction.atomic():
+            pendentes.extend(_gravar_lote(lote, ignorar_conflitos))
+        ignorar_conflitos = False
+        _gravar_checkpoint(checkpoint, ultima_linha)
+        gravados += len(lote)
+        if progresso:
+            progresso(lote[0]['model'], gravados)
+
+    with gzip.open(caminho, 'rt', encoding='utf-8') as entrada:
+        cabecalho = json.loads(next(entrada, '{}'))
+        if cabecalho.get('formato') != FORMATO:
+            raise ValueError(f"{caminho} não é um backup do Guardião.")
+        if cabecalho.get('versao') != VERSAO_FORMATO:
+            raise ValueError(
+                f"Versão de backup {cabecalho.get('versao')} não suportada.")
+        modelos = [apps.get_model(label) for label in cabecalho['modelos']]
+        if not retomar:
+            ocupados = [
+                modelo._meta.label_lower for modelo in modelos
+                if modelo._default_manager.exists()
+            ]
+            if ocupados:
+                raise ValueError(
+                    f"O banco já tem dados em {', '.join(ocupados)}; "
+                    "restaure num banco recém-migrado.")
+
+        lote = []
+        numero = 1
+        for numero, linha in enumerate(entrada, start=2):
+            if numero <= inicio:
+                continue
+            registro = json.loads(linha)
+            if lote and (registro['model'] != lote[0]['model'] or
+                         len(lote) >= tamanho_lote):
+                aplicar(lote, numero - 1)
+                lote = []
+            lote.append(registro)
+        if lote:
+            aplicar(lote, numero)
+
+    # Referências adiadas (como no loaddata); DoesNotExist se ainda faltar
+    with transaction.atomic():
+        for objeto in pendentes:
+            objeto.save_deferred_fields()
+
+    # Chaves gravadas explicitamente: acerta as sequências (Postgres)
+    sequencias = connection.ops.sequence_reset_sql(no_style(), modelos)
+    if sequencias:
+        with connection.cursor() as cursor:
+            for sql in sequencias:
+                cursor.execute(sql)
+
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+    return gravados
@@ -0,0 +1,186 @@
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length, StrIndex
+
+LIMITE_RESULTADOS = 20
+
+# Trigramas exigem pelo menos 3 caracteres; abaixo disso busca por prefixo
+TAMANHO_MINIMO_TRIGRAMA = 3
+
+# Tabelas com coluna nome_busca e o índice de texto de cada uma
+TABELAS_BUSCA = ('guardiao_cliente', 'guardiao_material')
+
+
+def normalizar(texto):
+    """
+    Forma de busca de um texto: minúsculo, sem acentos e com espaços
+    simples ("João  da Silva" -> "joao da silva").
+    """
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', texto)
+    sem_acento = ''.join(c for c in decomposto if not unicodedata.combining(c))
+    return ' '.join(sem_acento.casefold().split())
+
+
+def _tabela_fts(tabela):
+    return f'{tabela}_busca'
+
+
+def filtrar_busca(queryset, termo):
+    """
+    Filtra `queryset` pelo termo em nome_busca e ordena por relevância:
+    ocorrência mais próxima do início primeiro, depois nomes mais curtos.
+    No Postgres o filtro usa o índice de trigramas; no SQLite, a tabela
+    FTS5 com tokenizador trigram.
+    """
+    termo = normalizar(termo)
+    if not termo:
+        return queryset
+
+    if len(termo) < TAMANHO_MINIMO_TRIGRAMA:
+        queryset = queryset.filter(
+            Q(nome_busca__startswith=termo) |
+            Q(nome_busca__contains=f' {termo}'))
+    elif connection.vendor == 'sqlite':
+        fts = _tabela_fts(queryset.model._meta.db_table)
+        consulta = '"{}"'.format(termo.replace('"', '""'))
+        queryset = queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', [consulta]))
+    else:
+        queryset = queryset.filter(nome_busca__contains=termo)
+
+    return queryset.annotate(
+        relevancia=StrIndex('nome_busca', Value(termo))
+    ).order_by('relevancia', Length('nome_busca'), 'nome_busca', 'id')
+
+
+# Índices de texto no SQLite: (tabela, coluna, tabela FTS5, tokenizador)
+INDICES_FTS = [
+    (tabela, 'nome_busca', f'{tabela}_busca', 'trigram')
+    for tabela in TABELAS_BUSCA
+] + [
+    ('guardiao_documentobusca', 'texto', 'guardiao_documentobusca_fts',
+     'unicode61 remove_diacritics 2'),
+]
+
+
+def _criar_fts(cursor, tabela, coluna, fts, tokenizador):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+        f"{coluna}, content='{tabela}', content_rowid='id', "
+        f"tokenize='{tokenizador}')")
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {tabela}
+        BEGIN
+            INSERT INTO {fts}(rowid, {coluna}) VALUES (new.id, new.{coluna});
+        END''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {tabela}
+        BEGIN
+            INSERT INTO {fts}({fts}, rowid, {coluna})
+            VALUES ('delete', old.id, old.{coluna});
+        END''')
+    cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {coluna} ON {tabela}
+        BEGIN
+            INSERT INTO {fts}({fts}, rowid, {coluna})
+            VALUES ('delete', old.id, old.{coluna});
+            INSERT INTO {fts}(rowid, {coluna}) VALUES (new.id, new.{coluna});
+        END''')
+    cursor.execute(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')")
+
+
+def instalar_indices_busca(conexao, tabelas=None):
+    """
+    Cria (se faltarem) os índices de texto das tabelas de busca. É
+    idempotente: no SQLite também é chamada após cada migrate, porque a
+    reconstrução de tabelas feita pelas migrações descarta os gatilhos.
+    """
+    indices = [
+        indice for indice in INDICES_FTS
+        if tabelas is None or indice[0] in tabelas
+    ]
+    existentes = set(conexao.introspection.table_names())
+    indices = [indice for indice in indices if indice[0] in existentes]
+
+    with conexao.cursor() as cursor:
+        if conexao.vendor == 'postgresql':
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            for tabela, coluna, _, _ in indices:
+                if coluna == 'nome_busca':
+                    cursor.execute(
+                        f'CREATE INDEX IF NOT EXISTS {tabela}_nome_busca_trgm '
+                        f'ON {tabela} USING gin (nome_busca gin_trgm_ops)')
+                else:
+                    cursor.execute(
+                        f'CREATE INDEX IF NOT EXISTS {tabela}_{coluna}_tsv '
+                        f"ON {tabela} USING gin (to_tsvector('simple', {coluna}))")
+
+        elif conexao.vendor == 'sqlite':
+            for indice in indices:
+                _criar_fts(cursor, *indice)
+
+
+def remover_indices_busca(conexao, tabelas=None):
+    with conexao.cursor() as cursor:
+        for tabela, coluna, fts, _ in INDICES_FTS:
+            if tabelas is not None and tabela not in tabelas:
+                continue
+            if conexao.vendor == 'postgresql':
+                sufixo = 'nome_busca_trgm' if coluna == 'nome_busca' else f'{coluna}_tsv'
+                cursor.execute(f'DROP INDEX IF EXISTS {tabela}_{sufixo}')
+            elif conexao.vendor == 'sqlite':
+                for gatilho in ('ai', 'ad', 'au'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {fts}_{gatilho}')
+                cursor.execute(f'DROP TABLE IF EXISTS {fts}')
+
+
+def _termos(termo):
+    # Quebra nos mesmos separadores do tokenizador ("EB-12345" -> eb, 12345);
+    # só letras e dígitos: nada da sintaxe do MATCH/tsquery passa adiante
+    return re.findall(r'[^\W_]+', normalizar(termo))
+
+
+def buscar_documentos(termo, tipo, limite, deslocamento=0):
+    """
+    Documentos da busca global de um tipo, em ordem de relevância (bm25 no
+    SQLite, ts_rank no Postgres). Cada termo casa por prefixo e todos são
+    exigidos. Retorna tuplas (objeto_id, titulo, detalhe).
+    """
+    termos = _termos(termo)
+    if not termos:
+        return []
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            consulta = ' '.join(f'"{t}"*' for t in termos)
+            cursor.execute(
+                'SELECT d.objeto_id, d.titulo, d.detalhe '
+                'FROM guardiao_documentobusca_fts f '
+                'JOIN guardiao_documentobusca d ON d.id = f.rowid '
+                'WHERE guardiao_documentobusca_fts MATCH %s AND d.tipo = %s '
+                'ORDER BY bm25(guardiao_documentobusca_fts), d.id DESC '
+                'LIMIT %s OFFSET %s',
+                [consulta, tipo, limite, deslocamento])
+        elif connection.vendor == 'postgresql':
+            consulta = ' & '.join(f'{t}:*' for t in termos)
+            cursor.execute(
+                "SELECT objeto_id, titulo, detalhe "
+                "FROM guardiao_documentobusca, to_tsquery('simple', %s) q "
+                "WHERE to_tsvector('simple', texto) @@ q AND tipo = %s "
+                "ORDER BY ts_rank(to_tsvector('simple', texto), q) DESC, id DESC "
+                "LIMIT %s OFFSET %s",
+                [consulta, tipo, limite, deslocamento])
+        else:
+            condicoes = ' AND '.join(['texto LIKE %s'] * len(termos))
+            cursor.execute(
+                'SELECT objeto_id, titulo, detalhe FROM guardiao_documentobusca '
+                f'WHERE {condicoes} AND tipo = %s ORDER BY id DESC '
+                'LIMIT %s OFFSET %s',
+                [*(f'%{t}%' for t in termos), tipo, limite, deslocamento])
+        return cursor.fetchall()
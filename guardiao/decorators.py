@@ -5,7 +5,9 @@ from django.contrib import messages
 
 def nivel_acesso_minimo(nivel_requerido):
     """
-    Decorador para restringir acesso com base no nível do operador.
+    Decorador para restringir acesso com base no nível do operador. O nível
+    fica registrado na view e alimenta a tabela de permissões do
+    NivelAcessoMiddleware.
     """
     def decorator(view_func):
         @wraps(view_func)
@@ -16,5 +18,6 @@ def nivel_acesso_minimo(nivel_requerido):
                     request, "Você não tem permissão para acessar esta página.")
                 return redirect('pronto_armamento')
             return view_func(request, *args, **kwargs)
+        wrapper.nivel_acesso_minimo = nivel_requerido
         return wrapper
     return decorator
@@ -0,0 +1,174 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+
+from django.db.models import Exists, OuterRef
+
+from .busca import normalizar, LIMITE_RESULTADOS
+from .models import (
+    Material, EmprestimoMaterial, MovimentoEstoque, VersaoInventario
+)
+
+# Quantos ids abaixo do maior já lido ainda são relidos: um movimento com id
+# menor pode ser confirmado depois de outro com id maior.
+SOBREPOSICAO_MOVIMENTOS = 1000
+
+
+class IndiceDisponibilidade:
+    """
+    Índice em memória (por processo) dos materiais disponíveis para
+    empréstimo, consultado por prefixo do nome ou do registro.
+
+    A cada consulta lê apenas (versao, versao_cadastro) de VersaoInventario.
+    Se só o estoque mudou, relê os materiais com movimentos ainda não vistos
+    no livro (a partir do maior id lido menos SOBREPOSICAO_MOVIMENTOS); se o
+    cadastro mudou, recarrega tudo.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.invalidar()
+
+    def invalidar(self):
+        """
+        Descarta o índice; a próxima consulta recarrega tudo do banco.
+        """
+        self._versoes = None
+        self._ultimo_movimento = 0
+        # Ids já aplicados dentro da janela de sobreposição
+        self._vistos = set()
+        self._materiais = {}
+        # Listas ordenadas de (chave, id) para busca por prefixo
+        self._nomes = []
+        self._registros = []
+
+    def _consulta(self):
+        emprestado = EmprestimoMaterial.objects.filter(
+            material=OuterRef('pk'), emprestimo__isAtiva=True)
+        return Material.objects.com_saldo().annotate(
+            emprestado=Exists(emprestado)
+        ).values('id', 'nome', 'nome_busca', 'registro', 'saldo_total',
+                 'saldo_emprestada', 'emprestado')
+
+    @staticmethod
+    def _chaves_nome(material):
+        # Cada palavra do nome é um ponto de entrada do prefixo
+        nome = material['nome_busca']
+        inicios = [0] + [i + 1 for i, c in enumerate(nome) if c == ' ']
+        return [(nome[inicio:], material['id']) for inicio in inicios]
+
+    def _remover(self, material_id):
+        material = self._materiais.pop(material_id, None)
+        if material is None:
+            return
+        for chave in self._chaves_nome(material):
+            posicao = bisect_left(self._nomes, chave)
+            if posicao < len(self._nomes) and self._nomes[posicao] == chave:
+                del self._nomes[posicao]
+        if material['registro']:
+            chave = (material['registro_busca'], material_id)
+            posicao = bisect_left(self._registros, chave)
+            if posicao < len(self._registros) and self._registros[posicao] == chave:
+                del self._registros[posicao]
+
+    def _incluir(self, material):
+        if material['registro']:
+            disponivel = 0 if material['emprestado'] else 1
+        else:
+            disponivel = material['saldo_total'] - material['saldo_emprestada']
+        if disponivel <= 0:
+            return
+
+        material = {
+            'id': material['id'],
+            'nome': material['nome'],
+            'nome_busca': material['nome_busca'],
+            'registro': material['registro'],
+            'registro_busca': normalizar(material['registro']),
+            'disponivel': disponivel,
+        }
+        self._materiais[material['id']] = material
+        for chave in self._chaves_nome(material):
+            insort(self._nomes, chave)
+        if material['registro']:
+            insort(self._registros, (material['registro_busca'], material['id']))
+
+    def _carregar(self):
+        self._materiais = {}
+        self._nomes = []
+        self._registros = []
+        self._ultimo_movimento = MovimentoEstoque.objects.order_by(
+            '-id').values_list('id', flat=True).first() or 0
+        self._vistos = set(MovimentoEstoque.objects.filter(
+            id__gt=self._ultimo_movimento - SOBREPOSICAO_MOVIMENTOS
+        ).values_list('id', flat=True))
+        for material in self._consulta():
+            self._incluir(material)
+
+    def _atualizar(self):
+        movimentos = [
+            (id, material_id) for id, material_id in MovimentoEstoque.objects.filter(
+                id__gt=self._ultimo_movimento - SOBREPOSICAO_MOVIMENTOS
+            ).values_list('id', 'material_id')
+            if id not in self._vistos
+        ]
+        if not movimentos:
+            return
+        self._ultimo_movimento = max(
+            self._ultimo_movimento, *(id for id, _ in movimentos))
+        piso = self._ultimo_movimento - SOBREPOSICAO_MOVIMENTOS
+        self._vistos = {
+            id for id in self._vistos | {id for id, _ in movimentos} if id > piso
+        }
+        ids = {material_id for _, material_id in movimentos}
+        for material_id in ids:
+            self._remover(material_id)
+        for material in self._consulta().filter(id__in=ids):
+            self._incluir(material)
+
+    def sincronizar(self):
+        versoes = VersaoInventario.atuais()
+        if versoes == self._versoes:
+            return
+        with self._lock:
+            if versoes == self._versoes:
+                return
+            if self._versoes is None or versoes[1] != self._versoes[1]:
+                self._carregar()
+            else:
+                self._atualizar()
+            self._versoes = versoes
+
+    @staticmethod
+    def _prefixo(lista, termo):
+        posicao = bisect_left(lista, (termo,))
+        while posicao < len(lista) and lista[posicao][0].startswith(termo):
+            yield lista[posicao][1]
+            posicao += 1
+
+    def buscar(self, nome='', registro='', limite=LIMITE_RESULTADOS):
+        """
+        Materiais disponíveis cujo nome (início de alguma palavra) e
+        registro começam pelos termos informados, ordenados por nome.
+        """
+        self.sincronizar()
+        nome, registro = normalizar(nome), normalizar(registro)
+
+        with self._lock:
+            if registro:
+                ids = set(self._prefixo(self._registros, registro))
+                if nome:
+                    ids &= set(self._prefixo(self._nomes, nome))
+            elif nome:
+                ids = set(self._prefixo(self._nomes, nome))
+            else:
+                ids = set(self._materiais)
+
+            materiais = [self._materiais[id] for id in ids]
+
+        # Nome começando pelo termo primeiro, depois ordem alfabética
+        return heapq.nsmallest(limite, materiais, key=lambda m: (
+            not m['nome_busca'].startswith(nome), m['nome_busca'], m['id']))
+
+
+indice_disponibilidade = IndiceDisponibilidade()
@@ -0,0 +1,198 @@
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import EmprestimoHistorico, EmprestimoMaterial
+
+TAMANHO_LOTE = 500
+
+COLUNAS = (
+    'Cautela', 'Data da cautela', 'Devolução prevista', 'Situação atual',
+    'Cliente', 'Identidade', 'OM', 'Operador', 'Destino', 'Itens',
+    'Transição', 'Data da transição', 'Operador da transição',
+)
+
+
+def _data(valor):
+    if valor is None:
+        return ''
+    return timezone.localtime(valor).strftime('%d/%m/%Y %H:%M')
+
+
+def linhas_cautelas(emprestimos, tamanho_lote=TAMANHO_LOTE):
+    """
+    Uma linha por transição do histórico de cada cautela (ou uma linha só,
+    se ela não tiver histórico). As cautelas são lidas com .iterator() (cursor
+    no servidor, no Postgres) e itens/histórico são buscados por lote.
+    """
+    emprestimos = emprestimos.select_related(
+        'cliente', 'operador'
+    ).prefetch_related(
+        Prefetch('emprestimomaterial_set',
+                 queryset=EmprestimoMaterial.objects.select_related('material')),
+        Prefetch('historico',
+                 queryset=EmprestimoHistorico.objects.select_related(
+                     'operador').order_by('data', 'id')),
+    ).order_by('id')
+
+    for emprestimo in emprestimos.iterator(chunk_size=tamanho_lote):
+        itens = '; '.join(
+            f"{item.material.nome}"
+            f"{f' ({item.material.registro})' if item.material.registro else ''}"
+            f" x{item.quantidade}"
+            for item in emprestimo.emprestimomaterial_set.all()
+        )
+        cautela = [
+            emprestimo.id,
+            _data(emprestimo.data_emprestimo),
+            _data(emprestimo.data_devolucao),
+            'Ativa' if emprestimo.isAtiva else 'Inativa',
+            emprestimo.cliente.nome,
+            emprestimo.cliente.identidade,
+            emprestimo.cliente.organizacao_militar or '',
+            emprestimo.operador.nome,
+            emprestimo.destino,
+            itens,
+        ]
+        historico = emprestimo.historico.all()
+        if not historico:
+            yield cautela + ['', '', '']
+        for transicao in historico:
+            yield cautela + [
+                transicao.get_status_display(),
+                _data(transicao.data),
+                transicao.operador.nome if transicao.operador else '',
+            ]
+
+
+# Início de fórmula no Excel/LibreOffice (=, +, -, @, tab, CR)
+_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+
+def _celula(valor):
+    """
+    Valor seguro para planilha: textos que abririam como fórmula ganham um
+    apóstrofo na frente.
+    """
+    if isinstance(valor, str) and valor.startswith(_FORMULA):
+        return "'" + valor
+    return valor
+
+
+class _Eco:
+    """
+    "Arquivo" que devolve o que recebe: o csv.writer formata a linha e o
+    gerador a entrega direto na resposta.
+    """
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(linhas):
+    escritor = csv.writer(_Eco(), delimiter=';')
+    # BOM: o Excel abre o UTF-8 com os acentos certos
+    yield '\ufeff' + escritor.writerow(COLUNAS)
+    for linha in linhas:
+        yield escritor.writerow([_celula(valor) for valor in linha])
+
+
+class _Bloco:
+    """
+    Destino não posicionável do ZipFile: acumula os bytes escritos até o
+    gerador recolhê-los.
+    """
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def recolher(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+_XLSX_ESTATICOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Cautelas" sheetId="1" r:id="rId1"/></sheets></workbook>'),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '</Relationships>'),
+}
+
+
+# Caracteres de controle não são aceitos em XML
+_CONTROLE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def _texto_xlsx(valor):
+    return escape(_CONTROLE.sub('', str(valor)))
+
+
+def _linha_xlsx(valores):
+    celulas = ''.join(
+        f'<c t="n"><v>{valor}</v></c>' if isinstance(valor, int)
+        else f'<c t="inlineStr"><is><t xml:space="preserve">{_texto_xlsx(_celula(valor))}</t></is></c>'
+        for valor in valores
+    )
+    return f'<row>{celulas}</row>'
+
+
+def gerar_xlsx(linhas, linhas_por_bloco=200):
+    """
+    Planilha XLSX mínima (uma aba, textos inline) montada em fluxo: o zip é
+    escrito num destino sem seek, com descritores de dados, e os bytes saem
+    a cada bloco de linhas.
+    """
+    saida = _Bloco()
+    with zipfile.ZipFile(saida, 'w', zipfile.ZIP_DEFLATED) as pacote:
+        for nome, conteudo in _XLSX_ESTATICOS.items():
+            pacote.writestr(nome, conteudo)
+        yield saida.recolher()
+
+        with pacote.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as planilha:
+            planilha.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+                '<sheetData>' + _linha_xlsx(COLUNAS)
+            ).encode('utf-8'))
+            bloco = []
+            for linha in linhas:
+                bloco.append(_linha_xlsx(linha))
+                if len(bloco) >= linhas_por_bloco:
+                    planilha.write(''.join(bloco).encode('utf-8'))
+                    bloco = []
+                    dados = saida.recolher()
+                    if dados:
+                        yield dados
+            planilha.write((''.join(bloco) + '</sheetData></worksheet>').encode('utf-8'))
+    yield saida.recolher()
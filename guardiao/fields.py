@@ -0,0 +1,67 @@
+import json
+import zlib
+
+from django.db import models
+
+
+class TextoComprimidoField(models.BinaryField):
+    """
+    Texto gravado comprimido com zlib e descomprimido de forma transparente
+    ao ser lido do banco.
+    """
+
+    def get_default(self):
+        default = super().get_default()
+        return '' if default == b'' else default
+
+    def comprimir(self, value):
+        return zlib.compress(value.encode('utf-8'), 9)
+
+    def descomprimir(self, value):
+        return zlib.decompress(bytes(value)).decode('utf-8')
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        if not value:
+            return ''
+        return self.descomprimir(value)
+
+    def to_python(self, value):
+        return value
+
+    def get_prep_value(self, value):
+        if value is None:
+            return value
+        if not isinstance(value, (bytes, memoryview)):
+            value = self.comprimir(value)
+        return super().get_prep_value(value)
+
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+
+class JSONComprimidoField(TextoComprimidoField):
+    """
+    Estrutura JSON gravada compacta e comprimida com zlib.
+    """
+
+    def comprimir(self, value):
+        return super().comprimir(
+            json.dumps(value, ensure_ascii=False, separators=(',', ':')))
+
+    def descomprimir(self, value):
+        return json.loads(super().descomprimir(value))
+
+    def from_db_value(self, value, expression, connection):
+        if not value:
+            return None
+        return self.descomprimir(value)
+
+    def to_python(self, value):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+    def value_to_string(self, obj):
+        return json.dumps(self.value_from_object(obj), ensure_ascii=False)
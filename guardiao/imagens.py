@@ -0,0 +1,118 @@
+import posixpath
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+# Lado maior máximo do original guardado (a identidade continua legível)
+RESOLUCAO_MAXIMA = 2048
+QUALIDADE = 85
+
+# Larguras das miniaturas (1x e 2x das páginas) e formatos gerados
+TAMANHOS_MINIATURA = (200, 400)
+FORMATOS_MINIATURA = {'jpeg': 'jpg', 'webp': 'webp'}
+PASTA_MINIATURAS = 'miniaturas'
+
+
+def _abrir(arquivo):
+    """
+    Abre a imagem já na orientação do EXIF e em RGB.
+    """
+    imagem = Image.open(arquivo)
+    imagem = ImageOps.exif_transpose(imagem)
+    if imagem.mode != 'RGB':
+        imagem = imagem.convert('RGB')
+    return imagem
+
+
+def _codificar(imagem, formato):
+    # Sem exif/icc: os metadados (GPS, aparelho...) ficam de fora
+    saida = BytesIO()
+    if formato == 'webp':
+        imagem.save(saida, 'WEBP', quality=QUALIDADE, method=4)
+    else:
+        imagem.save(saida, 'JPEG', quality=QUALIDADE, optimize=True,
+                    progressive=True)
+    return saida.getvalue()
+
+
+def _miniaturas(original, larguras=TAMANHOS_MINIATURA):
+    """
+    {(largura, formato): bytes} das miniaturas de uma imagem já decodificada.
+    """
+    miniaturas = {}
+    for largura in larguras:
+        imagem = original.copy()
+        imagem.thumbnail((largura, largura * 4), Image.LANCZOS)
+        for formato in FORMATOS_MINIATURA:
+            miniaturas[largura, formato] = _codificar(imagem, formato)
+    return miniaturas
+
+
+def processar_upload(arquivo):
+    """
+    Versão normalizada de uma imagem enviada (orientação corrigida, sem
+    metadados, limitada a RESOLUCAO_MAXIMA e regravada em JPEG) e as
+    miniaturas dela, geradas da mesma decodificação. Retorna (arquivo,
+    miniaturas), ou None se o Pillow não conseguir ler o arquivo.
+    """
+    try:
+        imagem = _abrir(arquivo)
+    except (UnidentifiedImageError, OSError):
+        return None
+    imagem.thumbnail((RESOLUCAO_MAXIMA, RESOLUCAO_MAXIMA), Image.LANCZOS)
+    nome = posixpath.splitext(posixpath.basename(arquivo.name))[0] or 'imagem'
+    return (ContentFile(_codificar(imagem, 'jpeg'), name=f'{nome}.jpg'),
+            _miniaturas(imagem))
+
+
+def caminho_miniatura(nome, largura, formato='jpeg'):
+    raiz = posixpath.splitext(nome)[0]
+    return f'{PASTA_MINIATURAS}/{largura}/{raiz}.{FORMATOS_MINIATURA[formato]}'
+
+
+def gravar_miniaturas(nome, miniaturas):
+    """
+    Grava no storage padrão as miniaturas do original `nome` que ainda não
+    existem (um blob reaproveitado já tem as suas).
+    """
+    for (largura, formato), conteudo in miniaturas.items():
+        caminho = caminho_miniatura(nome, largura, formato)
+        if not default_storage.exists(caminho):
+            default_storage.save(caminho, ContentFile(conteudo))
+
+
+def gerar_miniaturas(storage, nome, larguras=TAMANHOS_MINIATURA):
+    """
+    Gera as miniaturas que ainda faltam do arquivo `nome` do storage (imagens
+    enviadas antes do processamento), decodificando o original uma única
+    vez. Retorna quantas foram gravadas.
+    """
+    faltando = [
+        (largura, formato)
+        for largura in larguras
+        for formato in FORMATOS_MINIATURA
+        if not default_storage.exists(caminho_miniatura(nome, largura, formato))
+    ]
+    if not faltando:
+        return 0
+
+    with storage.open(nome, 'rb') as arquivo:
+        original = _abrir(arquivo)
+    miniaturas = _miniaturas(original, {largura for largura, _ in faltando})
+    gravar_miniaturas(nome, {
+        chave: miniaturas[chave] for chave in faltando})
+    return len(faltando)
+
+
+def url_miniatura(campo, largura, formato='jpeg'):
+    """
+    URL da miniatura do campo no tamanho gerado mais próximo. Só monta o
+    caminho: as miniaturas são gravadas no upload (e, para arquivos antigos,
+    por `manage.py gerar_miniaturas`).
+    """
+    if not campo:
+        return ''
+    largura = min(TAMANHOS_MINIATURA, key=lambda tamanho: abs(tamanho - largura))
+    return default_storage.url(caminho_miniatura(campo.name, largura, formato))
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from guardiao.services import coletar_midia
+
+
+class Command(BaseCommand):
+    help = 'Remove fotos, identidades e miniaturas que nenhum cliente referencia.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--simular', action='store_true',
+            help='Apenas lista o que seria removido.')
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Clientes lidos por consulta.')
+
+    def handle(self, *args, **options):
+        removidos = coletar_midia(
+            simular=options['simular'], tamanho_lote=options['lote'])
+
+        for nome in removidos:
+            self.stdout.write(nome)
+
+        verbo = 'seriam removido(s)' if options['simular'] else 'removido(s)'
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(removidos)} arquivo(s) órfão(s) {verbo}."))
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from guardiao.services import compactar_estoque, reconstruir_estoque
+
+
+class Command(BaseCommand):
+    help = 'Compacta o livro de movimentos de estoque nos saldos dos materiais.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reconstruir', action='store_true',
+            help='Recalcula os saldos somando todo o livro de movimentos.')
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            divergencias = reconstruir_estoque()
+
+            for material_id, atual, correto in divergencias:
+                self.stdout.write(
+                    f"Divergência no material {material_id}: {atual} -> {correto}")
+
+            if divergencias:
+                self.stdout.write(self.style.WARNING(
+                    f"{len(divergencias)} divergência(s) corrigida(s)."))
+            else:
+                self.stdout.write(self.style.SUCCESS(
+                    'Estoque consistente, nenhuma divergência encontrada.'))
+            return
+
+        compactados = compactar_estoque()
+        self.stdout.write(self.style.SUCCESS(
+            f"{compactados} material(is) compactado(s)."))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from guardiao.backup import exportar, TAMANHO_LOTE
+
+
+class Command(BaseCommand):
+    help = 'Gera um backup do banco em NDJSON comprimido (.ndjson.gz).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Caminho do backup a gerar.')
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE,
+            help='Registros lidos do banco por vez.')
+
+    def handle(self, *args, **options):
+        contagem = exportar(options['arquivo'], tamanho_lote=options['lote'])
+
+        for modelo, total in contagem.items():
+            self.stdout.write(f"{modelo}: {total}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{sum(contagem.values())} registro(s) salvos em {options['arquivo']}."))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from guardiao.services import gerar_miniaturas_pendentes
+
+
+class Command(BaseCommand):
+    help = 'Gera as miniaturas que faltam das fotos e identidades dos clientes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lote', type=int, default=1000,
+            help='Clientes lidos por consulta.')
+
+    def handle(self, *args, **options):
+        total = gerar_miniaturas_pendentes(tamanho_lote=options['lote'])
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} miniatura(s) gerada(s)."))
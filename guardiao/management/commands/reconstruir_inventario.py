@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from guardiao.services import reconstruir_inventario
+
+
+class Command(BaseCommand):
+    help = 'Regenera o InventarioSnapshot do zero e informa as divergências encontradas.'
+
+    def handle(self, *args, **options):
+        divergencias = reconstruir_inventario()
+
+        for categoria_id, nome, destino, atual, correto in divergencias:
+            self.stdout.write(
+                f"Divergência em categoria {categoria_id} / {nome} / "
+                f"{destino or 'Totais'}: {atual} -> {correto}"
+            )
+
+        if divergencias:
+            self.stdout.write(self.style.WARNING(
+                f"{len(divergencias)} divergência(s) corrigida(s)."))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                'Inventário consistente, nenhuma divergência encontrada.'))
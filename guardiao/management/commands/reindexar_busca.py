@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from guardiao.services import reindexar_busca
+
+
+class Command(BaseCommand):
+    help = 'Regera o índice da busca global (cautelas, clientes, materiais, cases e prontos).'
+
+    def handle(self, *args, **options):
+        total = reindexar_busca()
+        self.stdout.write(self.style.SUCCESS(
+            f"{total} documento(s) indexado(s)."))
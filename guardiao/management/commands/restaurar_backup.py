@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from guardiao.backup import importar, TAMANHO_LOTE
+from guardiao.services import reconstruir_inventario, reindexar_busca
+
+
+class Command(BaseCommand):
+    help = 'Restaura um backup gerado por gerar_backup num banco recém-migrado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('arquivo', help='Backup .ndjson.gz a restaurar.')
+        parser.add_argument(
+            '--lote', type=int, default=TAMANHO_LOTE,
+            help='Registros gravados por transação.')
+        parser.add_argument(
+            '--retomar', action='store_true',
+            help='Continua uma restauração interrompida a partir do checkpoint.')
+
+    def handle(self, *args, **options):
+        def progresso(modelo, gravados):
+            if options['verbosity'] > 1:
+                self.stdout.write(f"{modelo}: {gravados} registro(s) gravados")
+
+        try:
+            gravados = importar(
+                options['arquivo'], tamanho_lote=options['lote'],
+                retomar=options['retomar'], progresso=progresso)
+        except (OSError, ValueError) as erro:
+            raise CommandError(str(erro))
+
+        # Derivados que não vão no backup
+        reconstruir_inventario()
+        documentos = reindexar_busca()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{gravados} registro(s) restaurados; {documentos} documento(s) "
+            "da busca reindexados."))
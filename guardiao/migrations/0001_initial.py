@@ -0,0 +1,143 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Assinante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Case',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('descricao', models.CharField(max_length=255)),
+                ('responsavel', models.CharField(max_length=100)),
+                ('lacre', models.CharField(max_length=50, unique=True)),
+                ('data_criacao', models.DateTimeField(auto_now_add=True)),
+                ('data_atualizacao', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Categoria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100, unique=True)),
+                ('descricao', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Cliente',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('identidade', models.CharField(max_length=20)),
+                ('cpf', models.CharField(blank=True, max_length=14, null=True, unique=True)),
+                ('foto', models.ImageField(blank=True, null=True, upload_to='clientes/fotos/')),
+                ('organizacao_militar', models.CharField(blank=True, max_length=100, null=True)),
+                ('imagem_identidade', models.ImageField(blank=True, null=True, upload_to='identidades/')),
+                ('isAtivo', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='FuncaoAssinante',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Emprestimo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('isAtiva', models.BooleanField(default=True)),
+                ('destino', models.CharField(max_length=200)),
+                ('data_emprestimo', models.DateTimeField(auto_now_add=True)),
+                ('data_devolucao', models.DateTimeField(blank=True, null=True)),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guardiao.cliente')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Material',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('registro', models.CharField(blank=True, max_length=50, null=True, unique=True)),
+                ('quantidade_total', models.PositiveIntegerField(default=0)),
+                ('quantidade_disponivel', models.PositiveIntegerField(default=0)),
+                ('quantidade_emprestada', models.PositiveIntegerField(default=0)),
+                ('categoria', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='guardiao.categoria')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmprestimoMaterial',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantidade', models.PositiveIntegerField(default=1)),
+                ('emprestimo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guardiao.emprestimo')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guardiao.material')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='emprestimo',
+            name='materiais',
+            field=models.ManyToManyField(through='guardiao.EmprestimoMaterial', to='guardiao.material'),
+        ),
+        migrations.CreateModel(
+            name='Operador',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('identidade', models.CharField(max_length=20)),
+                ('funcao', models.CharField(blank=True, max_length=100, null=True)),
+                ('nivel_acesso', models.IntegerField(choices=[(1, 'Nível 1'), (2, 'Nível 2'), (3, 'Nível 3')], default=1)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='EmprestimoHistorico',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('Ativado', 'Ativado'), ('Desativado', 'Desativado'), ('Reativado', 'Reativado'), ('Cancelado', 'Cancelado')], max_length=50)),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+                ('emprestimo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='historico', to='guardiao.emprestimo')),
+                ('operador', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='guardiao.operador')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='emprestimo',
+            name='operador',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guardiao.operador'),
+        ),
+        migrations.CreateModel(
+            name='ProntoArmamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(auto_now_add=True)),
+                ('numero', models.PositiveIntegerField(unique=True)),
+                ('lacre', models.CharField(max_length=50)),
+                ('tabela', models.TextField()),
+                ('assinante_1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assinante_1', to='guardiao.assinante')),
+                ('assinante_2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assinante_2', to='guardiao.assinante')),
+                ('assinante_3', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assinante_3', to='guardiao.assinante')),
+                ('funcao_1', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='funcao_1', to='guardiao.funcaoassinante')),
+                ('funcao_2', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='funcao_2', to='guardiao.funcaoassinante')),
+                ('funcao_3', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='funcao_3', to='guardiao.funcaoassinante')),
+            ],
+        ),
+    ]
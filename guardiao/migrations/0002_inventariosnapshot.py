@@ -0,0 +1,29 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventarioSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nome', models.CharField(max_length=100)),
+                ('destino', models.CharField(blank=True, max_length=200, null=True)),
+                ('total_existente', models.IntegerField(default=0)),
+                ('total_na_reserva', models.IntegerField(default=0)),
+                ('total_emprestados', models.IntegerField(default=0)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guardiao.categoria')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('categoria', 'nome', 'destino'), name='inventario_snapshot_unico'), models.UniqueConstraint(condition=models.Q(('destino__isnull', True)), fields=('categoria', 'nome'), name='inventario_snapshot_totais_unico')],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0002_inventariosnapshot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoInventario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0003_versaoinventario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prontoarmamento',
+            name='dados',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='prontoarmamento',
+            name='tabela',
+            field=models.TextField(blank=True),
+        ),
+    ]
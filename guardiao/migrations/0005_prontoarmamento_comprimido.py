@@ -0,0 +1,73 @@
+from django.db import migrations
+
+import guardiao.fields
+
+TAMANHO_LOTE = 100
+
+
+def _copiar_em_lotes(apps, origem, destino):
+    ProntoArmamento = apps.get_model('guardiao', 'ProntoArmamento')
+    ultimo_id = 0
+    while True:
+        prontos = list(
+            ProntoArmamento.objects
+            .filter(id__gt=ultimo_id)
+            .order_by('id')
+            .only('id', *origem)[:TAMANHO_LOTE]
+        )
+        if not prontos:
+            break
+        for pronto in prontos:
+            for campo_origem, campo_destino in zip(origem, destino):
+                setattr(pronto, campo_destino, getattr(pronto, campo_origem))
+        ProntoArmamento.objects.bulk_update(prontos, destino)
+        ultimo_id = prontos[-1].id
+
+
+def comprimir(apps, schema_editor):
+    _copiar_em_lotes(apps, ('tabela', 'dados'),
+                     ('tabela_comprimida', 'dados_comprimidos'))
+
+
+def descomprimir(apps, schema_editor):
+    _copiar_em_lotes(apps, ('tabela_comprimida', 'dados_comprimidos'),
+                     ('tabela', 'dados'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0004_prontoarmamento_dados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prontoarmamento',
+            name='tabela_comprimida',
+            field=guardiao.fields.TextoComprimidoField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='prontoarmamento',
+            name='dados_comprimidos',
+            field=guardiao.fields.JSONComprimidoField(blank=True, null=True),
+        ),
+        migrations.RunPython(comprimir, descomprimir),
+        migrations.RemoveField(
+            model_name='prontoarmamento',
+            name='tabela',
+        ),
+        migrations.RemoveField(
+            model_name='prontoarmamento',
+            name='dados',
+        ),
+        migrations.RenameField(
+            model_name='prontoarmamento',
+            old_name='tabela_comprimida',
+            new_name='tabela',
+        ),
+        migrations.RenameField(
+            model_name='prontoarmamento',
+            old_name='dados_comprimidos',
+            new_name='dados',
+        ),
+    ]
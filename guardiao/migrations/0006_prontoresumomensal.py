@@ -0,0 +1,47 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:28
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def preencher_resumo(apps, schema_editor):
+    ProntoArmamento = apps.get_model('guardiao', 'ProntoArmamento')
+    ProntoResumoMensal = apps.get_model('guardiao', 'ProntoResumoMensal')
+    totais = (ProntoArmamento.objects
+              .annotate(ano=ExtractYear('data'), mes=ExtractMonth('data'))
+              .values('ano', 'mes')
+              .annotate(total=Count('id'))
+              .order_by())
+    ProntoResumoMensal.objects.bulk_create(
+        ProntoResumoMensal(ano=linha['ano'], mes=linha['mes'], total=linha['total'])
+        for linha in totais
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0005_prontoarmamento_comprimido'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='prontoarmamento',
+            name='data',
+            field=models.DateField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='ProntoResumoMensal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ano', models.PositiveSmallIntegerField()),
+                ('mes', models.PositiveSmallIntegerField()),
+                ('total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('ano', 'mes'), name='pronto_resumo_mensal_unico')],
+            },
+        ),
+        migrations.RunPython(preencher_resumo, migrations.RunPython.noop),
+    ]
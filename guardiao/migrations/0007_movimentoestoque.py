@@ -0,0 +1,76 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:37
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+TAMANHO_LOTE = 500
+
+
+def abrir_livro(apps, schema_editor):
+    """
+    Abre o livro com um movimento de cadastro igual ao saldo atual de cada
+    material e marca esse movimento como já compactado.
+    """
+    Material = apps.get_model('guardiao', 'Material')
+    MovimentoEstoque = apps.get_model('guardiao', 'MovimentoEstoque')
+    ultimo_id = 0
+    while True:
+        materiais = list(
+            Material.objects
+            .filter(id__gt=ultimo_id)
+            .order_by('id')
+            .values('id', 'quantidade_total', 'quantidade_disponivel',
+                    'quantidade_emprestada')[:TAMANHO_LOTE]
+        )
+        if not materiais:
+            break
+        MovimentoEstoque.objects.bulk_create([
+            MovimentoEstoque(
+                material_id=material['id'],
+                tipo='Cadastro',
+                quantidade_total=material['quantidade_total'],
+                quantidade_disponivel=material['quantidade_disponivel'],
+                quantidade_emprestada=material['quantidade_emprestada'],
+            )
+            for material in materiais
+        ])
+        ultimo_id = materiais[-1]['id']
+
+    Material.objects.update(movimento_compactado=models.Subquery(
+        MovimentoEstoque.objects.filter(material=models.OuterRef('pk'))
+        .order_by('-id').values('id')[:1]
+    ))
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0006_prontoresumomensal'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='material',
+            name='movimento_compactado',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='MovimentoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('Cadastro', 'Cadastro'), ('Ajuste', 'Ajuste'), ('Retirada', 'Retirada'), ('Devolução', 'Devolução')], max_length=20)),
+                ('quantidade_total', models.IntegerField(default=0)),
+                ('quantidade_disponivel', models.IntegerField(default=0)),
+                ('quantidade_emprestada', models.IntegerField(default=0)),
+                ('data', models.DateTimeField(default=django.utils.timezone.now)),
+                ('emprestimo', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='guardiao.emprestimo')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='guardiao.material')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['material', 'id'], name='movimento_material_id_idx')],
+            },
+        ),
+        migrations.RunPython(abrir_livro, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0007_movimentoestoque'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='cliente',
+            index=models.Index(fields=['nome', 'id'], name='cliente_nome_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(fields=['-data_emprestimo', '-id'], name='emprestimo_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimo',
+            index=models.Index(condition=models.Q(('isAtiva', True)), fields=['-data_emprestimo', '-id'], name='emprestimo_ativas_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emprestimomaterial',
+            index=models.Index(fields=['material', 'emprestimo', 'quantidade'], name='emprestimomaterial_mat_emp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='material',
+            index=models.Index(fields=['categoria', 'nome', 'id'], name='material_categoria_nome_idx'),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:46
+
+from django.db import migrations, models
+
+from guardiao.busca import (
+    normalizar, instalar_indices_busca, remover_indices_busca
+)
+
+TAMANHO_LOTE = 500
+
+
+def preencher_nome_busca(apps, schema_editor):
+    for modelo in ('Cliente', 'Material'):
+        Modelo = apps.get_model('guardiao', modelo)
+        ultimo_id = 0
+        while True:
+            objetos = list(
+                Modelo.objects
+                .filter(id__gt=ultimo_id)
+                .order_by('id')
+                .only('id', 'nome')[:TAMANHO_LOTE]
+            )
+            if not objetos:
+                break
+            for objeto in objetos:
+                objeto.nome_busca = normalizar(objeto.nome)
+            Modelo.objects.bulk_update(objetos, ['nome_busca'])
+            ultimo_id = objetos[-1].id
+
+
+def criar_indices(apps, schema_editor):
+    instalar_indices_busca(schema_editor.connection)
+
+
+def remover_indices(apps, schema_editor):
+    remover_indices_busca(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0008_indices'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cliente',
+            name='nome_busca',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='material',
+            name='nome_busca',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.RunPython(preencher_nome_busca, migrations.RunPython.noop),
+        migrations.RunPython(criar_indices, remover_indices),
+    ]
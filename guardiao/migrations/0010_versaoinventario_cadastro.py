@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0009_nome_busca'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='versaoinventario',
+            name='versao_cadastro',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.1.4 on 2026-10-18 19:54
+
+from django.db import migrations, models
+
+from guardiao.busca import instalar_indices_busca, remover_indices_busca
+
+TABELAS = ['guardiao_documentobusca']
+
+
+def criar_indice(apps, schema_editor):
+    instalar_indices_busca(schema_editor.connection, TABELAS)
+
+
+def remover_indice(apps, schema_editor):
+    remover_indices_busca(schema_editor.connection, TABELAS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0010_versaoinventario_cadastro'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DocumentoBusca',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('cautela', 'Cautelas'), ('cliente', 'Clientes'), ('material', 'Materiais'), ('case', 'Cases'), ('pronto', 'Prontos')], max_length=10)),
+                ('objeto_id', models.PositiveBigIntegerField()),
+                ('titulo', models.CharField(max_length=255)),
+                ('detalhe', models.CharField(blank=True, max_length=255)),
+                ('texto', models.TextField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'objeto_id'), name='documento_busca_unico')],
+            },
+        ),
+        # Os documentos são gerados por `manage.py reindexar_busca`
+        migrations.RunPython(criar_indice, remover_indice),
+    ]
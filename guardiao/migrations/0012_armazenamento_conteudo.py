@@ -0,0 +1,24 @@
+# Generated by Django 5.1.4 on 2026-10-18 20:05
+
+import guardiao.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0011_documentobusca'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cliente',
+            name='foto',
+            field=models.ImageField(blank=True, null=True, storage=guardiao.storage.armazenamento_conteudo, upload_to='clientes/fotos/'),
+        ),
+        migrations.AlterField(
+            model_name='cliente',
+            name='imagem_identidade',
+            field=models.ImageField(blank=True, null=True, storage=guardiao.storage.armazenamento_conteudo, upload_to='identidades/'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from django.db import migrations
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+OPERADOR_BACKEND = 'guardiao.backends.OperadorBackend'
+TAMANHO_LOTE = 1000
+
+
+def _trocar_backend(apps, de, para):
+    """
+    Regrava nas sessões abertas o caminho do backend de autenticação, em
+    lotes, para que continuem válidas depois da troca em settings.
+    """
+    from django.contrib.sessions.backends.db import SessionStore
+
+    Session = apps.get_model('sessions', 'Session')
+    loja = SessionStore()
+    alteradas = []
+    for sessao in Session.objects.order_by('pk').iterator(chunk_size=TAMANHO_LOTE):
+        dados = loja.decode(sessao.session_data)
+        if dados.get('_auth_user_backend') != de:
+            continue
+        dados['_auth_user_backend'] = para
+        sessao.session_data = loja.encode(dados)
+        alteradas.append(sessao)
+        if len(alteradas) >= TAMANHO_LOTE:
+            Session.objects.bulk_update(alteradas, ['session_data'])
+            alteradas = []
+    Session.objects.bulk_update(alteradas, ['session_data'])
+
+
+def para_operador_backend(apps, schema_editor):
+    _trocar_backend(apps, MODEL_BACKEND, OPERADOR_BACKEND)
+
+
+def para_model_backend(apps, schema_editor):
+    _trocar_backend(apps, OPERADOR_BACKEND, MODEL_BACKEND)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guardiao', '0012_armazenamento_conteudo'),
+        ('sessions', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(para_operador_backend, para_model_backend),
+    ]
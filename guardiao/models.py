@@ -1,9 +1,16 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.utils import timezone
-from django.db.models import Sum
-from django.db.models.signals import pre_delete
+from django.db.models import Sum, F, Q, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import pre_delete, pre_save, post_save, post_delete
 from django.dispatch import receiver
+from .fields import TextoComprimidoField, JSONComprimidoField
+from .busca import normalizar
+from .backends import invalidar_usuario
+from .imagens import processar_upload, gravar_miniaturas
+from .storage import armazenamento_conteudo
+import itertools
 import sys
 
 
@@ -19,22 +26,72 @@ class Operador(models.Model):
         return self.nome
 
 
+# ✅ Editar/excluir usuário ou operador descarta o par em cache
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidar_usuario_em_cache(sender, instance, **kwargs):
+    invalidar_usuario(instance.pk)
+
+
+@receiver(post_save, sender=Operador)
+@receiver(post_delete, sender=Operador)
+def invalidar_operador_em_cache(sender, instance, **kwargs):
+    invalidar_usuario(instance.user_id)
+
+
 class Cliente(models.Model):
     nome = models.CharField(max_length=100)
     identidade = models.CharField(max_length=20)
     cpf = models.CharField(max_length=14, unique=True, null=True, blank=True)
     foto = models.ImageField(
-        upload_to='clientes/fotos/', null=True, blank=True)
+        upload_to='clientes/fotos/', storage=armazenamento_conteudo,
+        null=True, blank=True)
     organizacao_militar = models.CharField(
         max_length=100, null=True, blank=True)
     imagem_identidade = models.ImageField(
-        upload_to='identidades/', null=True, blank=True)
+        upload_to='identidades/', storage=armazenamento_conteudo,
+        null=True, blank=True)
     isAtivo = models.BooleanField(default=True)
+    # Nome normalizado (minúsculo, sem acentos) para a busca
+    nome_busca = models.CharField(max_length=100, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Listagem paginada por nome
+            models.Index(fields=['nome', 'id'], name='cliente_nome_idx'),
+        ]
 
     def __str__(self):
         return self.nome
 
 
+# Campos de imagem do Cliente que passam pelo processamento
+CAMPOS_IMAGEM_CLIENTE = ('foto', 'imagem_identidade')
+
+
+# ✅ Normaliza as imagens enviadas (e gera as miniaturas) antes de gravar
+@receiver(pre_save, sender=Cliente)
+def processar_imagens_cliente(sender, instance, **kwargs):
+    instance._miniaturas_novas = {}
+    for campo in CAMPOS_IMAGEM_CLIENTE:
+        arquivo = getattr(instance, campo)
+        if not arquivo or arquivo._committed:
+            continue
+        processado = processar_upload(arquivo)
+        if processado is not None:
+            arquivo, miniaturas = processado
+            setattr(instance, campo, arquivo)
+            instance._miniaturas_novas[campo] = miniaturas
+
+
+# ✅ Grava as miniaturas com o nome definitivo das imagens
+@receiver(post_save, sender=Cliente)
+def gravar_miniaturas_cliente(sender, instance, **kwargs):
+    for campo, miniaturas in getattr(instance, '_miniaturas_novas', {}).items():
+        gravar_miniaturas(getattr(instance, campo).name, miniaturas)
+    instance._miniaturas_novas = {}
+
+
 class Categoria(models.Model):
     nome = models.CharField(max_length=100, unique=True)
     descricao = models.TextField(blank=True)
@@ -43,45 +100,107 @@ class Categoria(models.Model):
         return self.nome
 
 
+class MaterialQuerySet(models.QuerySet):
+    def com_saldo(self):
+        """
+        Anota saldo_total, saldo_disponivel e saldo_emprestada: o saldo
+        compactado nas colunas quantidade_* somado aos movimentos de estoque
+        ainda não compactados.
+        """
+        anotacoes = {}
+        for campo in ('total', 'disponivel', 'emprestada'):
+            cauda = MovimentoEstoque.objects.filter(
+                material=OuterRef('pk'),
+                id__gt=OuterRef('movimento_compactado')
+            ).order_by().values('material').annotate(
+                soma=Sum(f'quantidade_{campo}')).values('soma')
+            anotacoes[f'saldo_{campo}'] = F(f'quantidade_{campo}') + Coalesce(
+                Subquery(cauda), Value(0))
+        return self.annotate(**anotacoes)
+
+    def recalcular_saldos(self):
+        """
+        Confere de uma vez o saldo dos materiais do queryset com os
+        empréstimos ativos (uma consulta agrupada) e grava as diferenças como
+        movimentos de ajuste num único INSERT. Retorna quantos materiais
+        foram ajustados.
+        """
+        # Um material pode vir repetido de um join (duas linhas na cautela)
+        materiais = list({
+            material.id: material for material in self.com_saldo().order_by()
+        }.values())
+        if not materiais:
+            return 0
+
+        emprestados = dict(EmprestimoMaterial.objects.filter(
+            material_id__in=[material.id for material in materiais],
+            emprestimo__isAtiva=True
+        ).order_by().values('material_id').annotate(
+            total=Sum('quantidade')).values_list('material_id', 'total'))
+
+        ajustes = []
+        for material in materiais:
+            if material.registro:
+                # Materiais com registro único
+                nova_emprestada = 1 if material.id in emprestados else 0
+                novo_disponivel = 1 - nova_emprestada
+            else:
+                # Materiais sem registro, sem valores negativos
+                nova_emprestada = max(emprestados.get(material.id, 0), 0)
+                novo_disponivel = max(material.saldo_total - nova_emprestada, 0)
+
+            if (novo_disponivel, nova_emprestada) != (
+                    material.saldo_disponivel, material.saldo_emprestada):
+                ajustes.append(MovimentoEstoque(
+                    material=material,
+                    tipo=TipoMovimento.AJUSTE,
+                    quantidade_disponivel=novo_disponivel - material.saldo_disponivel,
+                    quantidade_emprestada=nova_emprestada - material.saldo_emprestada,
+                ))
+
+        MovimentoEstoque.registrar(ajustes)
+        return len(ajustes)
+
+
 class Material(models.Model):
     categoria = models.ForeignKey(
         Categoria, on_delete=models.CASCADE, null=True, blank=True)
     nome = models.CharField(max_length=100)
     registro = models.CharField(
         max_length=50, blank=True, null=True, unique=True)
+
+    # Saldo compactado do livro de movimentos (MovimentoEstoque); o saldo
+    # atual é este somado aos movimentos com id > movimento_compactado.
     quantidade_total = models.PositiveIntegerField(default=0)
     quantidade_disponivel = models.PositiveIntegerField(default=0)
     quantidade_emprestada = models.PositiveIntegerField(default=0)
+    movimento_compactado = models.PositiveBigIntegerField(default=0)
+    # Nome normalizado (minúsculo, sem acentos) para a busca
+    nome_busca = models.CharField(max_length=100, blank=True, editable=False)
+
+    objects = MaterialQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Listagem por categoria e chaves (categoria, nome) do inventário
+            models.Index(fields=['categoria', 'nome', 'id'],
+                         name='material_categoria_nome_idx'),
+        ]
+
+    def saldo(self):
+        """
+        Saldo atual (total, disponível, emprestada) deste material.
+        """
+        material = Material.objects.com_saldo().get(pk=self.pk)
+        return (material.saldo_total, material.saldo_disponivel,
+                material.saldo_emprestada)
 
     def atualizar_quantidades(self):
         """
-        Atualiza automaticamente as quantidades com base nos empréstimos ativos.
+        Confere o saldo com os empréstimos ativos e registra um movimento de
+        ajuste se houver diferença.
         """
-        if self.registro:
-            # Materiais com registro único
-            emprestado = EmprestimoMaterial.objects.filter(
-                material=self,
-                emprestimo__isAtiva=True
-            ).exists()
-            self.quantidade_disponivel = 0 if emprestado else 1
-            self.quantidade_emprestada = 1 - self.quantidade_disponivel
-        else:
-            # Materiais sem registro
-            total_emprestado = EmprestimoMaterial.objects.filter(
-                material=self,
-                emprestimo__isAtiva=True
-            ).aggregate(total=Sum('quantidade'))['total'] or 0
-            self.quantidade_emprestada = total_emprestado
-            self.quantidade_disponivel = self.quantidade_total - total_emprestado
-
-            # Garantir que os valores não sejam negativos
-            if self.quantidade_disponivel < 0:
-                self.quantidade_disponivel = 0
-            if self.quantidade_emprestada < 0:
-                self.quantidade_emprestada = 0
-
-        self.save(update_fields=[
-                  'quantidade_disponivel', 'quantidade_emprestada'])
+        Material.objects.filter(pk=self.pk).recalcular_saldos()
 
 def save(self, *args, **kwargs):
     """
@@ -123,6 +242,12 @@ def save(self, *args, **kwargs):
         return f"{self.nome} (Total: {self.quantidade_total}, Disponível: {self.quantidade_disponivel})"
 
 
+@receiver(pre_save, sender=Cliente)
+@receiver(pre_save, sender=Material)
+def normalizar_nome_busca(sender, instance, **kwargs):
+    instance.nome_busca = normalizar(instance.nome)
+
+
 class StatusEmprestimo(models.TextChoices):
     ATIVADO = 'Ativado', 'Ativado'
     DESATIVADO = 'Desativado', 'Desativado'
@@ -140,13 +265,24 @@ class Emprestimo(models.Model):
     data_emprestimo = models.DateTimeField(auto_now_add=True)
     data_devolucao = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Listagem paginada (-data_emprestimo, -id)
+            models.Index(fields=['-data_emprestimo', '-id'],
+                         name='emprestimo_data_idx'),
+            # Cautelas ativas são poucas: índice parcial só com elas
+            models.Index(fields=['-data_emprestimo', '-id'],
+                         condition=Q(isAtiva=True),
+                         name='emprestimo_ativas_data_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         """
         Atualiza as quantidades dos materiais ao ativar/desativar.
         """
         super().save(*args, **kwargs)
-        for item in self.emprestimomaterial_set.all():
-            item.material.atualizar_quantidades()
+        Material.objects.filter(id__in=EmprestimoMaterial.objects.filter(
+            emprestimo=self).values('material_id')).recalcular_saldos()
 
     def __str__(self):
         return f"Empréstimo para {self.cliente.nome}"
@@ -157,31 +293,11 @@ class Emprestimo(models.Model):
 def atualizar_materiais_antes_exclusao(sender, instance, **kwargs):
     sys.stdout.flush()
 
-    for item in instance.emprestimomaterial_set.all():
-        material = item.material
-        sys.stdout.flush()
-
-        if material.registro:
-            # Materiais com registro único
-            material.quantidade_disponivel = 1
-            material.quantidade_emprestada = 0
-        else:
-            # Materiais sem registro
-            material.quantidade_emprestada -= item.quantidade
-            material.quantidade_disponivel += item.quantidade
-
-            # Garantir que os valores não fiquem negativos
-            if material.quantidade_emprestada < 0:
-                material.quantidade_emprestada = 0
-            if material.quantidade_disponivel > material.quantidade_total:
-                material.quantidade_disponivel = material.quantidade_total
-
-        sys.stdout.flush()
-
-        # Salva as mudanças nos materiais
-        material.save(
-            update_fields=['quantidade_disponivel', 'quantidade_emprestada'])
-        sys.stdout.flush()
+    # Devolve ao estoque os itens de uma cautela ainda ativa
+    if instance.isAtiva:
+        InventarioSnapshot.aplicar_emprestimo(instance, -1)
+        MovimentoEstoque.registrar(MovimentoEstoque.do_emprestimo(
+            instance, TipoMovimento.DEVOLUCAO))
 
     sys.stdout.flush()
 
@@ -203,6 +319,13 @@ class EmprestimoMaterial(models.Model):
     material = models.ForeignKey(Material, on_delete=models.CASCADE)
     quantidade = models.PositiveIntegerField(default=1)
 
+    class Meta:
+        indexes = [
+            # Itens ativos por material sem ler a tabela (índice de cobertura)
+            models.Index(fields=['material', 'emprestimo', 'quantidade'],
+                         name='emprestimomaterial_mat_emp_idx'),
+        ]
+
     def __str__(self):
         if self.material.registro:
             return f"{self.material.nome} - Registro: {self.material.registro} ({self.quantidade} unidade)"
@@ -235,7 +358,7 @@ class FuncaoAssinante(models.Model):
 
 
 class ProntoArmamento(models.Model):
-    data = models.DateField(auto_now_add=True)
+    data = models.DateField(auto_now_add=True, db_index=True)
     numero = models.PositiveIntegerField(unique=True)
     lacre = models.CharField(max_length=50)
 
@@ -254,8 +377,406 @@ class ProntoArmamento(models.Model):
     funcao_3 = models.ForeignKey(
         FuncaoAssinante, related_name='funcao_3', on_delete=models.CASCADE)
 
-    # Novo campo para armazenar diretamente as tabelas HTML
-    tabela = models.TextField()
+    # Tabelas HTML dos prontos antigos, gerados antes de `dados`
+    tabela = TextoComprimidoField(blank=True)
+
+    # Snapshot estruturado (categorias, totais, destinos e cases)
+    dados = JSONComprimidoField(null=True, blank=True)
+
+    # Colunas exibidas nas listagens, sem o corpo comprimido
+    CAMPOS_LISTAGEM = ('id', 'numero', 'data', 'lacre')
+
+    def categorias_materiais(self):
+        """
+        Categorias do snapshot no mesmo formato usado por pronto_tabelas.html.
+        """
+        return [
+            {
+                'categoria': categoria['categoria'],
+                'materiais': [
+                    {**material, 'destinos': dict(material['destinos'])}
+                    for material in categoria['materiais']
+                ]
+            }
+            for categoria in self.dados['categorias']
+        ]
 
     def __str__(self):
         return f"Pronto #{self.numero} - {self.data}"
+
+
+class InventarioSnapshot(models.Model):
+    """
+    Totais desnormalizados do Pronto do Armamento por (categoria, nome, destino).
+    A linha com destino nulo guarda os totais do nome; as demais guardam a
+    quantidade cautelada para cada destino.
+    """
+    categoria = models.ForeignKey(Categoria, on_delete=models.CASCADE)
+    nome = models.CharField(max_length=100)
+    destino = models.CharField(max_length=200, null=True, blank=True)
+    total_existente = models.IntegerField(default=0)
+    total_na_reserva = models.IntegerField(default=0)
+    total_emprestados = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['categoria', 'nome', 'destino'],
+                name='inventario_snapshot_unico'),
+            models.UniqueConstraint(
+                fields=['categoria', 'nome'],
+                condition=Q(destino__isnull=True),
+                name='inventario_snapshot_totais_unico'),
+        ]
+
+    @classmethod
+    def aplicar_emprestimo(cls, emprestimo, sinal):
+        """
+        Soma (sinal=1) ou subtrai (sinal=-1) os itens de uma cautela do snapshot.
+        Deve ser chamado na mesma transação da mudança de estado da cautela.
+        """
+        quantidades = {}
+        itens = EmprestimoMaterial.objects.filter(
+            emprestimo=emprestimo, material__categoria__isnull=False
+        ).values('material__categoria_id', 'material__nome', 'quantidade')
+        for item in itens:
+            chave = (item['material__categoria_id'], item['material__nome'])
+            quantidades[chave] = quantidades.get(chave, 0) + item['quantidade']
+
+        for (categoria_id, nome), quantidade in quantidades.items():
+            delta = sinal * quantidade
+            linhas = cls.objects.filter(categoria_id=categoria_id, nome=nome)
+            linhas.filter(destino__isnull=True).update(
+                total_na_reserva=F('total_na_reserva') - delta,
+                total_emprestados=F('total_emprestados') + delta)
+
+            destino = linhas.filter(destino=emprestimo.destino)
+            if not destino.update(total_emprestados=F('total_emprestados') + delta) and delta > 0:
+                cls.objects.create(
+                    categoria_id=categoria_id, nome=nome,
+                    destino=emprestimo.destino, total_emprestados=delta)
+            destino.filter(total_emprestados__lte=0).delete()
+
+        VersaoInventario.incrementar()
+
+    def __str__(self):
+        return f"{self.nome} - {self.destino or 'Totais'}"
+
+
+class VersaoInventario(models.Model):
+    """
+    Contador global incrementado a cada escrita que altera o inventário.
+    Usado como chave do cache do Pronto do Armamento. versao_cadastro só
+    avança quando o cadastro de materiais muda (inclusão, edição, exclusão).
+    """
+    versao = models.PositiveBigIntegerField(default=0)
+    versao_cadastro = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def atual(cls):
+        return cls.objects.filter(pk=1).values_list('versao', flat=True).first() or 0
+
+    @classmethod
+    def atuais(cls):
+        """
+        (versao, versao_cadastro) numa única leitura.
+        """
+        return cls.objects.filter(pk=1).values_list(
+            'versao', 'versao_cadastro').first() or (0, 0)
+
+    @classmethod
+    def incrementar(cls, cadastro=False):
+        """
+        Avança a versão depois do commit, num UPDATE próprio e curto: a linha
+        única não fica bloqueada durante a transação de quem escreve, e a
+        versão nova só aparece quando os dados já estão visíveis.
+        """
+        transaction.on_commit(lambda: cls._incrementar(cadastro))
+
+    @classmethod
+    def _incrementar(cls, cadastro):
+        campos = {'versao': F('versao') + 1}
+        if cadastro:
+            campos['versao_cadastro'] = F('versao_cadastro') + 1
+        if not cls.objects.filter(pk=1).update(**campos):
+            cls.objects.get_or_create(pk=1, defaults={
+                'versao': 1, 'versao_cadastro': 1 if cadastro else 0})
+
+
+# ✅ Invalida o cache do Pronto a cada escrita no inventário
+@receiver([post_save, post_delete], sender=Categoria)
+@receiver([post_save, post_delete], sender=Emprestimo)
+@receiver([post_save, post_delete], sender=EmprestimoMaterial)
+@receiver([post_save, post_delete], sender=Case)
+def incrementar_versao_inventario(sender, **kwargs):
+    VersaoInventario.incrementar()
+
+
+@receiver([post_save, post_delete], sender=Material)
+def incrementar_versao_cadastro(sender, **kwargs):
+    VersaoInventario.incrementar(cadastro=True)
+
+
+class ProntoResumoMensal(models.Model):
+    """
+    Quantidade de prontos por (ano, mês), usada na navegação do arquivo.
+    """
+    ano = models.PositiveSmallIntegerField()
+    mes = models.PositiveSmallIntegerField()
+    total = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['ano', 'mes'], name='pronto_resumo_mensal_unico'),
+        ]
+
+    @classmethod
+    def ajustar(cls, data, delta):
+        resumo = cls.objects.filter(ano=data.year, mes=data.month)
+        if not resumo.update(total=F('total') + delta) and delta > 0:
+            cls.objects.get_or_create(
+                ano=data.year, mes=data.month, defaults={'total': delta})
+        resumo.filter(total__lte=0).delete()
+
+    def __str__(self):
+        return f"{self.mes:02d}/{self.ano}: {self.total}"
+
+
+# ✅ Mantém o resumo mensal ao criar/excluir prontos
+@receiver(post_save, sender=ProntoArmamento)
+def incrementar_resumo_mensal(sender, instance, created, **kwargs):
+    if created:
+        ProntoResumoMensal.ajustar(instance.data, 1)
+
+
+@receiver(post_delete, sender=ProntoArmamento)
+def decrementar_resumo_mensal(sender, instance, **kwargs):
+    ProntoResumoMensal.ajustar(instance.data, -1)
+
+
+class TipoMovimento(models.TextChoices):
+    CADASTRO = 'Cadastro', 'Cadastro'
+    AJUSTE = 'Ajuste', 'Ajuste'
+    RETIRADA = 'Retirada', 'Retirada'
+    DEVOLUCAO = 'Devolução', 'Devolução'
+
+
+# Gravações no livro (por processo) entre duas compactações automáticas
+COMPACTAR_A_CADA = 200
+_gravacoes_livro = itertools.count(1)
+
+
+def _compactar_livro():
+    from .services import compactar_estoque
+    compactar_estoque()
+
+
+class MovimentoEstoque(models.Model):
+    """
+    Livro de movimentos de estoque, somente inclusão. Cada linha guarda a
+    variação das quantidades de um material; os saldos são compactados
+    periodicamente nas colunas de Material.
+    """
+    material = models.ForeignKey(Material, on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=20, choices=TipoMovimento.choices)
+    quantidade_total = models.IntegerField(default=0)
+    quantidade_disponivel = models.IntegerField(default=0)
+    quantidade_emprestada = models.IntegerField(default=0)
+    emprestimo = models.ForeignKey(
+        Emprestimo, on_delete=models.SET_NULL, null=True, blank=True)
+    data = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['material', 'id'],
+                         name='movimento_material_id_idx'),
+        ]
+
+    @classmethod
+    def registrar(cls, movimentos):
+        """
+        Grava os movimentos. Só as linhas dos materiais envolvidos são
+        bloqueadas (em ordem de id), para que a compactação nunca ultrapasse
+        um movimento ainda não confirmado desses materiais; não há bloqueio
+        global. A versão do inventário avança depois do commit e, a cada
+        COMPACTAR_A_CADA gravações no processo, a cauda do livro é compactada.
+        """
+        movimentos = [
+            movimento for movimento in movimentos
+            if movimento.quantidade_total or movimento.quantidade_disponivel
+            or movimento.quantidade_emprestada
+        ]
+        if not movimentos:
+            return
+
+        with transaction.atomic():
+            list(Material.objects.select_for_update().filter(
+                id__in={movimento.material_id for movimento in movimentos}
+            ).order_by('id').values_list('id', flat=True))
+            cls.objects.bulk_create(movimentos)
+            VersaoInventario.incrementar()
+            if next(_gravacoes_livro) % COMPACTAR_A_CADA == 0:
+                transaction.on_commit(_compactar_livro)
+
+    @classmethod
+    def dos_itens(cls, itens, tipo):
+        """
+        Movimentos de retirada ou devolução de itens de uma ou mais cautelas.
+        """
+        sinal = -1 if tipo == TipoMovimento.RETIRADA else 1
+        return [
+            cls(
+                material_id=item.material_id,
+                tipo=tipo,
+                quantidade_disponivel=sinal * item.quantidade,
+                quantidade_emprestada=-sinal * item.quantidade,
+                emprestimo_id=item.emprestimo_id,
+            )
+            for item in itens
+        ]
+
+    @classmethod
+    def do_emprestimo(cls, emprestimo, tipo, itens=None):
+        """
+        Movimentos de retirada ou devolução dos itens de uma cautela.
+        """
+        if itens is None:
+            itens = emprestimo.emprestimomaterial_set.all()
+        return cls.dos_itens(itens, tipo)
+
+    def __str__(self):
+        return f"{self.tipo} de {self.material_id} em {self.data}"
+
+
+class TipoDocumento(models.TextChoices):
+    CAUTELA = 'cautela', 'Cautelas'
+    CLIENTE = 'cliente', 'Clientes'
+    MATERIAL = 'material', 'Materiais'
+    CASE = 'case', 'Cases'
+    PRONTO = 'pronto', 'Prontos'
+
+
+TIPOS_DOCUMENTO = {
+    Emprestimo: TipoDocumento.CAUTELA,
+    Cliente: TipoDocumento.CLIENTE,
+    Material: TipoDocumento.MATERIAL,
+    Case: TipoDocumento.CASE,
+    ProntoArmamento: TipoDocumento.PRONTO,
+}
+
+# Campos que entram no texto indexado de cada modelo
+CAMPOS_DOCUMENTO = {
+    Emprestimo: {'cliente', 'destino'},
+    Cliente: {'nome', 'identidade', 'cpf', 'organizacao_militar'},
+    Material: {'nome', 'registro'},
+    Case: {'descricao', 'responsavel', 'lacre'},
+    ProntoArmamento: {'numero', 'lacre'},
+}
+
+
+class DocumentoBusca(models.Model):
+    """
+    Texto normalizado de cada cautela, cliente, material, case e pronto,
+    mantido por sinais e indexado para a busca global (FTS5 no SQLite,
+    tsvector no Postgres).
+    """
+    tipo = models.CharField(max_length=10, choices=TipoDocumento.choices)
+    objeto_id = models.PositiveBigIntegerField()
+    titulo = models.CharField(max_length=255)
+    detalhe = models.CharField(max_length=255, blank=True)
+    texto = models.TextField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['tipo', 'objeto_id'], name='documento_busca_unico'),
+        ]
+
+    @staticmethod
+    def conteudo(instance):
+        """
+        (tipo, título, detalhe, partes do texto) de um objeto indexável.
+        """
+        if isinstance(instance, Emprestimo):
+            itens = instance.emprestimomaterial_set.all()
+            if 'emprestimomaterial_set' not in getattr(
+                    instance, '_prefetched_objects_cache', {}):
+                itens = itens.select_related('material')
+            itens = [
+                f"{item.material.nome} {item.material.registro or ''}"
+                for item in itens
+            ]
+            return (TipoDocumento.CAUTELA,
+                    f"Cautela #{instance.pk} - {instance.cliente.nome}",
+                    instance.destino,
+                    [instance.cliente.nome, instance.destino, *itens])
+        if isinstance(instance, Cliente):
+            return (TipoDocumento.CLIENTE, instance.nome,
+                    instance.organizacao_militar or '',
+                    [instance.nome, instance.identidade, instance.cpf or '',
+                     instance.organizacao_militar or ''])
+        if isinstance(instance, Material):
+            return (TipoDocumento.MATERIAL, instance.nome,
+                    instance.registro or '',
+                    [instance.nome, instance.registro or ''])
+        if isinstance(instance, Case):
+            return (TipoDocumento.CASE, instance.descricao,
+                    f"Lacre {instance.lacre}",
+                    [instance.descricao, instance.responsavel, instance.lacre])
+        if isinstance(instance, ProntoArmamento):
+            return (TipoDocumento.PRONTO, f"Pronto Nº {instance.numero}",
+                    f"Lacre {instance.lacre}",
+                    [str(instance.numero), instance.lacre,
+                     instance.data.strftime('%d/%m/%Y') if instance.data else ''])
+        raise TypeError(f"{type(instance).__name__} não é indexável.")
+
+    @classmethod
+    def documento(cls, instance):
+        tipo, titulo, detalhe, partes = cls.conteudo(instance)
+        return cls(tipo=tipo, objeto_id=instance.pk, titulo=titulo[:255],
+                   detalhe=detalhe[:255], texto=normalizar(' '.join(partes)))
+
+    @classmethod
+    def indexar(cls, instance):
+        documento = cls.documento(instance)
+        cls.objects.update_or_create(
+            tipo=documento.tipo, objeto_id=documento.objeto_id,
+            defaults={'titulo': documento.titulo, 'detalhe': documento.detalhe,
+                      'texto': documento.texto})
+
+    def __str__(self):
+        return f"{self.get_tipo_display()}: {self.titulo}"
+
+
+# ✅ Mantém o índice da busca global em dia
+@receiver(post_save, sender=Emprestimo)
+@receiver(post_save, sender=Cliente)
+@receiver(post_save, sender=Material)
+@receiver(post_save, sender=Case)
+@receiver(post_save, sender=ProntoArmamento)
+def indexar_documento_busca(sender, instance, update_fields=None, **kwargs):
+    # Saves parciais que não tocam o texto (ex.: status) não reindexam
+    if update_fields is not None and not CAMPOS_DOCUMENTO[sender] & set(update_fields):
+        return
+    DocumentoBusca.indexar(instance)
+
+    # O nome do cliente aparece no título das cautelas dele
+    if sender is Cliente and not kwargs.get('created'):
+        desatualizadas = DocumentoBusca.objects.filter(
+            tipo=TipoDocumento.CAUTELA,
+            objeto_id__in=instance.emprestimo_set.values('id'),
+        ).exclude(titulo__endswith=f" - {instance.nome}").values('objeto_id')
+        for emprestimo in Emprestimo.objects.filter(
+                id__in=desatualizadas).select_related('cliente'):
+            DocumentoBusca.indexar(emprestimo)
+
+
+@receiver(post_delete, sender=Emprestimo)
+@receiver(post_delete, sender=Cliente)
+@receiver(post_delete, sender=Material)
+@receiver(post_delete, sender=Case)
+@receiver(post_delete, sender=ProntoArmamento)
+def remover_documento_busca(sender, instance, **kwargs):
+    DocumentoBusca.objects.filter(
+        tipo=TIPOS_DOCUMENTO[sender], objeto_id=instance.pk).delete()
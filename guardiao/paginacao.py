@@ -0,0 +1,134 @@
+import base64
+import json
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+TAMANHO_PAGINA = 50
+
+
+def _codificar(valores):
+    texto = json.dumps(valores, default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii')
+
+
+def _decodificar(cursor, model, campos):
+    try:
+        valores = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if len(valores) != len(campos):
+            return None
+        return [
+            model._meta.get_field(campo).to_python(valor)
+            for campo, valor in zip(campos, valores)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        # Cursor adulterado ou de outra listagem: volta à primeira página
+        return None
+
+
+class PaginaKeyset:
+    """
+    Uma página de resultados paginada por cursor (keyset). A posição é
+    guardada nos valores da ordenação do último/primeiro item, então o custo
+    não depende de quantas páginas ficaram para trás e não há COUNT(*).
+    """
+
+    def __init__(self, request, itens, ordenacao, tem_proxima, tem_anterior):
+        self.request = request
+        self.itens = itens
+        self.ordenacao = ordenacao
+        self.tem_proxima = tem_proxima
+        self.tem_anterior = tem_anterior
+
+    def __iter__(self):
+        return iter(self.itens)
+
+    def __len__(self):
+        return len(self.itens)
+
+    def _chave(self, item):
+        return [getattr(item, campo.lstrip('-')) for campo in self.ordenacao]
+
+    def _url(self, parametro, item):
+        # Preserva os filtros da listagem e troca apenas o cursor
+        parametros = self.request.GET.copy()
+        parametros.pop('apos', None)
+        parametros.pop('antes', None)
+        parametros[parametro] = _codificar(self._chave(item))
+        return f"?{parametros.urlencode()}"
+
+    @property
+    def url_proxima(self):
+        if self.tem_proxima and self.itens:
+            return self._url('apos', self.itens[-1])
+        return None
+
+    @property
+    def url_anterior(self):
+        if self.tem_anterior and self.itens:
+            return self._url('antes', self.itens[0])
+        return None
+
+    @property
+    def url_primeira(self):
+        parametros = self.request.GET.copy()
+        parametros.pop('apos', None)
+        parametros.pop('antes', None)
+        return f"?{parametros.urlencode()}"
+
+
+def _filtro_keyset(ordenacao, valores, para_tras):
+    """
+    Condição "depois de (v1, v2, ...)" na ordenação informada, expandida em
+    OR de prefixos iguais seguidos de uma comparação estrita.
+    """
+    condicoes = []
+    for i, campo in enumerate(ordenacao):
+        nome = campo.lstrip('-')
+        decrescente = campo.startswith('-') != para_tras
+        igualdades = {
+            anterior.lstrip('-'): valor
+            for anterior, valor in zip(ordenacao[:i], valores[:i])
+        }
+        comparacao = 'lt' if decrescente else 'gt'
+        condicoes.append(Q(**igualdades, **{f'{nome}__{comparacao}': valores[i]}))
+    return reduce(or_, condicoes)
+
+
+def paginar(request, queryset, ordenacao, tamanho=TAMANHO_PAGINA):
+    """
+    Pagina `queryset` por keyset usando os parâmetros GET `apos`/`antes`.
+    O último campo de `ordenacao` deve ser único (normalmente 'id' ou
+    '-id') para que a ordem seja estável.
+    """
+    ordenacao = tuple(ordenacao)
+    campos = [campo.lstrip('-') for campo in ordenacao]
+    model = queryset.model
+
+    apos = request.GET.get('apos')
+    antes = request.GET.get('antes')
+    cursor = _decodificar(apos or antes, model, campos) if (apos or antes) else None
+    para_tras = bool(antes) and cursor is not None
+
+    if para_tras:
+        invertida = [
+            campo[1:] if campo.startswith('-') else f'-{campo}'
+            for campo in ordenacao
+        ]
+        itens = list(queryset.filter(
+            _filtro_keyset(ordenacao, cursor, True)
+        ).order_by(*invertida)[:tamanho + 1])
+        tem_anterior = len(itens) > tamanho
+        itens = itens[:tamanho][::-1]
+        tem_proxima = True
+    else:
+        if cursor is not None:
+            queryset = queryset.filter(_filtro_keyset(ordenacao, cursor, False))
+        itens = list(queryset.order_by(*ordenacao)[:tamanho + 1])
+        tem_proxima = len(itens) > tamanho
+        itens = itens[:tamanho]
+        tem_anterior = cursor is not None
+
+    return PaginaKeyset(request, itens, ordenacao, tem_proxima, tem_anterior)
@@ -0,0 +1,50 @@
+from django.urls import URLPattern, URLResolver, get_resolver
+
+# Operadores deste nível em diante acessam todas as páginas
+NIVEL_TOTAL = 3
+
+# Rotas abertas a qualquer operador e prefixos fora do controle de nível
+ROTAS_LIVRES = frozenset({'login', 'logout'})
+PREFIXOS_LIVRES = ('/admin/',)
+
+
+class RegistroPermissoes:
+    """
+    Tabela rota -> nível mínimo, montada uma vez a partir do URLconf com os
+    níveis declarados por @nivel_acesso_minimo. Para cada nível abaixo do
+    total guarda um frozenset das rotas permitidas; rotas sem nível
+    declarado exigem o nível total.
+    """
+
+    def __init__(self):
+        self._permitidas = None
+
+    @staticmethod
+    def _rotas(padroes):
+        for padrao in padroes:
+            if isinstance(padrao, URLResolver):
+                if padrao.namespace is None:
+                    yield from RegistroPermissoes._rotas(padrao.url_patterns)
+            elif isinstance(padrao, URLPattern) and padrao.name:
+                yield padrao.name, getattr(padrao.callback, 'nivel_acesso_minimo', None)
+
+    def compilar(self, urlconf=None):
+        niveis = {
+            nome: nivel
+            for nome, nivel in self._rotas(get_resolver(urlconf).url_patterns)
+            if nivel is not None
+        }
+        self._permitidas = {
+            nivel: frozenset(nome for nome, minimo in niveis.items() if minimo <= nivel)
+            for nivel in range(1, NIVEL_TOTAL)
+        }
+
+    def permitido(self, nivel, rota):
+        if nivel >= NIVEL_TOTAL or rota in ROTAS_LIVRES:
+            return True
+        if self._permitidas is None:
+            self.compilar()
+        return rota in self._permitidas.get(nivel, ())
+
+
+registro_permissoes = RegistroPermissoes()
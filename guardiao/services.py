@@ -0,0 +1,690 @@
+import gzip
+import posixpath
+import re
+import threading
+from datetime import date, datetime, time, timedelta
+from functools import reduce
+from operator import or_
+
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Q, Sum, Max
+from django.template.loader import render_to_string
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from PIL import UnidentifiedImageError
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Codificações pré-comprimidas, em ordem de preferência
+CODIFICACOES = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+from .models import (
+    Categoria, Material, EmprestimoMaterial, InventarioSnapshot, Case,
+    VersaoInventario, ProntoArmamento, MovimentoEstoque, TipoMovimento,
+    Emprestimo, EmprestimoHistorico, StatusEmprestimo, DocumentoBusca,
+    Cliente, TIPOS_DOCUMENTO, CAMPOS_IMAGEM_CLIENTE
+)
+from .imagens import PASTA_MINIATURAS, gerar_miniaturas
+
+PRONTO_CACHE_TIMEOUT = 60 * 60
+
+# Travas do recálculo do Pronto por chave de versão. Ficam no dicionário
+# (só as LIMITE_TRAVAS mais recentes): quem chega depois do dono espera na
+# mesma trava em vez de criar outra e recalcular junto.
+LIMITE_TRAVAS = 8
+_travas = {}
+_travas_lock = threading.Lock()
+
+
+def _calcular_inventario(chaves=None):
+    """
+    Calcula os totais/destinos por (categoria_id, nome) a partir dos materiais
+    e das cautelas ativas. Se `chaves` for informado, restringe o cálculo a
+    esses pares.
+    """
+    materiais = Material.objects.filter(categoria__isnull=False)
+    if chaves is not None:
+        if not chaves:
+            return {}
+        materiais = materiais.filter(reduce(or_, (
+            Q(categoria_id=categoria_id, nome=nome)
+            for categoria_id, nome in chaves
+        )))
+
+    emprestimos = EmprestimoMaterial.objects.filter(
+        emprestimo__isAtiva=True,
+        material__in=materiais.values('id')
+    ).values(
+        'material_id', 'material__nome', 'material__categoria_id',
+        'emprestimo__destino', 'quantidade'
+    ).order_by('id')
+
+    materiais = materiais.com_saldo().values(
+        'id', 'categoria_id', 'nome', 'registro', 'saldo_total',
+        'saldo_disponivel', 'saldo_emprestada'
+    ).order_by('nome')
+
+    # Organizar destinos e materiais com registro emprestados
+    destinos = {}
+    emprestados = set()
+    for emprestimo in emprestimos:
+        chave = (emprestimo['material__categoria_id'],
+                 emprestimo['material__nome'])
+        destino = emprestimo['emprestimo__destino']
+        destinos_material = destinos.setdefault(chave, {})
+        destinos_material[destino] = destinos_material.get(
+            destino, 0) + emprestimo['quantidade']
+        emprestados.add(emprestimo['material_id'])
+
+    # Agregar materiais por categoria e nome
+    agregados = {}
+    for material in materiais:
+        chave = (material['categoria_id'], material['nome'])
+        if chave not in agregados:
+            agregados[chave] = {
+                'nome': material['nome'],
+                'total_existente': 0,
+                'total_na_reserva': 0,
+                'total_emprestados': 0,
+                'destinos': destinos.get(chave, {})
+            }
+
+        agregado = agregados[chave]
+        if material['registro']:
+            # Materiais com registro único
+            emprestado = material['id'] in emprestados
+            agregado['total_existente'] += 1
+            agregado['total_emprestados'] += 1 if emprestado else 0
+            agregado['total_na_reserva'] += 0 if emprestado else 1
+        else:
+            # Materiais sem registro (com quantidade)
+            agregado['total_existente'] += material['saldo_total']
+            agregado['total_na_reserva'] += material['saldo_disponivel']
+            agregado['total_emprestados'] += material['saldo_emprestada']
+
+    return agregados
+
+
+def _agrupar_por_categoria(categorias, agregados):
+    materiais_por_categoria = {categoria.id: [] for categoria in categorias}
+    for (categoria_id, _), agregado in agregados.items():
+        if categoria_id in materiais_por_categoria:
+            materiais_por_categoria[categoria_id].append(agregado)
+
+    return [
+        {
+            'categoria': categoria.nome,
+            'materiais': materiais_por_categoria[categoria.id]
+        }
+        for categoria in categorias
+    ]
+
+
+def agregar_pronto_armamento():
+    """
+    Monta a estrutura categoria -> nome do material -> totais/destinos usada
+    nas telas do Pronto do Armamento, com um número fixo de consultas.
+    """
+    categorias = list(Categoria.objects.all())
+    return _agrupar_por_categoria(categorias, _calcular_inventario())
+
+
+def ler_pronto_armamento():
+    """
+    Mesma estrutura de `agregar_pronto_armamento`, lida do InventarioSnapshot.
+    """
+    categorias = list(Categoria.objects.all())
+    linhas = InventarioSnapshot.objects.values(
+        'categoria_id', 'nome', 'destino', 'total_existente',
+        'total_na_reserva', 'total_emprestados'
+    ).order_by('nome', 'id')
+
+    agregados = {}
+    for linha in linhas:
+        chave = (linha['categoria_id'], linha['nome'])
+        agregado = agregados.setdefault(chave, {
+            'nome': linha['nome'],
+            'total_existente': 0,
+            'total_na_reserva': 0,
+            'total_emprestados': 0,
+            'destinos': {}
+        })
+        if linha['destino'] is None:
+            agregado['total_existente'] = linha['total_existente']
+            agregado['total_na_reserva'] = linha['total_na_reserva']
+            agregado['total_emprestados'] = linha['total_emprestados']
+        else:
+            agregado['destinos'][linha['destino']] = linha['total_emprestados']
+
+    return _agrupar_por_categoria(categorias, agregados)
+
+
+def _trava(chave):
+    with _travas_lock:
+        trava = _travas.get(chave)
+        if trava is None:
+            trava = _travas[chave] = threading.Lock()
+            # Versões antigas não são mais pedidas: descarta as mais velhas
+            while len(_travas) > LIMITE_TRAVAS:
+                del _travas[next(iter(_travas))]
+        return trava
+
+
+def obter_pronto_armamento():
+    """
+    Retorna (versao, dados) do Pronto do Armamento. Os dados ficam no cache
+    até a VersaoInventario mudar, e apenas uma thread por worker os recalcula.
+    """
+    versao = VersaoInventario.atual()
+    chave = f'pronto_armamento:{versao}'
+    dados = cache.get(chave)
+
+    if dados is None:
+        with _trava(chave):
+            dados = cache.get(chave)
+            if dados is None:
+                dados = {
+                    'categorias_materiais': ler_pronto_armamento(),
+                    'cases': list(Case.objects.values(
+                        'descricao', 'responsavel', 'lacre')),
+                }
+                cache.set(chave, dados, PRONTO_CACHE_TIMEOUT)
+
+    return versao, dados
+
+
+def montar_dados_pronto():
+    """
+    Payload estruturado gravado em ProntoArmamento.dados. Os destinos são
+    guardados como pares para preservar a ordem no jsonb.
+    """
+    _, dados = obter_pronto_armamento()
+    return {
+        'categorias': [
+            {
+                'categoria': categoria['categoria'],
+                'materiais': [
+                    {
+                        'nome': material['nome'],
+                        'total_existente': material['total_existente'],
+                        'total_na_reserva': material['total_na_reserva'],
+                        'total_emprestados': material['total_emprestados'],
+                        'destinos': list(material['destinos'].items()),
+                    }
+                    for material in categoria['materiais']
+                ]
+            }
+            for categoria in dados['categorias_materiais']
+        ],
+        'cases': dados['cases'],
+    }
+
+
+def intervalo_mes(ano, mes):
+    """
+    Intervalo semiaberto [início, fim) de um mês, para consultas por `data`
+    que aproveitam o índice.
+    """
+    inicio = date(ano, mes, 1)
+    fim = date(ano + 1, 1, 1) if mes == 12 else date(ano, mes + 1, 1)
+    return inicio, fim
+
+
+def intervalo_datas(data_inicio, data_fim):
+    """
+    Converte as datas AAAA-MM-DD de um filtro (ambas inclusivas e opcionais)
+    no intervalo semiaberto [início, fim) de datetimes locais, para filtrar
+    campos de data e hora pelo índice. Datas inválidas geram ValueError.
+    """
+    limites = []
+    for valor, dias in ((data_inicio, 0), (data_fim, 1)):
+        if not valor:
+            limites.append(None)
+            continue
+        data = parse_date(valor)
+        if data is None:
+            raise ValueError(f"Data inválida: {valor}")
+        limites.append(timezone.make_aware(
+            datetime.combine(data + timedelta(days=dias), time.min)))
+    return tuple(limites)
+
+
+def escolher_codificacao(request):
+    """
+    Melhor codificação pré-comprimida aceita pelo cliente, ou 'identity'.
+    """
+    aceitas = request.META.get('HTTP_ACCEPT_ENCODING', '')
+    for codificacao in CODIFICACOES:
+        if re.search(rf'\b{codificacao}\b', aceitas):
+            return codificacao
+    return 'identity'
+
+
+def _chave_pronto_renderizado(pronto, variante):
+    return f'pronto_renderizado:{pronto.id}:{pronto.numero}:{variante}'
+
+
+def obter_pronto_renderizado(request, pronto, variante):
+    """
+    Corpos da página de um pronto já renderizados e pré-comprimidos, por
+    codificação ('identity', 'gzip' e, se disponível, 'br'). Como o pronto
+    não muda depois de gerado, o cache só é invalidado na exclusão.
+    """
+    chave = _chave_pronto_renderizado(pronto, variante)
+    corpos = cache.get(chave)
+
+    if corpos is None:
+        pronto = ProntoArmamento.objects.select_related(
+            'assinante_1', 'funcao_1', 'assinante_2', 'funcao_2',
+            'assinante_3', 'funcao_3'
+        ).get(pk=pronto.pk)
+        html = render_to_string(
+            'visualizar_pronto.html', {'pronto': pronto}, request).encode('utf-8')
+        corpos = {
+            'identity': html,
+            'gzip': gzip.compress(html, compresslevel=9, mtime=0),
+        }
+        if brotli is not None:
+            corpos['br'] = brotli.compress(html)
+        cache.set(chave, corpos, None)
+
+    return corpos
+
+
+def invalidar_pronto_renderizado(pronto):
+    cache.delete_many([
+        _chave_pronto_renderizado(pronto, variante)
+        for variante in ('leitura', 'excluir')
+    ])
+
+
+def _linhas_snapshot(agregados):
+    linhas = []
+    for (categoria_id, nome), agregado in agregados.items():
+        linhas.append(InventarioSnapshot(
+            categoria_id=categoria_id,
+            nome=nome,
+            total_existente=agregado['total_existente'],
+            total_na_reserva=agregado['total_na_reserva'],
+            total_emprestados=agregado['total_emprestados'],
+        ))
+        for destino, quantidade in agregado['destinos'].items():
+            linhas.append(InventarioSnapshot(
+                categoria_id=categoria_id,
+                nome=nome,
+                destino=destino,
+                total_emprestados=quantidade,
+            ))
+    return linhas
+
+
+def chave_inventario(material):
+    """
+    Chave (categoria_id, nome) de um material no InventarioSnapshot.
+    """
+    return (material.categoria_id, material.nome)
+
+
+@transaction.atomic
+def recalcular_inventario(chaves):
+    """
+    Recalcula do zero as linhas do snapshot das chaves (categoria_id, nome)
+    informadas. Usado quando o cadastro de materiais muda.
+    """
+    chaves = {chave for chave in chaves if chave[0] is not None}
+    if not chaves:
+        return
+
+    InventarioSnapshot.objects.filter(reduce(or_, (
+        Q(categoria_id=categoria_id, nome=nome)
+        for categoria_id, nome in chaves
+    ))).delete()
+    InventarioSnapshot.objects.bulk_create(
+        _linhas_snapshot(_calcular_inventario(chaves)))
+    VersaoInventario.incrementar()
+
+
+@transaction.atomic
+def reconstruir_inventario():
+    """
+    Regenera todo o snapshot a partir dos dados atuais e retorna as
+    divergências encontradas como (categoria_id, nome, destino, atual, correto).
+    """
+    campos = ('total_existente', 'total_na_reserva', 'total_emprestados')
+    atuais = {
+        (linha['categoria_id'], linha['nome'], linha['destino']):
+            tuple(linha[campo] for campo in campos)
+        for linha in InventarioSnapshot.objects.select_for_update().values(
+            'categoria_id', 'nome', 'destino', *campos)
+    }
+
+    novas = _linhas_snapshot(_calcular_inventario())
+    corretas = {
+        (linha.categoria_id, linha.nome, linha.destino):
+            tuple(getattr(linha, campo) for campo in campos)
+        for linha in novas
+    }
+
+    divergencias = [
+        (*chave, atuais.get(chave), corretas.get(chave))
+        for chave in sorted(atuais.keys() | corretas.keys(), key=str)
+        if atuais.get(chave) != corretas.get(chave)
+    ]
+
+    InventarioSnapshot.objects.all().delete()
+    InventarioSnapshot.objects.bulk_create(novas)
+    VersaoInventario.incrementar()
+    return divergencias
+
+
+def registrar_entrada(material, quantidade):
+    """
+    Entrada no estoque de um material recém-cadastrado, registrada no livro
+    de movimentos: 1 para materiais com registro, `quantidade` para os demais.
+    """
+    entrada = 1 if material.registro else int(quantidade or 0)
+    MovimentoEstoque.registrar([MovimentoEstoque(
+        material=material,
+        tipo=TipoMovimento.CADASTRO,
+        quantidade_total=entrada,
+        quantidade_disponivel=entrada
+    )])
+
+
+def validar_disponibilidade(itens):
+    """
+    Bloqueia numa única consulta os materiais dos itens (material_id,
+    quantidade) e confere em memória, contra o saldo, se todos podem ser
+    emprestados agora. Levanta ValueError com o primeiro item indisponível.
+    Retorna a lista de (material, quantidade), com quantidade 1 para os
+    materiais com registro. Deve rodar dentro da transação que os retira.
+    """
+    itens = [(int(material_id), int(quantidade)) for material_id, quantidade in itens]
+    materiais = Material.objects.select_for_update().com_saldo().in_bulk(
+        {material_id for material_id, _ in itens})
+    if len(materiais) != len({material_id for material_id, _ in itens}):
+        raise Material.DoesNotExist
+
+    com_registro = [m.id for m in materiais.values() if m.registro]
+    emprestados = set(EmprestimoMaterial.objects.filter(
+        material_id__in=com_registro, emprestimo__isAtiva=True
+    ).values_list('material_id', flat=True)) if com_registro else set()
+
+    registros = set()
+    pedidos = {}
+    validados = []
+    for material_id, quantidade in itens:
+        material = materiais[material_id]
+        if quantidade < 1:
+            raise ValueError(
+                f"Quantidade inválida para o material '{material.nome}'.")
+
+        # Validação para materiais com registro único
+        if material.registro:
+            if material_id in emprestados or material_id in registros:
+                raise ValueError(
+                    f"O material '{material.nome}' com registro '{material.registro}' já está emprestado.")
+            registros.add(material_id)
+            quantidade = 1
+
+        # Validação para materiais sem registro
+        else:
+            pedidos[material_id] = pedidos.get(material_id, 0) + quantidade
+            if material.saldo_disponivel < pedidos[material_id]:
+                raise ValueError(
+                    f"O material '{material.nome}' não possui quantidade suficiente disponível.")
+
+        validados.append((material, quantidade))
+    return validados
+
+
+@transaction.atomic
+def registrar_itens_emprestimo(emprestimo, itens):
+    """
+    Registra em lote os itens (material_id, quantidade) de uma cautela nova.
+    A disponibilidade é validada por validar_disponibilidade e as retiradas
+    entram no livro de movimentos. Levanta ValueError, desfazendo tudo, se
+    algum item não puder ser emprestado.
+    """
+    linhas = [
+        EmprestimoMaterial(
+            emprestimo=emprestimo, material=material, quantidade=quantidade)
+        for material, quantidade in validar_disponibilidade(itens)
+    ]
+
+    EmprestimoMaterial.objects.bulk_create(linhas)
+    MovimentoEstoque.registrar(MovimentoEstoque.do_emprestimo(
+        emprestimo, TipoMovimento.RETIRADA, linhas))
+    InventarioSnapshot.aplicar_emprestimo(emprestimo, 1)
+    # Reindexa a cautela já com os itens (o bulk_create não emite sinais)
+    DocumentoBusca.indexar(emprestimo)
+
+
+@transaction.atomic
+def devolver_emprestimos(emprestimos, operador):
+    """
+    Devolução em lote: desativa as cautelas ativas do queryset com um único
+    UPDATE, grava o histórico e os movimentos de devolução com bulk_create e
+    recalcula o snapshot só das chaves afetadas. Retorna quantas cautelas
+    foram devolvidas.
+    """
+    ids = list(emprestimos.filter(isAtiva=True).select_for_update()
+               .order_by().values_list('id', flat=True))
+    if not ids:
+        return 0
+
+    itens = list(EmprestimoMaterial.objects.filter(
+        emprestimo_id__in=ids).select_related('material'))
+
+    Emprestimo.objects.filter(id__in=ids).update(isAtiva=False)
+    EmprestimoHistorico.objects.bulk_create([
+        EmprestimoHistorico(emprestimo_id=emprestimo_id,
+                            status=StatusEmprestimo.DESATIVADO,
+                            operador=operador)
+        for emprestimo_id in ids
+    ])
+    MovimentoEstoque.registrar(
+        MovimentoEstoque.dos_itens(itens, TipoMovimento.DEVOLUCAO))
+    recalcular_inventario({chave_inventario(item.material) for item in itens})
+    return len(ids)
+
+
+def _somar_movimentos(movimentos):
+    return {
+        linha['material_id']: linha
+        for linha in movimentos.order_by().values('material_id').annotate(
+            total=Sum('quantidade_total'),
+            disponivel=Sum('quantidade_disponivel'),
+            emprestada=Sum('quantidade_emprestada'),
+        )
+    }
+
+
+@transaction.atomic
+def compactar_estoque():
+    """
+    Incorpora às colunas de Material os movimentos ainda não compactados e
+    avança a marca movimento_compactado. Os materiais com movimentos
+    pendentes ficam bloqueados durante a compactação. Retorna o número de
+    materiais atualizados.
+    """
+    pendentes = MovimentoEstoque.objects.filter(
+        id__gt=models.F('material__movimento_compactado'))
+    ids = set(pendentes.values_list('material_id', flat=True))
+    if not ids:
+        return 0
+
+    materiais = list(Material.objects.select_for_update().filter(
+        id__in=ids).order_by('id'))
+    limite = MovimentoEstoque.objects.filter(
+        material_id__in=ids).aggregate(limite=Max('id'))['limite']
+    somas = _somar_movimentos(MovimentoEstoque.objects.filter(
+        material_id__in=ids, id__lte=limite,
+        id__gt=models.F('material__movimento_compactado')))
+
+    for material in materiais:
+        soma = somas.get(material.id)
+        if soma:
+            material.quantidade_total += soma['total']
+            material.quantidade_disponivel += soma['disponivel']
+            material.quantidade_emprestada += soma['emprestada']
+        material.movimento_compactado = limite
+
+    Material.objects.bulk_update(materiais, [
+        'quantidade_total', 'quantidade_disponivel', 'quantidade_emprestada',
+        'movimento_compactado'
+    ], batch_size=500)
+    return len(materiais)
+
+
+@transaction.atomic
+def reconstruir_estoque():
+    """
+    Recalcula do zero o saldo de todos os materiais somando o livro de
+    movimentos inteiro. Retorna as divergências encontradas como tuplas
+    (material_id, saldo_atual, saldo_correto).
+    """
+    materiais = list(Material.objects.select_for_update().com_saldo().order_by('id'))
+    limite = MovimentoEstoque.objects.aggregate(limite=Max('id'))['limite'] or 0
+    somas = _somar_movimentos(MovimentoEstoque.objects.filter(id__lte=limite))
+
+    divergencias = []
+    for material in materiais:
+        soma = somas.get(material.id, {'total': 0, 'disponivel': 0, 'emprestada': 0})
+        atual = (material.saldo_total, material.saldo_disponivel,
+                 material.saldo_emprestada)
+        correto = (soma['total'], soma['disponivel'], soma['emprestada'])
+        if atual != correto:
+            divergencias.append((material.id, atual, correto))
+        (material.quantidade_total, material.quantidade_disponivel,
+         material.quantidade_emprestada) = correto
+        material.movimento_compactado = limite
+
+    Material.objects.bulk_update(materiais, [
+        'quantidade_total', 'quantidade_disponivel', 'quantidade_emprestada',
+        'movimento_compactado'
+    ], batch_size=500)
+    if divergencias:
+        # Saldos mudaram sem movimento novo: força releitura completa
+        VersaoInventario.incrementar(cadastro=True)
+    return divergencias
+
+
+def reindexar_busca(tamanho_lote=500):
+    """
+    Regera todos os documentos da busca global, modelo a modelo, em lotes
+    por id para não carregar tabelas inteiras na memória. Documentos de
+    objetos que não existem mais são descartados. Retorna quantos
+    documentos foram gravados.
+    """
+    consultas = {
+        Emprestimo: Emprestimo.objects.select_related('cliente')
+        .prefetch_related('emprestimomaterial_set__material'),
+        Cliente: Cliente.objects.all(),
+        Material: Material.objects.all(),
+        Case: Case.objects.all(),
+        ProntoArmamento: ProntoArmamento.objects.all(),
+    }
+    total = 0
+    for modelo, consulta in consultas.items():
+        tipo = TIPOS_DOCUMENTO[modelo]
+        ultimo_id = 0
+        while True:
+            objetos = list(consulta.filter(id__gt=ultimo_id).order_by('id')[:tamanho_lote])
+            if not objetos:
+                break
+            documentos = [DocumentoBusca.documento(objeto) for objeto in objetos]
+            with transaction.atomic():
+                DocumentoBusca.objects.filter(
+                    tipo=tipo, objeto_id__gt=ultimo_id,
+                    objeto_id__lte=objetos[-1].id).delete()
+                DocumentoBusca.objects.bulk_create(documentos)
+            total += len(documentos)
+            ultimo_id = objetos[-1].id
+        DocumentoBusca.objects.filter(tipo=tipo, objeto_id__gt=ultimo_id).delete()
+    return total
+
+
+def gerar_miniaturas_pendentes(tamanho_lote=1000):
+    """
+    Gera as miniaturas que faltam das imagens já referenciadas pelos
+    Clientes (enviadas antes do processamento no upload). Imagens que o
+    Pillow não lê ficam sem miniatura. Retorna quantas foram gravadas.
+    """
+    storage = Cliente._meta.get_field('foto').storage
+    total = 0
+    for nome in sorted(_referencias_midia(tamanho_lote)):
+        try:
+            total += gerar_miniaturas(storage, nome)
+        except (UnidentifiedImageError, OSError):
+            continue
+    return total
+
+
+# Arquivos mais novos que isso não são coletados: o upload pode ainda não
+# ter chegado ao banco (transação aberta)
+CARENCIA_MIDIA = 60 * 60
+
+
+def _referencias_midia(tamanho_lote):
+    """
+    Nomes de arquivo referenciados pelos Clientes, lidos em lotes por id.
+    """
+    referenciados = set()
+    ultimo_id = 0
+    while True:
+        linhas = list(Cliente.objects.filter(id__gt=ultimo_id).order_by('id')
+                      .values_list('id', *CAMPOS_IMAGEM_CLIENTE)[:tamanho_lote])
+        if not linhas:
+            break
+        for _, *nomes in linhas:
+            referenciados.update(nome for nome in nomes if nome)
+        ultimo_id = linhas[-1][0]
+    return referenciados
+
+
+def _arquivos(storage, pasta):
+    diretorios, arquivos = storage.listdir(pasta) if storage.exists(pasta) else ([], [])
+    for arquivo in arquivos:
+        yield posixpath.join(pasta, arquivo)
+    for diretorio in diretorios:
+        yield from _arquivos(storage, posixpath.join(pasta, diretorio))
+
+
+def coletar_midia(simular=False, tamanho_lote=1000, carencia=CARENCIA_MIDIA):
+    """
+    Remove as fotos/identidades que nenhum Cliente referencia mais e as
+    miniaturas delas. Retorna a lista de caminhos removidos (ou que seriam
+    removidos, com `simular`).
+    """
+    storage = Cliente._meta.get_field('foto').storage
+    referenciados = _referencias_midia(tamanho_lote)
+    raizes = {posixpath.splitext(nome)[0] for nome in referenciados}
+    limite = timezone.now() - timedelta(seconds=carencia)
+
+    pastas = {
+        Cliente._meta.get_field(campo).upload_to.rstrip('/')
+        for campo in CAMPOS_IMAGEM_CLIENTE
+    }
+    orfaos = []
+    for pasta in sorted(pastas):
+        for nome in _arquivos(storage, pasta):
+            if nome not in referenciados and storage.get_modified_time(nome) < limite:
+                orfaos.append((storage, nome))
+
+    # miniaturas/<largura>/<caminho do original sem extensão>.<formato>
+    for nome in _arquivos(default_storage, PASTA_MINIATURAS):
+        partes = nome.split('/', 2)
+        raiz = posixpath.splitext(partes[-1])[0] if len(partes) == 3 else None
+        if raiz not in raizes and default_storage.get_modified_time(nome) < limite:
+            orfaos.append((default_storage, nome))
+
+    if not simular:
+        for armazenamento, nome in orfaos:
+            armazenamento.delete(nome)
+    return [nome for _, nome in orfaos]
@@ -0,0 +1,41 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ArmazenamentoConteudo(FileSystemStorage):
+    """
+    Grava cada arquivo com o nome derivado do SHA-256 do conteúdo, dentro da
+    pasta do upload_to ("identidades/3f/3fa2...e1.jpg"). Envios repetidos do
+    mesmo arquivo reaproveitam o blob já gravado; arquivos que nenhum
+    Cliente referencia mais são removidos por `manage.py coletar_midia`.
+    """
+
+    def _hash(self, content):
+        sha = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for bloco in content.chunks():
+            sha.update(bloco)
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        return sha.hexdigest()
+
+    def _save(self, name, content):
+        pasta, arquivo = posixpath.split(name)
+        extensao = posixpath.splitext(arquivo)[1].lower()
+        digest = self._hash(content)
+        name = posixpath.join(pasta, digest[:2], f'{digest}{extensao}')
+        if self.exists(name):
+            # Renova a data do blob reaproveitado: um órfão antigo que volta a
+            # ser usado (upload ainda não confirmado) fica na carência do
+            # coletar_midia
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
+
+
+def armazenamento_conteudo():
+    return ArmazenamentoConteudo()
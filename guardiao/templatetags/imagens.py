@@ -0,0 +1,18 @@
+from django import template
+
+from guardiao.imagens import url_miniatura
+
+register = template.Library()
+
+
+@register.filter
+def miniatura(campo, largura):
+    """
+    {{ cliente.foto|miniatura:200 }} -> URL da miniatura JPEG.
+    """
+    return url_miniatura(campo, int(largura))
+
+
+@register.filter
+def miniatura_webp(campo, largura):
+    return url_miniatura(campo, int(largura), 'webp')
@@ -1,3 +1,1376 @@
-from django.test import TestCase
+import gzip
+import os
+import shutil
+import tempfile
+import zipfile
+from datetime import date
+from importlib import import_module
+from io import BytesIO, StringIO
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib.auth.models import Group, Permission, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.functions import Length
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .models import (
+    Categoria, Material, Emprestimo, EmprestimoMaterial, Cliente, Operador,
+    InventarioSnapshot, Case, VersaoInventario, Assinante, FuncaoAssinante,
+    ProntoArmamento, ProntoResumoMensal, MovimentoEstoque, EmprestimoHistorico,
+    DocumentoBusca
+)
+from .services import (
+    agregar_pronto_armamento, ler_pronto_armamento, reconstruir_inventario,
+    obter_pronto_armamento, compactar_estoque, reconstruir_estoque,
+    reindexar_busca, coletar_midia
+)
+from .busca import LIMITE_RESULTADOS, buscar_documentos
+from .disponibilidade import indice_disponibilidade
+from .permissoes import registro_permissoes
+from .imagens import TAMANHOS_MINIATURA, caminho_miniatura, url_miniatura
+from . import backup, services
+from .backup import exportar, importar, modelos_backup
+
+
+def criar_operador(username='operador', nivel_acesso=3):
+    user = User.objects.create_user(username=username, password='senha')
+    return Operador.objects.create(
+        user=user, nome=username, identidade='000', nivel_acesso=nivel_acesso)
+
+
+class AgregarProntoArmamentoTests(TestCase):
+    def setUp(self):
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+        self.operador = criar_operador()
+
+    def criar_fuzis(self, quantidade, inicio=0):
+        return [
+            Material.objects.create(
+                categoria=self.categoria, nome='Fuzil 7,62',
+                registro=f'FZ{inicio + i:05d}', quantidade_total=1,
+                quantidade_disponivel=1)
+            for i in range(quantidade)
+        ]
+
+    def emprestar(self, material, destino, quantidade=1):
+        emprestimo = Emprestimo.objects.create(
+            cliente=self.cliente, operador=self.operador, destino=destino)
+        EmprestimoMaterial.objects.create(
+            emprestimo=emprestimo, material=material, quantidade=quantidade)
+        return emprestimo
+
+    def test_totais_e_destinos(self):
+        fuzis = self.criar_fuzis(3)
+        municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição', quantidade_total=100,
+            quantidade_disponivel=70, quantidade_emprestada=30)
+        self.emprestar(fuzis[0], 'Patrulha')
+        self.emprestar(fuzis[1], 'Patrulha')
+        self.emprestar(municao, 'Patrulha', 30)
+        devolvido = self.emprestar(fuzis[2], 'Guarda')
+        Emprestimo.objects.filter(pk=devolvido.pk).update(isAtiva=False)
+
+        resultado = agregar_pronto_armamento()
+
+        self.assertEqual(len(resultado), 1)
+        self.assertEqual(resultado[0]['categoria'], 'Fuzis')
+        materiais = {m['nome']: m for m in resultado[0]['materiais']}
+        self.assertEqual(materiais['Fuzil 7,62']['total_existente'], 3)
+        self.assertEqual(materiais['Fuzil 7,62']['total_emprestados'], 2)
+        self.assertEqual(materiais['Fuzil 7,62']['total_na_reserva'], 1)
+        self.assertEqual(materiais['Fuzil 7,62']['destinos'], {'Patrulha': 2})
+        self.assertEqual(materiais['Munição']['total_existente'], 100)
+        self.assertEqual(materiais['Munição']['destinos'], {'Patrulha': 30})
+
+    def test_numero_de_consultas_constante(self):
+        fuzis = self.criar_fuzis(5)
+        self.emprestar(fuzis[0], 'Patrulha')
+        with self.assertNumQueries(3):
+            agregar_pronto_armamento()
+
+        Categoria.objects.create(nome='Pistolas')
+        fuzis = self.criar_fuzis(200, inicio=5)
+        for fuzil in fuzis[:50]:
+            self.emprestar(fuzil, 'Patrulha')
+        with self.assertNumQueries(3):
+            agregar_pronto_armamento()
+
+
+class ProntoArmamentoViewsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+
+    def test_paginas_usam_agregacao(self):
+        categoria = Categoria.objects.create(nome='Fuzis')
+        Material.objects.create(
+            categoria=categoria, nome='Fuzil 7,62', registro='FZ00001',
+            quantidade_total=1, quantidade_disponivel=1)
+        reconstruir_inventario()
+
+        for url in ('/pronto-armamento/', '/pronto-armamento/gerar/'):
+            resposta = self.client.get(url)
+            self.assertEqual(resposta.status_code, 200)
+            materiais = resposta.context['categorias_materiais'][0]['materiais']
+            self.assertEqual(materiais[0]['total_na_reserva'], 1)
+
+    def test_gerar_pronto_grava_dados_estruturados(self):
+        categoria = Categoria.objects.create(nome='Fuzis')
+        fuzil = Material.objects.create(
+            categoria=categoria, nome='Fuzil 7,62', registro='FZ00001',
+            quantidade_total=1, quantidade_disponivel=1)
+        emprestimo = Emprestimo.objects.create(
+            cliente=Cliente.objects.create(nome='Soldado', identidade='123'),
+            operador=Operador.objects.get(), destino='Patrulha')
+        EmprestimoMaterial.objects.create(emprestimo=emprestimo, material=fuzil)
+        Case.objects.create(descricao='Case 1', responsavel='Sgt', lacre='L1')
+        reconstruir_inventario()
+        assinante = Assinante.objects.create(nome='Cap Fulano')
+        funcao = FuncaoAssinante.objects.create(nome='Cmt')
+
+        self.client.post('/pronto-armamento/gerar/', {
+            'lacre': '123', **{
+                f'{campo}_{i}': objeto.id
+                for i in (1, 2, 3)
+                for campo, objeto in (('assinante', assinante), ('funcao', funcao))
+            }
+        })
+
+        pronto = ProntoArmamento.objects.get()
+        self.assertEqual(pronto.tabela, '')
+        material = pronto.dados['categorias'][0]['materiais'][0]
+        self.assertEqual(material['destinos'], [['Patrulha', 1]])
+        self.assertEqual(pronto.dados['cases'][0]['lacre'], 'L1')
+
+        resposta = self.client.get(f'/pronto-armamento/visualizar/{pronto.id}/')
+        self.assertContains(resposta, '(1) Patrulha')
+        self.assertContains(resposta, 'Case 1')
+
+    def test_tabela_comprimida_e_fora_das_listagens(self):
+        assinante = Assinante.objects.create(nome='Cap Fulano')
+        funcao = FuncaoAssinante.objects.create(nome='Cmt')
+        tabela = '<table>' + '<tr><td>Fuzil 7,62</td></tr>' * 500 + '</table>'
+        pronto = ProntoArmamento.objects.create(
+            numero=1, lacre='123', tabela=tabela,
+            assinante_1=assinante, funcao_1=funcao,
+            assinante_2=assinante, funcao_2=funcao,
+            assinante_3=assinante, funcao_3=funcao)
+
+        armazenado = ProntoArmamento.objects.filter(pk=pronto.pk).values_list(
+            Length('tabela'), flat=True).get()
+        self.assertLess(armazenado * 10, len(tabela))
+        self.assertEqual(ProntoArmamento.objects.get().tabela, tabela)
+
+        resposta = self.client.get('/pronto-armamento/listar/')
+        adiados = resposta.context['prontos'][0].get_deferred_fields()
+        self.assertTrue({'tabela', 'dados'} <= adiados)
+
+        resposta = self.client.get(f'/pronto-armamento/visualizar/{pronto.id}/')
+        self.assertContains(resposta, tabela)
+
+
+class InventarioSnapshotTests(TestCase):
+    def setUp(self):
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+        self.fuzil = Material.objects.create(
+            categoria=self.categoria, nome='Fuzil 7,62', registro='FZ00001',
+            quantidade_total=1, quantidade_disponivel=1)
+        self.municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição', quantidade_total=100,
+            quantidade_disponivel=100)
+        reconstruir_inventario()
+
+    def cautelar(self):
+        self.client.post('/emprestimos/', {
+            'cliente': self.cliente.id,
+            'destino': 'Patrulha',
+            'materiais': [self.fuzil.id, self.municao.id],
+            'quantidades': [1, 30],
+        })
+        return Emprestimo.objects.latest('id')
+
+    def assertSnapshotConsistente(self):
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+    def test_ciclo_de_vida_da_cautela(self):
+        emprestimo = self.cautelar()
+        self.assertSnapshotConsistente()
+        self.assertEqual(InventarioSnapshot.objects.get(
+            nome='Munição', destino='Patrulha').total_emprestados, 30)
+
+        url = f'/visualizar-emprestimo/{emprestimo.id}/'
+        self.client.post(url, {'acao': 'desativar'})
+        self.assertSnapshotConsistente()
+        self.assertFalse(InventarioSnapshot.objects.filter(
+            destino='Patrulha').exists())
+
+        self.client.post(url, {'acao': 'reativar'})
+        self.assertSnapshotConsistente()
+
+        self.client.post(url, {'acao': 'cancelar'})
+        self.assertSnapshotConsistente()
+
+        self.client.post(url, {'acao': 'reativar'})
+        self.client.post(f'/emprestimos/excluir/{emprestimo.id}/')
+        self.assertSnapshotConsistente()
+
+    def test_reconstrucao_informa_divergencias(self):
+        self.cautelar()
+        InventarioSnapshot.objects.filter(
+            nome='Munição', destino__isnull=True).update(total_na_reserva=0)
+
+        saida = StringIO()
+        call_command('reconstruir_inventario', stdout=saida)
+
+        self.assertIn('1 divergência(s) corrigida(s).', saida.getvalue())
+        self.assertSnapshotConsistente()
+
+
+class ProntoArmamentoCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        Material.objects.create(
+            categoria=self.categoria, nome='Fuzil 7,62', registro='FZ00001',
+            quantidade_total=1, quantidade_disponivel=1)
+        reconstruir_inventario()
+
+    def test_cache_servido_ate_mudar_a_versao(self):
+        versao, dados = obter_pronto_armamento()
+        with self.assertNumQueries(1):
+            self.assertEqual(obter_pronto_armamento(), (versao, dados))
+
+        # A versão avança no commit da escrita
+        with self.captureOnCommitCallbacks(execute=True):
+            Case.objects.create(descricao='Case 1', responsavel='Sgt', lacre='L1')
+
+        nova_versao, dados = obter_pronto_armamento()
+        self.assertGreater(nova_versao, versao)
+        self.assertEqual(nova_versao, VersaoInventario.atual())
+        self.assertEqual(dados['cases'][0]['lacre'], 'L1')
+
+    def test_trava_do_recalculo_continua_valida(self):
+        versao, _ = obter_pronto_armamento()
+        chave = f'pronto_armamento:{versao}'
+        trava = services._trava(chave)
+        # Quem chega depois do recálculo espera na mesma trava
+        obter_pronto_armamento()
+        self.assertIs(services._trava(chave), trava)
+
+        for i in range(services.LIMITE_TRAVAS * 2):
+            services._trava(f'teste:{i}')
+        self.assertLessEqual(len(services._travas), services.LIMITE_TRAVAS)
+
+
+class EmprestimoAdminTests(TestCase):
+    def setUp(self):
+        self.operador = criar_operador()
+        self.operador.user.is_staff = self.operador.user.is_superuser = True
+        self.operador.user.save()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+        self.fuzil = Material.objects.create(
+            categoria=self.categoria, nome='Fuzil', registro='FZ1',
+            quantidade_total=1, quantidade_disponivel=1)
+        self.municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição', quantidade_total=100,
+            quantidade_disponivel=100)
+        reconstruir_inventario()
+
+    def salvar(self, url, itens, iniciais=0):
+        dados = {
+            'cliente': self.cliente.id, 'operador': self.operador.id,
+            'destino': 'Guarda', 'isAtiva': 'on',
+            'emprestimomaterial_set-TOTAL_FORMS': len(itens),
+            'emprestimomaterial_set-INITIAL_FORMS': iniciais,
+            'historico-TOTAL_FORMS': 0, 'historico-INITIAL_FORMS': 0,
+        }
+        for i, item in enumerate(itens):
+            dados.update({
+                f'emprestimomaterial_set-{i}-{campo}': valor
+                for campo, valor in item.items()
+            })
+        resposta = self.client.post(url, dados)
+        self.assertEqual(resposta.status_code, 302)
+
+    def test_itens_do_inline_entram_no_livro(self):
+        self.salvar('/admin/guardiao/emprestimo/add/', [
+            {'material': self.fuzil.id, 'quantidade': 1},
+            {'material': self.municao.id, 'quantidade': 30},
+        ])
+        self.assertEqual(self.fuzil.saldo(), (1, 0, 1))
+        self.assertEqual(self.municao.saldo(), (100, 70, 30))
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+        emprestimo = Emprestimo.objects.get()
+        itens = {item.material_id: item.id
+                 for item in emprestimo.emprestimomaterial_set.all()}
+        self.salvar(f'/admin/guardiao/emprestimo/{emprestimo.id}/change/', [
+            {'id': itens[self.fuzil.id], 'emprestimo': emprestimo.id,
+             'material': self.fuzil.id, 'quantidade': 1, 'DELETE': 'on'},
+            {'id': itens[self.municao.id], 'emprestimo': emprestimo.id,
+             'material': self.municao.id, 'quantidade': 10},
+        ], iniciais=2)
+        self.assertEqual(self.fuzil.saldo(), (1, 1, 0))
+        self.assertEqual(self.municao.saldo(), (100, 90, 10))
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+
+class MaterialAdminTests(TestCase):
+    def setUp(self):
+        operador = criar_operador()
+        operador.user.is_staff = operador.user.is_superuser = True
+        operador.user.save()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+
+    def test_cadastro_registra_entrada_inicial(self):
+        for nome, registro, quantidade in (('Munição', '', 50), ('Fuzil', 'FZ1', 7)):
+            resposta = self.client.post('/admin/guardiao/material/add/', {
+                'nome': nome, 'categoria': self.categoria.id,
+                'registro': registro, 'quantidade_inicial': quantidade})
+            self.assertEqual(resposta.status_code, 302)
+
+        self.assertEqual(Material.objects.get(nome='Munição').saldo(), (50, 50, 0))
+        self.assertEqual(Material.objects.get(nome='Fuzil').saldo(), (1, 1, 0))
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+        municao = Material.objects.get(nome='Munição')
+        resposta = self.client.get(f'/admin/guardiao/material/{municao.id}/change/')
+        self.assertNotContains(resposta, 'quantidade_inicial')
+
+
+class ProntoResumoMensalTests(TestCase):
+    def setUp(self):
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        self.assinante = Assinante.objects.create(nome='Cap Fulano')
+        self.funcao = FuncaoAssinante.objects.create(nome='Cmt')
+
+    def criar_pronto(self, numero, data):
+        pronto = ProntoArmamento.objects.create(
+            numero=numero, lacre=str(numero),
+            assinante_1=self.assinante, funcao_1=self.funcao,
+            assinante_2=self.assinante, funcao_2=self.funcao,
+            assinante_3=self.assinante, funcao_3=self.funcao)
+        ProntoArmamento.objects.filter(pk=pronto.pk).update(data=data)
+        pronto.data = data
+        return pronto
+
+    def test_resumo_e_navegacao_do_arquivo(self):
+        self.criar_pronto(1, date(2024, 12, 31))
+        self.criar_pronto(2, date(2025, 1, 1))
+        self.criar_pronto(3, date(2025, 1, 31))
+        ProntoResumoMensal.objects.all().delete()
+        for ano, mes, total in ((2024, 12, 1), (2025, 1, 2)):
+            ProntoResumoMensal.objects.create(ano=ano, mes=mes, total=total)
+
+        resposta = self.client.get('/pronto-armamento/anteriores/')
+        self.assertEqual(
+            [(ano['ano'], ano['total']) for ano in resposta.context['anos']],
+            [(2025, 2), (2024, 1)])
+
+        resposta = self.client.get('/pronto-armamento/ano/2025/')
+        self.assertEqual(
+            [(mes['mes'], mes['total']) for mes in resposta.context['meses']],
+            [(1, 2)])
+
+        resposta = self.client.get('/pronto-armamento/ano/2025/mes/1/')
+        self.assertEqual(
+            [pronto.numero for pronto in resposta.context['prontos']], [3, 2])
+
+    def test_resumo_acompanha_criacao_e_exclusao(self):
+        pronto = self.criar_pronto(1, date.today())
+        self.criar_pronto(2, date.today())
+        hoje = date.today()
+        self.assertEqual(ProntoResumoMensal.objects.get(
+            ano=hoje.year, mes=hoje.month).total, 2)
+
+        pronto.delete()
+        self.assertEqual(ProntoResumoMensal.objects.get(
+            ano=hoje.year, mes=hoje.month).total, 1)
+
+
+class VisualizarProntoCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        assinante = Assinante.objects.create(nome='Cap Fulano')
+        funcao = FuncaoAssinante.objects.create(nome='Cmt')
+        self.pronto = ProntoArmamento.objects.create(
+            numero=1, lacre='123', tabela='<table>Fuzil 7,62</table>',
+            assinante_1=assinante, funcao_1=funcao,
+            assinante_2=assinante, funcao_2=funcao,
+            assinante_3=assinante, funcao_3=funcao)
+        self.url = f'/pronto-armamento/visualizar/{self.pronto.id}/'
+
+    def test_get_condicional_retorna_304(self):
+        resposta = self.client.get(self.url)
+        self.assertContains(resposta, 'Fuzil 7,62')
+        self.assertIn('Last-Modified', resposta)
+
+        with self.assertNumQueries(3):
+            resposta = self.client.get(
+                self.url, HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+
+    def test_corpo_pre_comprimido(self):
+        resposta = self.client.get(self.url)
+        comprimida = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(comprimida['Content-Encoding'], 'gzip')
+        self.assertNotEqual(comprimida['ETag'], resposta['ETag'])
+        self.assertEqual(gzip.decompress(comprimida.content), resposta.content)
+
+    def test_exclusao_invalida_cache(self):
+        self.client.get(self.url)
+        self.client.post(f'/pronto-armamento/excluir/{self.pronto.id}/')
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class CheckoutEmLoteTests(TestCase):
+    def setUp(self):
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+        self.fuzis = [
+            Material.objects.create(
+                categoria=self.categoria, nome='Fuzil 7,62',
+                registro=f'FZ{i:05d}', quantidade_total=1,
+                quantidade_disponivel=1)
+            for i in range(40)
+        ]
+        self.municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição', quantidade_total=1000,
+            quantidade_disponivel=1000)
+        reconstruir_inventario()
+
+    def cautelar(self, fuzis, municao=10):
+        return self.client.post('/emprestimos/', {
+            'cliente': self.cliente.id,
+            'destino': 'Patrulha',
+            'materiais': [fuzil.id for fuzil in fuzis] + [self.municao.id],
+            'quantidades': [1] * len(fuzis) + [municao],
+        })
+
+    def test_numero_de_consultas_constante(self):
+        self.cautelar(self.fuzis[:1])
+        with CaptureQueriesContext(connection) as pequena:
+            self.cautelar(self.fuzis[1:6])
+        with CaptureQueriesContext(connection) as grande:
+            self.cautelar(self.fuzis[6:])
+
+        self.assertEqual(len(pequena), len(grande))
+        self.assertEqual(EmprestimoMaterial.objects.count(), 43)
+        self.assertEqual(self.municao.saldo(), (1000, 970, 30))
+        self.assertEqual(
+            Material.objects.com_saldo().filter(saldo_disponivel=0).count(), 40)
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+    def test_tudo_ou_nada(self):
+        self.cautelar(self.fuzis[:1])
+        resposta = self.cautelar(self.fuzis[:3])
+
+        self.assertRedirects(resposta, '/emprestimos/', fetch_redirect_response=False)
+        self.assertEqual(Emprestimo.objects.count(), 1)
+        self.assertEqual(
+            Material.objects.com_saldo().filter(saldo_disponivel=0).count(), 1)
+
+        self.cautelar(self.fuzis[5:6], municao=5000)
+        self.assertEqual(Emprestimo.objects.count(), 1)
+        self.assertEqual(self.municao.saldo(), (1000, 990, 10))
+
+
+class MovimentoEstoqueTests(TestCase):
+    def setUp(self):
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+
+    def test_livro_compactacao_e_reconstrucao(self):
+        self.client.post('/materiais/cadastrar/', {
+            'nome': 'Munição', 'categoria': self.categoria.id, 'quantidade': 100})
+        self.client.post('/materiais/cadastrar/', {
+            'nome': 'Fuzil', 'categoria': self.categoria.id, 'registro': 'FZ1'})
+        municao = Material.objects.get(nome='Munição')
+        fuzil = Material.objects.get(registro='FZ1')
+
+        self.client.post('/emprestimos/', {
+            'cliente': self.cliente.id, 'destino': 'Patrulha',
+            'materiais': [fuzil.id, municao.id], 'quantidades': [1, 30]})
+        emprestimo = Emprestimo.objects.get()
+        self.client.post(f'/visualizar-emprestimo/{emprestimo.id}/',
+                         {'acao': 'desativar'})
+        self.client.post(f'/visualizar-emprestimo/{emprestimo.id}/',
+                         {'acao': 'reativar'})
+
+        # As colunas só mudam na compactação; o saldo vem do livro
+        municao.refresh_from_db()
+        self.assertEqual(municao.quantidade_total, 0)
+        self.assertEqual(municao.saldo(), (100, 70, 30))
+        self.assertEqual(fuzil.saldo(), (1, 0, 1))
+        self.assertEqual(
+            MovimentoEstoque.objects.filter(material=municao).count(), 4)
+
+        self.assertEqual(compactar_estoque(), 2)
+        self.assertEqual(compactar_estoque(), 0)
+        municao.refresh_from_db()
+        self.assertEqual(
+            (municao.quantidade_total, municao.quantidade_disponivel,
+             municao.quantidade_emprestada), (100, 70, 30))
+        self.assertEqual(municao.saldo(), (100, 70, 30))
+        self.assertEqual(reconstruir_estoque(), [])
+
+        emprestimo.delete()
+        self.assertEqual(municao.saldo(), (100, 100, 0))
+        self.assertEqual(fuzil.saldo(), (1, 1, 0))
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+    def test_material_repetido_na_cautela_ajustado_uma_vez(self):
+        municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição', quantidade_total=10,
+            quantidade_disponivel=10)
+        self.client.post('/emprestimos/', {
+            'cliente': self.cliente.id, 'destino': 'Patrulha',
+            'materiais': [municao.id, municao.id], 'quantidades': [2, 3]})
+        self.assertEqual(municao.saldo(), (10, 5, 5))
+
+        emprestimo = Emprestimo.objects.get()
+        self.assertEqual(emprestimo.emprestimomaterial_set.count(), 2)
+        emprestimo.isAtiva = False
+        emprestimo.save()
+        self.assertEqual(municao.saldo(), (10, 10, 0))
+
+    def test_reativar_com_item_emprestado_em_outra_cautela(self):
+        fuzil = Material.objects.create(
+            categoria=self.categoria, nome='Fuzil', registro='FZ1',
+            quantidade_total=1, quantidade_disponivel=1)
+        reconstruir_inventario()
+
+        def cautelar():
+            self.client.post('/emprestimos/', {
+                'cliente': self.cliente.id, 'destino': 'Patrulha',
+                'materiais': [fuzil.id], 'quantidades': [1]})
+            return Emprestimo.objects.latest('id')
+
+        primeira = cautelar()
+        self.client.post(f'/visualizar-emprestimo/{primeira.id}/',
+                         {'acao': 'desativar'})
+        cautelar()
+
+        resposta = self.client.post(f'/visualizar-emprestimo/{primeira.id}/',
+                                    {'acao': 'reativar'})
+        self.assertRedirects(resposta, f'/visualizar-emprestimo/{primeira.id}/',
+                             fetch_redirect_response=False)
+        primeira.refresh_from_db()
+        self.assertFalse(primeira.isAtiva)
+        self.assertEqual(primeira.historico.filter(status='Reativado').count(), 0)
+        self.assertEqual(fuzil.saldo(), (1, 0, 1))
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+    def test_gravacao_sem_versao_na_transacao_e_compactacao_automatica(self):
+        municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição', quantidade_total=100,
+            quantidade_disponivel=100)
+        versao = VersaoInventario.atual()
+        movimento = MovimentoEstoque(
+            material=municao, tipo='Ajuste', quantidade_disponivel=-10,
+            quantidade_emprestada=10)
+
+        with mock.patch('guardiao.models.COMPACTAR_A_CADA', 1):
+            with self.captureOnCommitCallbacks() as callbacks:
+                MovimentoEstoque.registrar([movimento])
+            # Nada da linha global é tocado antes do commit
+            self.assertEqual(VersaoInventario.atual(), versao)
+            for callback in callbacks:
+                callback()
+
+        self.assertGreater(VersaoInventario.atual(), versao)
+        municao.refresh_from_db()
+        self.assertEqual(municao.movimento_compactado, movimento.id)
+        self.assertEqual(municao.quantidade_disponivel, 90)
+
+    def test_desativar_cautela_com_consultas_constantes(self):
+        fuzis = [
+            Material.objects.create(
+                categoria=self.categoria, nome='Fuzil', registro=f'FZ{i}',
+                quantidade_total=1, quantidade_disponivel=1)
+            for i in range(30)
+        ]
+        reconstruir_inventario()
+
+        def cautelar(materiais):
+            self.client.post('/emprestimos/', {
+                'cliente': self.cliente.id, 'destino': 'Patrulha',
+                'materiais': [m.id for m in materiais],
+                'quantidades': [1] * len(materiais)})
+            return Emprestimo.objects.latest('id')
+
+        pequena, grande = cautelar(fuzis[:2]), cautelar(fuzis[2:])
+        consultas = []
+        for emprestimo in (pequena, grande):
+            with CaptureQueriesContext(connection) as contexto:
+                self.client.post(f'/visualizar-emprestimo/{emprestimo.id}/',
+                                 {'acao': 'desativar'})
+            consultas.append(len(contexto))
+
+        self.assertEqual(consultas[0], consultas[1])
+        self.assertFalse(MovimentoEstoque.objects.filter(tipo='Ajuste').exists())
+        self.assertEqual(
+            Material.objects.com_saldo().filter(saldo_disponivel=1).count(), 30)
+
+
+class DevolucaoEmLoteTests(TestCase):
+    def setUp(self):
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+        self.fuzis = [
+            Material.objects.create(
+                categoria=self.categoria, nome='Fuzil', registro=f'FZ{i}',
+                quantidade_total=1, quantidade_disponivel=1)
+            for i in range(20)
+        ]
+        self.municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição', quantidade_total=100,
+            quantidade_disponivel=100)
+        reconstruir_inventario()
+        for i, fuzil in enumerate(self.fuzis):
+            self.client.post('/emprestimos/', {
+                'cliente': self.cliente.id,
+                'destino': 'Operação' if i < 15 else 'Guarda',
+                'materiais': [fuzil.id, self.municao.id],
+                'quantidades': [1, 2]})
+
+    def test_devolucao_por_selecao_e_por_filtro(self):
+        selecionadas = list(Emprestimo.objects.filter(
+            destino='Guarda').values_list('id', flat=True))
+        with self.captureOnCommitCallbacks(execute=True), self.assertNumQueries(18):
+            resposta = self.client.post('/emprestimos/devolver-lote/',
+                                        {'emprestimos': selecionadas})
+        self.assertRedirects(resposta, '/listar-emprestimos/',
+                             fetch_redirect_response=False)
+        self.assertEqual(Emprestimo.objects.filter(isAtiva=True).count(), 15)
+
+        resposta = self.client.post('/emprestimos/devolver-lote/', {
+            'destino': 'operação', 'data_inicio': '2024-02-30'})
+        self.assertRedirects(resposta, '/listar-emprestimos/',
+                             fetch_redirect_response=False)
+        self.assertEqual(Emprestimo.objects.filter(isAtiva=True).count(), 15)
+        hoje = timezone.localdate().isoformat()
+        self.client.post('/emprestimos/devolver-lote/', {
+            'destino': 'operação', 'data_fim': '2000-01-01'})
+        self.assertEqual(Emprestimo.objects.filter(isAtiva=True).count(), 15)
+        self.client.post('/emprestimos/devolver-lote/', {
+            'destino': 'operação', 'data_inicio': hoje, 'data_fim': hoje})
+        self.assertFalse(Emprestimo.objects.filter(isAtiva=True).exists())
+        self.assertEqual(
+            EmprestimoHistorico.objects.filter(status='Desativado').count(), 20)
+        self.assertEqual(self.municao.saldo(), (100, 100, 0))
+        self.assertEqual(
+            Material.objects.com_saldo().filter(saldo_disponivel=1).count(), 20)
+        self.assertEqual(ler_pronto_armamento(), agregar_pronto_armamento())
+
+
+class PaginacaoKeysetTests(TestCase):
+    def setUp(self):
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        Cliente.objects.bulk_create([
+            Cliente(nome=f'Soldado {i % 7}', identidade=str(i),
+                    organizacao_militar='1º BI' if i % 2 else '2º BI')
+            for i in range(130)
+        ])
+
+    def test_percorre_paginas_com_filtro(self):
+        vistos = []
+        url = '/clientes/?busca_om=1º'
+        urls = []
+        while url:
+            with self.assertNumQueries(3):
+                resposta = self.client.get(url)
+            pagina = resposta.context['pagina']
+            vistos += [cliente.id for cliente in pagina]
+            urls.append(url)
+            url = pagina.url_proxima and f'/clientes/{pagina.url_proxima}'
+            if url:
+                self.assertIn('busca_om=', url)
+
+        esperados = list(Cliente.objects.filter(
+            organizacao_militar='1º BI').order_by('nome', 'id')
+            .values_list('id', flat=True))
+        self.assertEqual(vistos, esperados)
+        self.assertEqual(len(urls), 2)
+
+        anterior = self.client.get(urls[-1]).context['pagina'].url_anterior
+        pagina = self.client.get(f'/clientes/{anterior}').context['pagina']
+        self.assertEqual([c.id for c in pagina], esperados[:50])
+        self.assertIsNone(pagina.url_anterior)
+
+    def test_cursor_invalido_volta_ao_inicio(self):
+        resposta = self.client.get('/clientes/?apos=lixo')
+        self.assertEqual(len(resposta.context['pagina']), 50)
+
+    def test_listagens_paginadas(self):
+        for url in ('/listar-emprestimos/?filtro=ativas', '/materiais/',
+                    '/cases/', '/operadores/', '/assinantes/', '/funcoes/'):
+            resposta = self.client.get(url)
+            self.assertEqual(resposta.status_code, 200, url)
+            self.assertIn('pagina', resposta.context)
+
+
+class ConsultasCautelasTests(TestCase):
+    def setUp(self):
+        self.operador = criar_operador()
+        self.operador.user.is_staff = self.operador.user.is_superuser = True
+        self.operador.user.save()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+
+    def criar_cautelas(self, quantidade, itens):
+        for i in range(quantidade):
+            cliente = Cliente.objects.create(nome=f'Cliente {i}', identidade=str(i))
+            emprestimo = Emprestimo.objects.create(
+                cliente=cliente, operador=self.operador, destino='Patrulha')
+            for j in range(itens):
+                material = Material.objects.create(
+                    categoria=self.categoria, nome='Fuzil',
+                    registro=f'FZ{i}-{j}', quantidade_total=1)
+                EmprestimoMaterial.objects.create(
+                    emprestimo=emprestimo, material=material)
+            for status in ('Ativado', 'Desativado', 'Reativado'):
+                EmprestimoHistorico.objects.create(
+                    emprestimo=emprestimo, status=status, operador=self.operador)
+        return emprestimo
+
+    def test_listagens_e_detalhes_em_consultas_fixas(self):
+        emprestimo = self.criar_cautelas(20, 10)
+        with self.assertNumQueries(3):
+            self.client.get('/listar-emprestimos/')
+        with self.assertNumQueries(5):
+            self.client.get(f'/visualizar-emprestimo/{emprestimo.id}/')
+        with self.assertNumQueries(4):
+            self.client.get(f'/emprestimos/confirmar-exclusao/{emprestimo.id}/')
+        with self.assertNumQueries(5):
+            self.client.get('/admin/guardiao/emprestimo/')
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Planos de consulta do Postgres')
+class IndicesPostgresTests(TestCase):
+    def plano(self, queryset):
+        # Tabelas pequenas: sem isso o planejador prefere ler a tabela toda
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def test_listagens_usam_os_indices(self):
+        categoria = Categoria.objects.create(nome='Fuzis')
+        planos = {
+            'emprestimo_data_idx': Emprestimo.objects.order_by(
+                '-data_emprestimo', '-id')[:20],
+            'emprestimo_ativas_data_idx': Emprestimo.objects.filter(
+                isAtiva=True).order_by('-data_emprestimo', '-id')[:20],
+            'cliente_nome_idx': Cliente.objects.order_by('nome', 'id')[:20],
+            'material_categoria_nome_idx': Material.objects.filter(
+                categoria=categoria).order_by('nome', 'id')[:20],
+        }
+        for indice, queryset in planos.items():
+            self.assertIn(indice, self.plano(queryset))
+
+
+class BuscaNormalizadaTests(TestCase):
+    def setUp(self):
+        indice_disponibilidade.invalidar()
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        for nome in ('João da Silva', 'Joana Dark', 'Sebastião Joãozinho',
+                     'Maria Conceição'):
+            Cliente.objects.create(nome=nome, identidade=nome[:5])
+        Cliente.objects.create(nome='João Inativo', identidade='0', isAtivo=False)
+        categoria = Categoria.objects.create(nome='Fuzis')
+        Material.objects.create(categoria=categoria, nome='Pistola 9mm',
+                                quantidade_total=5, quantidade_disponivel=5)
+        Material.objects.create(categoria=categoria, nome='Capacete Balístico',
+                                quantidade_total=5, quantidade_disponivel=5)
+
+    def nomes(self, url):
+        return [item['nome'] for item in self.client.get(url).json()]
+
+    def test_busca_de_clientes_sem_acento_e_ordenada(self):
+        self.assertEqual(self.nomes('/buscar-clientes/?nome=JOAO'),
+                         ['João da Silva', 'Sebastião Joãozinho'])
+        self.assertEqual(self.nomes('/buscar-clientes/?nome=jo'),
+                         ['Joana Dark', 'João da Silva', 'Sebastião Joãozinho'])
+        self.assertEqual(self.nomes('/buscar-clientes/?nome=conceicao'),
+                         ['Maria Conceição'])
+
+        cliente = Cliente.objects.get(nome='Maria Conceição')
+        cliente.nome = 'Maria José'
+        cliente.save()
+        self.assertEqual(self.nomes('/buscar-clientes/?nome=conceicao'), [])
+        self.assertEqual(self.nomes('/buscar-clientes/?nome=jose'), ['Maria José'])
+
+    def test_busca_de_materiais(self):
+        self.assertEqual(self.nomes('/buscar-materiais/?nome=balistico'),
+                         ['Capacete Balístico'])
+        self.assertEqual(self.nomes('/buscar-materiais/?nome=pis'),
+                         ['Pistola 9mm'])
+
+
+class IndiceDisponibilidadeTests(TestCase):
+    def setUp(self):
+        indice_disponibilidade.invalidar()
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        self.categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+        self.fuzis = [
+            Material.objects.create(
+                categoria=self.categoria, nome='Fuzil 7,62', registro=f'FZ{i:03d}',
+                quantidade_total=1, quantidade_disponivel=1)
+            for i in range(30)
+        ]
+        self.municao = Material.objects.create(
+            categoria=self.categoria, nome='Munição 7,62', quantidade_total=100,
+            quantidade_disponivel=100)
+
+    def buscar(self, consulta):
+        return self.client.get(f'/buscar-materiais/?{consulta}').json()
+
+    def test_prefixos_limite_e_atualizacao_incremental(self):
+        self.assertEqual(len(self.buscar('nome=fuzil')), LIMITE_RESULTADOS)
+        self.assertEqual([m['nome'] for m in self.buscar('nome=7,62&registro=fz01')],
+                         ['Fuzil 7,62'] * 10)
+        self.assertEqual(self.buscar('nome=municao')[0]['quantidade_disponivel'], 100)
+
+        # Regime estável: sessão, usuário com operador e a leitura da versão
+        with self.assertNumQueries(3):
+            self.buscar('nome=fuzil')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/emprestimos/', {
+                'cliente': self.cliente.id, 'destino': 'Patrulha',
+                'materiais': [self.fuzis[0].id, self.municao.id],
+                'quantidades': [1, 40]})
+        self.assertEqual(self.buscar('registro=fz000'), [])
+        self.assertEqual(self.buscar('nome=muni')[0]['quantidade_disponivel'], 60)
+
+        self.fuzis[1].nome = 'Carabina'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.fuzis[1].save()
+        self.assertEqual([m['registro'] for m in self.buscar('nome=carab')],
+                         ['FZ001'])
+
+
+    def test_movimento_confirmado_fora_de_ordem(self):
+        self.assertEqual(len(indice_disponibilidade.buscar(registro='fz00')), 10)
+        ultimo = MovimentoEstoque.objects.order_by('-id').values_list(
+            'id', flat=True).first() or 0
+
+        # O id maior aparece primeiro; o menor é confirmado depois
+        for id, fuzil in ((ultimo + 2, self.fuzis[1]), (ultimo + 1, self.fuzis[0])):
+            with self.captureOnCommitCallbacks(execute=True):
+                MovimentoEstoque.registrar([MovimentoEstoque(
+                    id=id, material=fuzil, tipo='Ajuste',
+                    quantidade_disponivel=-1, quantidade_emprestada=1)])
+            EmprestimoMaterial.objects.create(
+                emprestimo=Emprestimo.objects.create(
+                    cliente=self.cliente, operador=Operador.objects.get(),
+                    destino='Guarda'),
+                material=fuzil)
+            indice_disponibilidade.sincronizar()
+
+        self.assertEqual(
+            [m['registro'] for m in indice_disponibilidade.buscar(registro='fz00')],
+            [f'FZ00{i}' for i in range(2, 10)])
+
+
+class LeitorRegistroTests(TestCase):
+    def setUp(self):
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='Soldado', identidade='123')
+        self.fuzil = Material.objects.create(
+            categoria=categoria, nome='Fuzil', registro='FZ001',
+            quantidade_total=1, quantidade_disponivel=1)
+
+    def test_busca_exata_por_registro(self):
+        with self.assertNumQueries(3):
+            resposta = self.client.get('/buscar-material-registro/?registro=FZ001')
+        self.assertEqual(resposta.json(), {
+            'id': self.fuzil.id, 'nome': 'Fuzil', 'registro': 'FZ001',
+            'disponivel': True})
+
+        self.client.post('/emprestimos/', {
+            'cliente': self.cliente.id, 'destino': 'Patrulha',
+            'materiais': [self.fuzil.id], 'quantidades': [1]})
+        resposta = self.client.get('/buscar-material-registro/?registro=FZ001')
+        self.assertFalse(resposta.json()['disponivel'])
+
+        resposta = self.client.get('/buscar-material-registro/?registro=FZ0')
+        self.assertEqual(resposta.status_code, 404)
+
+
+class BuscaGlobalTests(TestCase):
+    def setUp(self):
+        indice_disponibilidade.invalidar()
+        criar_operador()
+        self.client.login(username='operador', password='senha')
+        categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='João Conceição', identidade='123')
+        self.fuzil = Material.objects.create(
+            categoria=categoria, nome='Fuzil 7,62', registro='FZ001',
+            quantidade_total=1, quantidade_disponivel=1)
+        Case.objects.create(descricao='Case de fuzis', responsavel='Sgt Silva',
+                            lacre='L-900')
+
+    def titulos(self, termo, tipo):
+        return [titulo for _, titulo, _ in buscar_documentos(termo, tipo, 50)]
+
+    def test_sincronizada_por_sinais_e_agrupada(self):
+        resposta = self.client.post('/emprestimos/', {
+            'cliente': self.cliente.id, 'destino': 'Estande de tiro',
+            'materiais': [self.fuzil.id], 'quantidades': ['1'],
+        })
+        self.assertEqual(resposta.status_code, 302)
+        emprestimo = Emprestimo.objects.get()
+
+        # Sem acento, por prefixo e pelos itens da cautela
+        self.assertEqual(self.titulos('conceicao estande', 'cautela'),
+                         [f'Cautela #{emprestimo.id} - João Conceição'])
+        self.assertEqual(self.titulos('FZ00', 'cautela'),
+                         [f'Cautela #{emprestimo.id} - João Conceição'])
+
+        resposta = self.client.get('/busca/?q=fuzi')
+        nomes = [grupo['nome'] for grupo in resposta.context['grupos']]
+        self.assertEqual(nomes, ['Cautelas', 'Materiais', 'Cases'])
+
+        # Renomear o cliente reindexa as cautelas dele; excluir remove
+        self.cliente.nome = 'Maria José'
+        self.cliente.save()
+        self.assertEqual(self.titulos('conceicao', 'cliente'), [])
+        self.assertEqual(self.titulos('jose', 'cautela'),
+                         [f'Cautela #{emprestimo.id} - Maria José'])
+        Case.objects.get().delete()
+        self.assertEqual(self.titulos('fuzis', 'case'), [])
+
+        DocumentoBusca.objects.all().delete()
+        self.assertEqual(reindexar_busca(tamanho_lote=1), 3)
+        self.assertEqual(len(self.titulos('fuzil', 'material')), 1)
+
+    def test_registro_com_pontuacao(self):
+        Material.objects.create(nome='Pistola', registro='EB-12345',
+                                quantidade_total=1)
+        for termo in ('EB-12345', 'eb 12345', 'EB-123'):
+            self.assertEqual(self.titulos(termo, 'material'), ['Pistola'], termo)
+
+    def test_paginacao_por_tipo(self):
+        for i in range(25):
+            Cliente.objects.create(nome=f'Soldado {i:02d}', identidade=str(i))
+
+        resposta = self.client.get('/busca/?q=soldado&tipo=cliente')
+        self.assertEqual(len(resposta.context['grupos'][0]['resultados']), 20)
+        self.assertIn('url_proxima', resposta.context['pagina'])
+
+        resposta = self.client.get('/busca/?q=soldado&tipo=cliente&pagina=2')
+        self.assertEqual(len(resposta.context['grupos'][0]['resultados']), 5)
+        self.assertNotIn('url_proxima', resposta.context['pagina'])
+
+
+class PermissoesTests(TestCase):
+    def entrar(self, nivel):
+        criar_operador(username=f'nivel{nivel}', nivel_acesso=nivel)
+        self.client.login(username=f'nivel{nivel}', password='senha')
+
+    def test_niveis_declarados_nas_views(self):
+        self.assertTrue(registro_permissoes.permitido(1, 'listar_prontos_mes'))
+        self.assertTrue(registro_permissoes.permitido(2, 'busca_global'))
+        self.assertFalse(registro_permissoes.permitido(2, 'listar_assinantes'))
+        self.assertFalse(registro_permissoes.permitido(1, 'listar_emprestimos'))
+        self.assertTrue(registro_permissoes.permitido(3, 'listar_assinantes'))
+
+    def test_middleware_bloqueia_sem_consultas_extras(self):
+        self.entrar(1)
+        resposta = self.client.get('/listar-emprestimos/')
+        self.assertRedirects(resposta, '/', fetch_redirect_response=False)
+
+        # Sessão e usuário (já com o operador): nada além disso para autorizar
+        with self.assertNumQueries(2):
+            self.client.get('/clientes/')
+
+    def test_nivel_2(self):
+        self.entrar(2)
+        self.assertEqual(self.client.get('/busca/?q=x').status_code, 200)
+        self.assertEqual(self.client.get('/assinantes/').status_code, 302)
+
+
+class OperadorBackendTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.operador = criar_operador()
+        self.client.login(username='operador', password='senha')
+
+    @override_settings(OPERADOR_CACHE_TTL=30)
+    def test_cache_do_operador_invalidado_na_edicao(self):
+        self.client.get('/clientes/')
+        # Usuário e operador vêm do cache: sessão e a listagem
+        with self.assertNumQueries(2):
+            self.client.get('/clientes/')
+
+        self.client.post(f'/operadores/editar/{self.operador.id}/', {
+            'nome': 'operador', 'identidade': '000', 'funcao': '',
+            'nivel_acesso': 1,
+        })
+        resposta = self.client.get('/clientes/')
+        self.assertRedirects(resposta, '/', fetch_redirect_response=False)
+
+    def test_sessao_anterior_com_model_backend_migrada(self):
+        self.client.logout()
+        self.client.force_login(
+            self.operador.user, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get('/clientes/').status_code, 302)
+
+        migracao = import_module('guardiao.migrations.0013_sessoes_operador_backend')
+        migracao.para_operador_backend(apps, None)
+        self.assertEqual(self.client.get('/clientes/').status_code, 200)
+
+
+class ImagensClienteTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def foto(self, largura=3000, altura=1000):
+        # Foto de celular "deitada", com orientação 6 (girar 90°) no EXIF
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        exif[0x010F] = 'Celular'
+        saida = BytesIO()
+        Image.new('RGB', (largura, altura), 'red').save(saida, 'JPEG', exif=exif)
+        return SimpleUploadedFile('foto.jpeg', saida.getvalue(), 'image/jpeg')
+
+    def test_upload_normalizado_com_miniaturas(self):
+        cliente = Cliente.objects.create(nome='Soldado', identidade='1',
+                                         foto=self.foto())
+        with Image.open(cliente.foto.path) as imagem:
+            self.assertEqual(imagem.size, (683, 2048))
+            self.assertNotIn(0x010F, imagem.getexif())
+
+        storage = cliente.foto.storage
+        for largura in TAMANHOS_MINIATURA:
+            for formato in ('jpeg', 'webp'):
+                caminho = caminho_miniatura(cliente.foto.name, largura, formato)
+                self.assertTrue(storage.exists(caminho))
+        with Image.open(storage.path(caminho_miniatura(cliente.foto.name, 200))) as imagem:
+            self.assertEqual(imagem.width, 200)
+
+    def test_miniaturas_de_arquivos_antigos_pelo_comando(self):
+        # Arquivo gravado antes do processamento, com o nome original
+        os.makedirs(os.path.join(self.media, 'clientes', 'fotos'))
+        with open(os.path.join(self.media, 'clientes', 'fotos', 'antiga.jpg'), 'wb') as arquivo:
+            arquivo.write(self.foto(800, 600).read())
+        Cliente.objects.create(nome='Soldado', identidade='1')
+        Cliente.objects.update(foto='clientes/fotos/antiga.jpg')
+        cliente = Cliente.objects.get()
+
+        # A página só monta a URL, sem ler o storage
+        url = url_miniatura(cliente.foto, 150, 'webp')
+        self.assertTrue(url.endswith('/miniaturas/200/clientes/fotos/antiga.webp'))
+        caminho = caminho_miniatura(cliente.foto.name, 200, 'webp')
+        self.assertFalse(cliente.foto.storage.exists(caminho))
+
+        saida = StringIO()
+        call_command('gerar_miniaturas', stdout=saida)
+        self.assertIn('4 miniatura(s)', saida.getvalue())
+        self.assertTrue(cliente.foto.storage.exists(caminho))
+        call_command('gerar_miniaturas', stdout=saida)
+        self.assertIn('0 miniatura(s)', saida.getvalue())
+
+
+class ServirMediaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+        os.makedirs(os.path.join(self.media, 'identidades'))
+        with open(os.path.join(self.media, 'identidades', 'rg.jpg'), 'wb') as arquivo:
+            arquivo.write(b'imagem')
+        self.url = '/media/identidades/rg.jpg'
+
+    def entrar(self, nivel):
+        criar_operador(username=f'nivel{nivel}', nivel_acesso=nivel)
+        self.client.login(username=f'nivel{nivel}', password='senha')
+
+    def test_exige_login_e_nivel(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.entrar(1)
+        self.assertRedirects(self.client.get(self.url), '/',
+                             fetch_redirect_response=False)
+
+    def test_entrega_com_validadores(self):
+        self.entrar(2)
+        resposta = self.client.get(self.url)
+        self.assertEqual(b''.join(resposta.streaming_content), b'imagem')
+        self.assertEqual(resposta['Content-Type'], 'image/jpeg')
+
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=resposta['ETag'])
+        self.assertEqual(resposta.status_code, 304)
+
+        self.assertEqual(self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/identidades/').status_code, 404)
+
+    @override_settings(MEDIA_ENTREGA='nginx')
+    def test_repassa_ao_proxy(self):
+        self.entrar(3)
+        resposta = self.client.get(self.url)
+        self.assertEqual(resposta['X-Accel-Redirect'], '/media-interna/identidades/rg.jpg')
+        self.assertEqual(resposta.content, b'')
+
+
+class ArmazenamentoConteudoTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracao = override_settings(MEDIA_ROOT=self.media)
+        configuracao.enable()
+        self.addCleanup(configuracao.disable)
+
+    def identidade(self, cor):
+        saida = BytesIO()
+        Image.new('RGB', (300, 200), cor).save(saida, 'PNG')
+        return SimpleUploadedFile('rg.png', saida.getvalue(), 'image/png')
+
+    def test_deduplica_e_coleta_orfaos(self):
+        primeiro = Cliente.objects.create(
+            nome='A', identidade='1', imagem_identidade=self.identidade('blue'))
+        segundo = Cliente.objects.create(
+            nome='B', identidade='2', imagem_identidade=self.identidade('blue'))
+        self.assertEqual(primeiro.imagem_identidade.name, segundo.imagem_identidade.name)
+        self.assertRegex(primeiro.imagem_identidade.name,
+                         r'^identidades/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+        # Troca a identidade do primeiro: o blob azul segue em uso pelo segundo
+        primeiro.imagem_identidade = self.identidade('green')
+        primeiro.save()
+        self.assertEqual(coletar_midia(carencia=0), [])
+
+        antigo = segundo.imagem_identidade.name
+        segundo.delete()
+        removidos = coletar_midia(carencia=0, tamanho_lote=1)
+        self.assertIn(antigo, removidos)
+        self.assertIn(caminho_miniatura(antigo, 200, 'webp'), removidos)
+        self.assertNotIn(primeiro.imagem_identidade.name, removidos)
+        self.assertFalse(os.path.exists(os.path.join(self.media, antigo)))
+        self.assertTrue(os.path.exists(primeiro.imagem_identidade.path))
+
+
+    def test_blob_reaproveitado_volta_para_a_carencia(self):
+        cliente = Cliente.objects.create(
+            nome='A', identidade='1', imagem_identidade=self.identidade('red'))
+        caminho = cliente.imagem_identidade.path
+        cliente.delete()
+        os.utime(caminho, (0, 0))
+
+        Cliente.objects.create(
+            nome='B', identidade='2', imagem_identidade=self.identidade('red'))
+        self.assertGreater(os.path.getmtime(caminho), 0)
+        Cliente.objects.all().delete()
+        self.assertNotIn(cliente.imagem_identidade.name, coletar_midia())
+
+class BackupTests(TestCase):
+    def setUp(self):
+        pasta = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, pasta, ignore_errors=True)
+        self.arquivo = os.path.join(pasta, 'backup.ndjson.gz')
+
+        self.operador = criar_operador()
+        categoria = Categoria.objects.create(nome='Fuzis')
+        self.cliente = Cliente.objects.create(nome='João Conceição', identidade='1')
+        material = Material.objects.create(
+            categoria=categoria, nome='Fuzil 7,62', registro='FZ001',
+            quantidade_total=1, quantidade_disponivel=1)
+        emprestimo = Emprestimo.objects.create(
+            cliente=self.cliente, operador=self.operador, destino='Guarda')
+        EmprestimoMaterial.objects.create(emprestimo=emprestimo, material=material)
+        assinante = Assinante.objects.create(nome='Cap Souza')
+        funcao = FuncaoAssinante.objects.create(nome='Comandante')
+        ProntoArmamento.objects.create(
+            numero=1, lacre='L-1', tabela='<table>ção</table>',
+            dados={'Fuzis': {'Fuzil 7,62': {'total': 1}}},
+            assinante_1=assinante, funcao_1=funcao,
+            assinante_2=assinante, funcao_2=funcao,
+            assinante_3=assinante, funcao_3=funcao)
+
+    def esvaziar(self):
+        with connection.cursor() as cursor:
+            for modelo in reversed(modelos_backup()):
+                for campo in modelo._meta.many_to_many:
+                    if campo.remote_field.through._meta.auto_created:
+                        cursor.execute(
+                            f'DELETE FROM {campo.remote_field.through._meta.db_table}')
+                cursor.execute(f'DELETE FROM {modelo._meta.db_table}')
+
+    def estado(self):
+        return {
+            modelo._meta.label_lower: sorted(
+                map(tuple, modelo._default_manager.values_list()), key=str)
+            for modelo in modelos_backup()
+        }
+
+    def test_ida_e_volta_em_lotes(self):
+        antes = self.estado()
+        contagem = exportar(self.arquivo, tamanho_lote=2)
+        self.assertEqual(contagem['guardiao.cliente'], 1)
+        with gzip.open(self.arquivo, 'rt', encoding='utf-8') as arquivo:
+            self.assertIn('João Conceição', arquivo.read())
+
+        with self.assertRaises(ValueError):
+            importar(self.arquivo)
+
+        self.esvaziar()
+        importar(self.arquivo, tamanho_lote=2)
+        self.assertEqual(self.estado(), antes)
+        self.assertFalse(os.path.exists(f'{self.arquivo}.checkpoint'))
+
+    def test_permissoes_pela_chave_natural(self):
+        permissao = Permission.objects.get(codename='view_case')
+        self.operador.user.user_permissions.add(permissao)
+        grupo = Group.objects.create(name='Armeiros')
+        grupo.permissions.add(permissao)
+        exportar(self.arquivo)
+        self.esvaziar()
+
+        # Noutro banco a mesma permissão tem outra chave primária
+        Permission.objects.filter(pk=permissao.pk).delete()
+        Permission.objects.create(codename='view_case', name=permissao.name,
+                                  content_type=permissao.content_type)
+
+        importar(self.arquivo)
+        usuario = User.objects.get(username='operador')
+        self.assertEqual(
+            list(usuario.user_permissions.values_list('codename', flat=True)),
+            ['view_case'])
+        self.assertTrue(usuario.has_perm('guardiao.view_case'))
+        self.assertEqual(
+            list(Group.objects.get().permissions.values_list('codename', flat=True)),
+            ['view_case'])
+
+    def test_retoma_do_checkpoint(self):
+        antes = self.estado()
+        exportar(self.arquivo)
+        self.esvaziar()
+
+        # Interrompe no meio: o lote seguinte falha uma vez
+        original = backup._gravar_lote
+        chamadas = []
+
+        def falhar_no_terceiro(registros, ignorar_conflitos):
+            chamadas.append(registros[0]['model'])
+            if len(chamadas) == 3:
+                raise OSError('queda')
+            return original(registros, ignorar_conflitos)
+
+        backup._gravar_lote = falhar_no_terceiro
+        self.addCleanup(setattr, backup, '_gravar_lote', original)
+        with self.assertRaises(OSError):
+            importar(self.arquivo)
+        self.assertTrue(os.path.exists(f'{self.arquivo}.checkpoint'))
+
+        importar(self.arquivo, retomar=True)
+        self.assertEqual(self.estado(), antes)
+
+
+class ExportacaoCautelasTests(TestCase):
+    def setUp(self):
+        self.operador = criar_operador()
+        self.client.login(username='operador', password='senha')
+        categoria = Categoria.objects.create(nome='Fuzis')
+        material = Material.objects.create(
+            categoria=categoria, nome='Fuzil', registro='FZ001', quantidade_total=1)
+        for i, destino in enumerate(('Guarda', 'Patrulha')):
+            cliente = Cliente.objects.create(nome=f'Soldado Ação {i}', identidade=str(i))
+            emprestimo = Emprestimo.objects.create(
+                cliente=cliente, operador=self.operador, destino=destino,
+                isAtiva=(i == 0))
+            EmprestimoMaterial.objects.create(emprestimo=emprestimo, material=material)
+            for status in ('Ativado', 'Desativado'):
+                EmprestimoHistorico.objects.create(
+                    emprestimo=emprestimo, status=status, operador=self.operador)
+
+    def baixar(self, consulta):
+        resposta = self.client.get(f'/emprestimos/exportar/?{consulta}')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.streaming)
+        return b''.join(resposta.streaming_content)
+
+    def test_csv_uma_linha_por_transicao_com_filtros(self):
+        conteudo = self.baixar('formato=csv').decode('utf-8')
+        self.assertTrue(conteudo.startswith('\ufeffCautela;'))
+        linhas = conteudo.strip().splitlines()
+        self.assertEqual(len(linhas), 1 + 4)
+        self.assertIn('Fuzil (FZ001) x1', linhas[1])
+
+        filtrado = self.baixar('formato=csv&destino=guarda&filtro=ativas')
+        self.assertEqual(len(filtrado.decode('utf-8').strip().splitlines()), 1 + 2)
+        self.assertNotIn(b'Patrulha', filtrado)
+        vazio = self.baixar('data_fim=2000-01-01').decode('utf-8')
+        self.assertEqual(len(vazio.strip().splitlines()), 1)
+        hoje = timezone.localdate().isoformat()
+        conteudo = self.baixar(f'data_inicio={hoje}&data_fim={hoje}')
+        self.assertEqual(len(conteudo.decode('utf-8').strip().splitlines()), 1 + 4)
+
+        resposta = self.client.get('/emprestimos/exportar/?data_inicio=ontem')
+        self.assertRedirects(resposta, '/listar-emprestimos/',
+                             fetch_redirect_response=False)
+
+    def test_formulas_neutralizadas(self):
+        Emprestimo.objects.filter(destino='Guarda').update(destino='=1+1')
+        Cliente.objects.filter(identidade='1').update(organizacao_militar='@SOMA(A1)')
+        conteudo = self.baixar('formato=csv').decode('utf-8')
+        self.assertIn(";'=1+1;", conteudo)
+        self.assertIn(";'@SOMA(A1);", conteudo)
+        self.assertNotIn(';=1+1', conteudo)
+
+        with zipfile.ZipFile(BytesIO(self.baixar('formato=xlsx'))) as pacote:
+            planilha = pacote.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIn(">'=1+1<", planilha)
+        self.assertNotIn('>=1+1<', planilha)
+
+    def test_xlsx_valido(self):
+        conteudo = self.baixar('formato=xlsx&busca_cliente=Ação 1')
+        with zipfile.ZipFile(BytesIO(conteudo)) as pacote:
+            self.assertIn('xl/workbook.xml', pacote.namelist())
+            planilha = pacote.read('xl/worksheets/sheet1.xml').decode('utf-8')
+        self.assertIn('Soldado Ação 1', planilha)
+        self.assertNotIn('Soldado Ação 0', planilha)
+        self.assertEqual(planilha.count('<row>'), 1 + 2)
+
+    def test_nivel_1_bloqueado(self):
+        criar_operador('leitor', nivel_acesso=1)
+        self.client.login(username='leitor', password='senha')
+        resposta = self.client.get('/emprestimos/exportar/')
+        self.assertNotEqual(resposta.status_code, 200)
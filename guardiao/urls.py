@@ -3,6 +3,7 @@ from django.urls import path
 from .views import (
     # Cautelas
     emprestimos_view, listar_emprestimos, visualizar_emprestimo, buscar_materiais, buscar_clientes, confirmar_exclusao_emprestimo, excluir_emprestimo,
+    devolver_emprestimos_lote, buscar_material_registro, exportar_emprestimos,
 
     # Operadores
     cadastrar_operador, listar_operadores, visualizar_operador, editar_operador, excluir_operador,
@@ -33,20 +34,29 @@ from .views import (
 
     # Página Inicial
     pagina_inicial,
+
+    # Busca Global
+    busca_global,
 )
 
 # URLs relacionados às Cautelas
 urlpatterns = [
     path('emprestimos/', emprestimos_view, name='emprestimos'),
     path('listar-emprestimos/', listar_emprestimos, name='listar_emprestimos'),
+    path('emprestimos/exportar/', exportar_emprestimos,
+         name='exportar_emprestimos'),
     path('visualizar-emprestimo/<int:emprestimo_id>/',
          visualizar_emprestimo, name='visualizar_emprestimo'),
     path('buscar-materiais/', buscar_materiais, name='buscar_materiais'),
+    path('buscar-material-registro/', buscar_material_registro,
+         name='buscar_material_registro'),
     path('buscar-clientes/', buscar_clientes, name='buscar_clientes'),
     path('emprestimos/confirmar-exclusao/<int:emprestimo_id>/',
          confirmar_exclusao_emprestimo, name='confirmar_exclusao_emprestimo'),
     path('emprestimos/excluir/<int:emprestimo_id>/',
          excluir_emprestimo, name='excluir_emprestimo'),
+    path('emprestimos/devolver-lote/', devolver_emprestimos_lote,
+         name='devolver_emprestimos_lote'),
 ]
 
 # URLs relacionados aos Operadores
@@ -157,6 +167,11 @@ urlpatterns += [
     path('logout/', logout_view, name='logout'),
 ]
 
+# URL da Busca Global
+urlpatterns += [
+    path('busca/', busca_global, name='busca_global'),
+]
+
 # URL da Página Inicial
 urlpatterns += [
     path('', pagina_inicial, name='pagina_inicial'),
@@ -7,41 +7,69 @@ from calendar import month_name
 from django.shortcuts import render
 from .models import ProntoArmamento
 from django.db.models import Count, Max
-from django.db.models.functions import ExtractYear, ExtractMonth
 from .models import Emprestimo, EmprestimoMaterial
 from django.db.models.functions import Coalesce
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib import messages
 
 # Django - HTTP e Redirecionamento
-from django.http import JsonResponse
+from django.http import (
+    JsonResponse, HttpResponse, FileResponse, Http404, StreamingHttpResponse
+)
 from django.shortcuts import render, get_object_or_404, redirect
 from django.urls import reverse
 
 # Django - Modelos e Banco de Dados
-from django.db.models import F, Q, Count, Sum, ExpressionWrapper, IntegerField
+from django.db.models import F, Q, Count, Sum, ExpressionWrapper, IntegerField, Exists, OuterRef
 
 # Django - Utilitários
 from django.utils import timezone
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date, urlencode
+from django.utils._os import safe_join
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
 
 # Modelos Personalizados
 from .models import (
-    ProntoArmamento, Assinante, FuncaoAssinante, Categoria,
+    ProntoArmamento, ProntoResumoMensal, Assinante, FuncaoAssinante, Categoria,
     Material, Case, Emprestimo, EmprestimoMaterial,
-    Operador, Cliente, EmprestimoHistorico
+    Operador, Cliente, EmprestimoHistorico, InventarioSnapshot,
+    MovimentoEstoque, TipoMovimento, TipoDocumento
 )
 
 # Decoradores Personalizados
 from .decorators import nivel_acesso_minimo
 
+# Serviços
+from .paginacao import paginar
+from .busca import (
+    filtrar_busca, normalizar, buscar_documentos, LIMITE_RESULTADOS
+)
+from .disponibilidade import indice_disponibilidade
+from .exportacao import linhas_cautelas, gerar_csv, gerar_xlsx
+from .services import (
+    obter_pronto_armamento, montar_dados_pronto, recalcular_inventario,
+    chave_inventario, intervalo_mes, obter_pronto_renderizado,
+    invalidar_pronto_renderizado, escolher_codificacao,
+    registrar_itens_emprestimo, devolver_emprestimos, intervalo_datas,
+    validar_disponibilidade, registrar_entrada
+)
+
 # Outras Bibliotecas
-from bs4 import BeautifulSoup
-from datetime import date
+from calendar import timegm
+from datetime import date, datetime, time
 import json
 import locale
+import mimetypes
+import os
+import stat
+from urllib.parse import quote
 
 # Configuração Local
 import locale
@@ -97,65 +125,32 @@ def emprestimos_view(request):
         cliente = get_object_or_404(Cliente, id=cliente_id)
         operador = get_object_or_404(Operador, user=request.user)
 
-        with transaction.atomic():  # Garante que tudo ou nada seja salvo
-            emprestimo = Emprestimo.objects.create(
-                cliente=cliente,
-                operador=operador,
-                destino=destino,
-                data_devolucao=data_devolucao
-            )
-
-            try:
-                for material_id, quantidade in zip(materiais_ids, quantidades):
-                    material = get_object_or_404(Material, id=material_id)
-                    quantidade = int(quantidade)
-
-                    # Validação para materiais com registro único
-                    if material.registro:
-                        if EmprestimoMaterial.objects.filter(
-                            material=material, emprestimo__isAtiva=True
-                        ).exists():
-                            messages.error(
-                                request,
-                                f"O material '{material.nome}' com registro '{material.registro}' já está emprestado."
-                            )
-                            raise ValueError("Material com registro único já emprestado.")
-
-                        material.quantidade_disponivel = 0
-
-                    # Validação para materiais sem registro
-                    else:
-                        if material.quantidade_disponivel < quantidade:
-                            messages.error(
-                                request,
-                                f"O material '{material.nome}' não possui quantidade suficiente disponível."
-                            )
-                            raise ValueError("Quantidade insuficiente para empréstimo.")
-
-                        material.quantidade_disponivel -= quantidade
-                        material.quantidade_emprestada += quantidade
-
-                    material.save()
-
-                    EmprestimoMaterial.objects.create(
-                        emprestimo=emprestimo,
-                        material=material,
-                        quantidade=1 if material.registro else quantidade
-                    )
-
-                messages.success(request, 'Empréstimo registrado com sucesso!')
-                return redirect('listar_emprestimos')
-
-            except ValueError as e:
-                messages.error(request, f"Erro: {e}")
-                raise
+        try:
+            with transaction.atomic():  # Garante que tudo ou nada seja salvo
+                emprestimo = Emprestimo.objects.create(
+                    cliente=cliente,
+                    operador=operador,
+                    destino=destino,
+                    data_devolucao=data_devolucao
+                )
+                registrar_itens_emprestimo(
+                    emprestimo, zip(materiais_ids, quantidades))
+        except Material.DoesNotExist:
+            messages.error(request, "Material não encontrado.")
+            return redirect('emprestimos')
+        except ValueError as e:
+            messages.error(request, f"Erro: {e}")
+            return redirect('emprestimos')
+
+        messages.success(request, 'Empréstimo registrado com sucesso!')
+        return redirect('listar_emprestimos')
 
     # Filtrar apenas materiais disponíveis para empréstimo
-    materiais = Material.objects.annotate(
+    materiais = Material.objects.com_saldo().annotate(
         total_emprestados=Count('emprestimomaterial', filter=Q(
             emprestimomaterial__emprestimo__isAtiva=True))
     ).filter(
-        Q(registro__isnull=True, quantidade_disponivel__gt=0) |
+        Q(registro__isnull=True, saldo_disponivel__gt=0) |
         Q(registro__isnull=False, total_emprestados=0)
     )
 
@@ -169,33 +164,20 @@ def emprestimos_view(request):
 
 
 @login_required
+@nivel_acesso_minimo(2)
 def buscar_materiais(request):
     termo_nome = request.GET.get('nome', '').strip()
     termo_registro = request.GET.get('registro', '').strip()
 
-    materiais = Material.objects.annotate(
-        total_emprestados=Count('emprestimomaterial', filter=Q(
-            emprestimomaterial__emprestimo__isAtiva=True)),
-        quantidade_calculada=ExpressionWrapper(
-            F('quantidade_total') - F('quantidade_emprestada'),
-            output_field=IntegerField()
-        )
-    ).filter(
-        Q(registro__isnull=True, quantidade_calculada__gt=0) |
-        Q(registro__isnull=False, total_emprestados=0)
-    )
-
-    if termo_nome:
-        materiais = materiais.filter(nome__icontains=termo_nome)
-    if termo_registro:
-        materiais = materiais.filter(registro__icontains=termo_registro)
+    # Índice em memória, sincronizado pela VersaoInventario
+    materiais = indice_disponibilidade.buscar(termo_nome, termo_registro)
 
     resultados = [
         {
-            'id': mat.id,
-            'nome': mat.nome,
-            'registro': mat.registro if mat.registro else 'N/A',
-            'quantidade_disponivel': mat.quantidade_calculada if not mat.registro else 1
+            'id': mat['id'],
+            'nome': mat['nome'],
+            'registro': mat['registro'] if mat['registro'] else 'N/A',
+            'quantidade_disponivel': mat['disponivel']
         }
         for mat in materiais
     ]
@@ -203,12 +185,122 @@ def buscar_materiais(request):
     return JsonResponse(resultados, safe=False)
 
 
+@login_required
+@nivel_acesso_minimo(2)
+def buscar_material_registro(request):
+    """
+    Busca exata pelo registro (leitor de código), numa única consulta pelo
+    índice único de registro.
+    """
+    registro = request.GET.get('registro', '').strip()
+    material = Material.objects.filter(registro=registro).annotate(
+        emprestado=Exists(EmprestimoMaterial.objects.filter(
+            material=OuterRef('pk'), emprestimo__isAtiva=True))
+    ).values('id', 'nome', 'registro', 'emprestado').first() if registro else None
+
+    if material is None:
+        return JsonResponse(
+            {'erro': f"Registro '{registro}' não encontrado."}, status=404)
+
+    return JsonResponse({
+        'id': material['id'],
+        'nome': material['nome'],
+        'registro': material['registro'],
+        'disponivel': not material['emprestado'],
+    })
+
+
+# Resultados por tipo no resumo da busca global e por página no tipo escolhido
+RESULTADOS_POR_TIPO = 5
+RESULTADOS_POR_PAGINA = 20
+
+
+def _url_documento(tipo, objeto_id, titulo):
+    if tipo == TipoDocumento.CAUTELA:
+        return reverse('visualizar_emprestimo', args=[objeto_id])
+    if tipo == TipoDocumento.CLIENTE:
+        return reverse('visualizar_cliente', args=[objeto_id])
+    if tipo == TipoDocumento.MATERIAL:
+        return f"{reverse('listar_materiais')}?{urlencode({'busca': titulo})}"
+    if tipo == TipoDocumento.CASE:
+        return reverse('editar_case', args=[objeto_id])
+    return reverse('visualizar_pronto', args=[objeto_id])
+
+
+def _resultados(tipo, documentos):
+    return [
+        {'titulo': titulo, 'detalhe': detalhe,
+         'url': _url_documento(tipo, objeto_id, titulo)}
+        for objeto_id, titulo, detalhe in documentos
+    ]
+
+
+@login_required
+@nivel_acesso_minimo(2)
+def busca_global(request):
+    """
+    Busca em cautelas, clientes, materiais, cases e prontos pelo índice de
+    texto. Sem `tipo`, mostra os mais relevantes de cada grupo; com `tipo`,
+    pagina os resultados daquele grupo.
+    """
+    termo = request.GET.get('q', '').strip()
+    tipo = request.GET.get('tipo')
+    if tipo not in TipoDocumento.values:
+        tipo = None
+
+    grupos = []
+    pagina = {}
+    if termo and tipo:
+        try:
+            numero = max(int(request.GET.get('pagina', 1)), 1)
+        except ValueError:
+            numero = 1
+        # Um resultado a mais indica se há próxima página, sem COUNT(*)
+        documentos = buscar_documentos(
+            termo, tipo, RESULTADOS_POR_PAGINA + 1,
+            (numero - 1) * RESULTADOS_POR_PAGINA)
+        grupos.append({
+            'tipo': tipo,
+            'nome': TipoDocumento(tipo).label,
+            'resultados': _resultados(tipo, documentos[:RESULTADOS_POR_PAGINA]),
+            'mais': False,
+        })
+        parametros = {'q': termo, 'tipo': tipo}
+        if numero > 1:
+            pagina['url_anterior'] = f"?{urlencode({**parametros, 'pagina': numero - 1})}"
+        if len(documentos) > RESULTADOS_POR_PAGINA:
+            pagina['url_proxima'] = f"?{urlencode({**parametros, 'pagina': numero + 1})}"
+        pagina['url_primeira'] = f"?{urlencode(parametros)}"
+    elif termo:
+        for tipo_grupo, nome in TipoDocumento.choices:
+            documentos = buscar_documentos(termo, tipo_grupo, RESULTADOS_POR_TIPO + 1)
+            if documentos:
+                grupos.append({
+                    'tipo': tipo_grupo,
+                    'nome': nome,
+                    'resultados': _resultados(
+                        tipo_grupo, documentos[:RESULTADOS_POR_TIPO]),
+                    'mais': len(documentos) > RESULTADOS_POR_TIPO,
+                    'url_mais': f"?{urlencode({'q': termo, 'tipo': tipo_grupo})}",
+                })
+
+    return render(request, 'busca_global.html', {
+        'termo': termo,
+        'tipo': tipo,
+        'grupos': grupos,
+        'pagina': pagina,
+    })
+
+
 @login_required
 @nivel_acesso_minimo(2)
 def buscar_clientes(request):
     termo = request.GET.get('nome', '').strip()
 
-    clientes = Cliente.objects.filter(nome__icontains=termo, isAtivo=True)[:10]
+    # Busca sem acentos/maiúsculas, ordenada por relevância
+    clientes = filtrar_busca(
+        Cliente.objects.filter(isAtivo=True).only('id', 'nome'), termo
+    )[:LIMITE_RESULTADOS]
     resultados = [
         {'id': cliente.id, 'nome': cliente.nome}
         for cliente in clientes
@@ -222,7 +314,7 @@ def listar_emprestimos(request):
     filtro = request.GET.get('filtro', 'todos')
     busca_cliente = request.GET.get('busca_cliente', '')
 
-    emprestimos = Emprestimo.objects.all().order_by('-data_emprestimo')
+    emprestimos = Emprestimo.objects.select_related('cliente', 'operador__user')
 
     if filtro == 'ativas':
         emprestimos = emprestimos.filter(isAtiva=True)
@@ -233,24 +325,77 @@ def listar_emprestimos(request):
         emprestimos = emprestimos.filter(
             cliente__nome__icontains=busca_cliente)
 
+    pagina = paginar(request, emprestimos, ('-data_emprestimo', '-id'))
+
     return render(request, 'listar_emprestimos.html', {
-        'emprestimos': emprestimos,
+        'emprestimos': pagina,
+        'pagina': pagina,
         'filtro': filtro,
         'busca_cliente': busca_cliente,
     })
 
 
+@login_required
+@nivel_acesso_minimo(2)
+def exportar_emprestimos(request):
+    """
+    Exporta as cautelas com itens e todo o histórico de transições em CSV
+    ou XLSX, em fluxo: a resposta começa antes da consulta terminar e a
+    memória não cresce com o número de linhas.
+    """
+    formato = request.GET.get('formato', 'csv')
+    filtro = request.GET.get('filtro', 'todos')
+    busca_cliente = request.GET.get('busca_cliente', '').strip()
+    destino = request.GET.get('destino', '').strip()
+    try:
+        inicio, fim = intervalo_datas(
+            request.GET.get('data_inicio'), request.GET.get('data_fim'))
+    except ValueError:
+        messages.error(request, "Período inválido.")
+        return redirect('listar_emprestimos')
+
+    emprestimos = Emprestimo.objects.all()
+    if filtro == 'ativas':
+        emprestimos = emprestimos.filter(isAtiva=True)
+    elif filtro == 'inativas':
+        emprestimos = emprestimos.filter(isAtiva=False)
+    if busca_cliente:
+        emprestimos = emprestimos.filter(cliente__nome__icontains=busca_cliente)
+    if destino:
+        emprestimos = emprestimos.filter(destino__iexact=destino)
+    if inicio:
+        emprestimos = emprestimos.filter(data_emprestimo__gte=inicio)
+    if fim:
+        emprestimos = emprestimos.filter(data_emprestimo__lt=fim)
+
+    linhas = linhas_cautelas(emprestimos)
+    nome = f"cautelas-{timezone.localdate():%Y%m%d}"
+    if formato == 'xlsx':
+        resposta = StreamingHttpResponse(
+            gerar_xlsx(linhas),
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        resposta['Content-Disposition'] = f'attachment; filename="{nome}.xlsx"'
+    else:
+        resposta = StreamingHttpResponse(
+            gerar_csv(linhas), content_type='text/csv; charset=utf-8')
+        resposta['Content-Disposition'] = f'attachment; filename="{nome}.csv"'
+    return resposta
+
+
 # Visualizar Empréstimo
 @login_required
 @nivel_acesso_minimo(2)
 def visualizar_emprestimo(request, emprestimo_id):
-    emprestimo = get_object_or_404(Emprestimo, id=emprestimo_id)
-    historico = emprestimo.historico.all()
-    materiais = EmprestimoMaterial.objects.filter(emprestimo=emprestimo)
+    emprestimo = get_object_or_404(Emprestimo.objects.select_related(
+        'cliente', 'operador__user'), id=emprestimo_id)
+    historico = emprestimo.historico.select_related('operador__user')
+    materiais = EmprestimoMaterial.objects.filter(
+        emprestimo=emprestimo).select_related('material')
 
     if request.method == 'POST':
         acao = request.POST.get('acao')
         operador = request.user.operador
+        estava_ativa = emprestimo.isAtiva
 
         if acao == 'desativar' and emprestimo.isAtiva:
             emprestimo.isAtiva = False
@@ -264,15 +409,32 @@ def visualizar_emprestimo(request, emprestimo_id):
             emprestimo.isAtiva = False
             status = 'Cancelado'
 
-        emprestimo.save()
-        for item in materiais:
-            item.material.atualizar_quantidades()
-
-        EmprestimoHistorico.objects.create(
-            emprestimo=emprestimo,
-            status=status,
-            operador=operador
-        )
+        try:
+            with transaction.atomic():
+                if emprestimo.isAtiva != estava_ativa:
+                    if emprestimo.isAtiva:
+                        # Os itens podem ter saído em outra cautela enquanto
+                        # esta estava inativa
+                        validar_disponibilidade(
+                            (item.material_id, item.quantidade) for item in materiais)
+                    MovimentoEstoque.registrar(MovimentoEstoque.do_emprestimo(
+                        emprestimo,
+                        TipoMovimento.RETIRADA if emprestimo.isAtiva
+                        else TipoMovimento.DEVOLUCAO,
+                        materiais))
+                    InventarioSnapshot.aplicar_emprestimo(
+                        emprestimo, 1 if emprestimo.isAtiva else -1)
+
+                emprestimo.save(update_fields=['isAtiva'])
+
+                EmprestimoHistorico.objects.create(
+                    emprestimo=emprestimo,
+                    status=status,
+                    operador=operador
+                )
+        except ValueError as erro:
+            messages.error(request, f"Não foi possível reativar: {erro}")
+            return redirect('visualizar_emprestimo', emprestimo_id=emprestimo.id)
 
         messages.success(request, f'Empréstimo {status.lower()} com sucesso!')
         return redirect('visualizar_emprestimo', emprestimo_id=emprestimo.id)
@@ -290,8 +452,10 @@ def confirmar_exclusao_emprestimo(request, emprestimo_id):
     """
     Exibe a página de confirmação antes de excluir um empréstimo.
     """
-    emprestimo = get_object_or_404(Emprestimo, id=emprestimo_id)
-    materiais = EmprestimoMaterial.objects.filter(emprestimo=emprestimo)
+    emprestimo = get_object_or_404(
+        Emprestimo.objects.select_related('cliente'), id=emprestimo_id)
+    materiais = EmprestimoMaterial.objects.filter(
+        emprestimo=emprestimo).select_related('material')
 
     return render(request, 'confirmar_exclusao_emprestimo.html', {
         'emprestimo': emprestimo,
@@ -316,6 +480,50 @@ def excluir_emprestimo(request, emprestimo_id):
     return redirect('listar_emprestimos')
 
 
+@login_required
+@nivel_acesso_minimo(2)
+def devolver_emprestimos_lote(request):
+    """
+    Devolve de uma vez as cautelas selecionadas ou as que atendem ao filtro
+    de destino e período.
+    """
+    if request.method != 'POST':
+        messages.error(request, "Operação inválida.")
+        return redirect('listar_emprestimos')
+
+    ids = [int(i) for i in request.POST.getlist('emprestimos') if i.isdigit()]
+    destino = request.POST.get('destino', '').strip()
+    data_inicio = request.POST.get('data_inicio')
+    data_fim = request.POST.get('data_fim')
+
+    emprestimos = Emprestimo.objects.all()
+    if ids:
+        emprestimos = emprestimos.filter(id__in=ids)
+    elif destino or data_inicio or data_fim:
+        try:
+            inicio, fim = intervalo_datas(data_inicio, data_fim)
+        except ValueError:
+            messages.error(request, "Período inválido.")
+            return redirect('listar_emprestimos')
+        if destino:
+            emprestimos = emprestimos.filter(destino__iexact=destino)
+        if inicio:
+            emprestimos = emprestimos.filter(data_emprestimo__gte=inicio)
+        if fim:
+            emprestimos = emprestimos.filter(data_emprestimo__lt=fim)
+    else:
+        messages.error(request, "Nenhuma cautela selecionada.")
+        return redirect('listar_emprestimos')
+
+    devolvidas = devolver_emprestimos(emprestimos, request.user.operador)
+    if devolvidas:
+        messages.success(
+            request, f"{devolvidas} cautela(s) devolvida(s) com sucesso!")
+    else:
+        messages.warning(request, "Nenhuma cautela ativa encontrada.")
+    return redirect('listar_emprestimos')
+
+
 # ==============================
 # 📌 3. Operadores
 # ==============================
@@ -354,8 +562,9 @@ def cadastrar_operador(request):
 @login_required
 @nivel_acesso_minimo(3)
 def listar_operadores(request):
-    operadores = Operador.objects.all()
-    return render(request, 'listar_operadores.html', {'operadores': operadores})
+    pagina = paginar(request, Operador.objects.all(), ('nome', 'id'))
+    return render(request, 'listar_operadores.html', {
+        'operadores': pagina, 'pagina': pagina})
 
 
 @login_required
@@ -432,12 +641,15 @@ def listar_clientes(request):
 
     # Aplica os filtros apenas se os parâmetros não estiverem vazios
     if busca_nome:
-        clientes = clientes.filter(nome__icontains=busca_nome)
+        clientes = clientes.filter(nome_busca__contains=normalizar(busca_nome))
     if busca_om:
         clientes = clientes.filter(organizacao_militar__icontains=busca_om)
 
+    pagina = paginar(request, clientes, ('nome', 'id'))
+
     return render(request, 'listar_clientes.html', {
-        'clientes': clientes,
+        'clientes': pagina,
+        'pagina': pagina,
         'busca_nome': busca_nome,
         'busca_om': busca_om,
     })
@@ -521,28 +733,23 @@ def cadastrar_material(request):
 
         categoria = get_object_or_404(Categoria, id=categoria_id)
 
-        if registro:  # Material com registro único
-            Material.objects.create(
-                nome=nome,
-                categoria=categoria,
-                registro=registro,
-                quantidade_total=1,
-                quantidade_disponivel=1
-            )
-        else:  # Material sem registro
-            material, created = Material.objects.get_or_create(
-                nome=nome,
-                categoria=categoria,
-                registro=None,
-                defaults={
-                    'quantidade_total': int(quantidade),
-                    'quantidade_disponivel': int(quantidade)
-                }
-            )
-            if not created:
-                material.quantidade_total += int(quantidade)
-                material.quantidade_disponivel += int(quantidade)
-                material.save()
+        with transaction.atomic():
+            if registro:  # Material com registro único
+                material = Material.objects.create(
+                    nome=nome,
+                    categoria=categoria,
+                    registro=registro
+                )
+            else:  # Material sem registro
+                material, _ = Material.objects.get_or_create(
+                    nome=nome,
+                    categoria=categoria,
+                    registro=None
+                )
+
+            # Entrada no estoque registrada no livro de movimentos
+            registrar_entrada(material, quantidade)
+            recalcular_inventario([chave_inventario(material)])
 
         messages.success(request, 'Material cadastrado com sucesso!')
         return redirect('listar_materiais')
@@ -557,7 +764,8 @@ def listar_materiais(request):
     termo_busca = request.GET.get('busca', '')
 
     categorias = Categoria.objects.all()
-    materiais = Material.objects.all()
+    materiais = Material.objects.com_saldo().filter(
+        categoria__isnull=False).select_related('categoria')
 
     # Filtrar por categoria, se selecionada
     if categoria_id:
@@ -567,15 +775,16 @@ def listar_materiais(request):
     if termo_busca:
         materiais = materiais.filter(nome__icontains=termo_busca)
 
-    # Agrupar materiais por categoria
+    # Agrupar por categoria os materiais da página, já ordenados por ela
+    pagina = paginar(request, materiais, ('categoria_id', 'nome', 'id'))
     materiais_por_categoria = {}
-    for categoria in categorias:
-        materiais_categoria = materiais.filter(categoria=categoria)
-        if materiais_categoria.exists():
-            materiais_por_categoria[categoria.nome] = materiais_categoria
+    for material in pagina:
+        materiais_por_categoria.setdefault(
+            material.categoria.nome, []).append(material)
 
     return render(request, 'listar_materiais.html', {
         'materiais_por_categoria': materiais_por_categoria,
+        'pagina': pagina,
         'categorias': categorias,
         'categoria_selecionada': categoria_id,
         'termo_busca': termo_busca
@@ -585,8 +794,9 @@ def listar_materiais(request):
 @login_required
 @nivel_acesso_minimo(3)
 def editar_material(request, material_id):
-    material = get_object_or_404(Material, id=material_id)
+    material = get_object_or_404(Material.objects.com_saldo(), id=material_id)
     categorias = Categoria.objects.all()
+    chave_anterior = chave_inventario(material)
 
     if request.method == 'POST':
         nome = request.POST.get('nome')
@@ -613,26 +823,39 @@ def editar_material(request, material_id):
         material.registro = registro if registro else None
 
         if registro:  # Materiais com registro único
-            material.quantidade_total = 1
-            material.quantidade_disponivel = 1 if not EmprestimoMaterial.objects.filter(
+            total = 1
+            disponivel = 1 if not EmprestimoMaterial.objects.filter(
                 material=material, emprestimo__isAtiva=True).exists() else 0
-            material.quantidade_emprestada = 1 - material.quantidade_disponivel
+            emprestada = 1 - disponivel
         else:  # Materiais sem registro
             try:
                 quantidade = int(quantidade) if quantidade else 0
             except ValueError:
                 quantidade = 0
 
-            diferenca = quantidade - material.quantidade_total
-            material.quantidade_total = quantidade
-            material.quantidade_disponivel += diferenca
+            total = quantidade
+            disponivel = material.saldo_disponivel + \
+                quantidade - material.saldo_total
+            emprestada = material.saldo_emprestada
 
-            if material.quantidade_disponivel < 0:
+            if disponivel < 0:
                 messages.error(
                     request, 'A quantidade disponível não pode ser negativa.')
                 return redirect('editar_material', material_id=material.id)
 
-        material.save()
+        with transaction.atomic():
+            material.save(
+                update_fields=['nome', 'nome_busca', 'categoria', 'registro'])
+
+            # Diferença de saldo registrada como ajuste
+            MovimentoEstoque.registrar([MovimentoEstoque(
+                material=material,
+                tipo=TipoMovimento.AJUSTE,
+                quantidade_total=total - material.saldo_total,
+                quantidade_disponivel=disponivel - material.saldo_disponivel,
+                quantidade_emprestada=emprestada - material.saldo_emprestada
+            )])
+            recalcular_inventario([chave_anterior, chave_inventario(material)])
         messages.success(request, 'Material atualizado com sucesso!')
         return redirect('listar_materiais')
 
@@ -646,7 +869,9 @@ def editar_material(request, material_id):
 @nivel_acesso_minimo(3)
 def excluir_material(request, material_id):
     material = get_object_or_404(Material, id=material_id)
+    chave = chave_inventario(material)
     material.delete()
+    recalcular_inventario([chave])
     messages.success(request, 'Material excluído com sucesso!')
     return redirect('listar_materiais')
 
@@ -658,73 +883,12 @@ def excluir_material(request, material_id):
 @login_required
 @nivel_acesso_minimo(1)
 def pronto_armamento(request):
-    cases = Case.objects.all()
-    categorias = Categoria.objects.all()
-    categorias_materiais = []
-
-    for categoria in categorias:
-        # Obter materiais da categoria
-        materiais = Material.objects.filter(categoria=categoria).annotate(
-            # Total de registros para itens únicos ou quantidade
-            total_existente=Count('id'),
-            total_na_reserva=Count('id', filter=~Q(
-                emprestimomaterial__emprestimo__isAtiva=True)),
-            total_emprestados=Count('id', filter=Q(
-                emprestimomaterial__emprestimo__isAtiva=True))
-        ).order_by('nome')
-
-        # Organizar destinos
-        destinos = {}
-        emprestimos = EmprestimoMaterial.objects.filter(
-            emprestimo__isAtiva=True,
-            material__categoria=categoria
-        ).select_related('emprestimo')
-
-        for emprestimo in emprestimos:
-            nome_material = emprestimo.material.nome
-            destino = emprestimo.emprestimo.destino
-
-            if nome_material not in destinos:
-                destinos[nome_material] = {}
-
-            if destino not in destinos[nome_material]:
-                destinos[nome_material][destino] = 0
-
-            destinos[nome_material][destino] += emprestimo.quantidade
-
-        # Agregar materiais
-        materiais_agregados = {}
-        for material in materiais:
-            nome = material.nome
-            if nome not in materiais_agregados:
-                materiais_agregados[nome] = {
-                    'nome': nome,
-                    'total_existente': 0,
-                    'total_na_reserva': 0,
-                    'total_emprestados': 0,
-                    'destinos': destinos.get(nome, {})
-                }
-
-            if material.registro:
-                # Materiais com registro único
-                materiais_agregados[nome]['total_existente'] += 1
-                materiais_agregados[nome]['total_emprestados'] += 1 if EmprestimoMaterial.objects.filter(
-                    material=material, emprestimo__isAtiva=True).exists() else 0
-                materiais_agregados[nome]['total_na_reserva'] += 0 if EmprestimoMaterial.objects.filter(
-                    material=material, emprestimo__isAtiva=True).exists() else 1
-            else:
-                # Materiais sem registro (com quantidade)
-                materiais_agregados[nome]['total_existente'] += material.quantidade_total
-                materiais_agregados[nome]['total_na_reserva'] += material.quantidade_disponivel
-                materiais_agregados[nome]['total_emprestados'] += material.quantidade_emprestada
-
-        categorias_materiais.append({
-            'categoria': categoria.nome,
-            'materiais': materiais_agregados.values()
-        })
+    versao, dados = obter_pronto_armamento()
 
     return render(request, 'pronto_armamento.html', {
-        'categorias_materiais': categorias_materiais, 'cases': cases
+        'categorias_materiais': dados['categorias_materiais'],
+        'cases': dados['cases'],
+        'versao_inventario': versao,
     })
 
 
@@ -732,9 +896,12 @@ def pronto_armamento(request):
 @nivel_acesso_minimo(1)
 def listar_prontos(request):
     hoje = timezone.now()
-    prontos = ProntoArmamento.objects.filter(
-        data__year=hoje.year,
-        data__month=hoje.month
+    inicio, fim = intervalo_mes(hoje.year, hoje.month)
+    prontos = ProntoArmamento.objects.only(
+        *ProntoArmamento.CAMPOS_LISTAGEM
+    ).filter(
+        data__gte=inicio,
+        data__lt=fim
     ).order_by('-data')
     return render(request, 'listar_prontos.html', {
         'prontos': prontos,
@@ -745,18 +912,36 @@ def listar_prontos(request):
 @login_required
 @nivel_acesso_minimo(1)
 def visualizar_pronto(request, pronto_id):
-    pronto = get_object_or_404(ProntoArmamento, id=pronto_id)
+    pronto = get_object_or_404(
+        ProntoArmamento.objects.only('id', 'numero', 'data'), id=pronto_id)
 
-    if 'HTTP_REFERER' in request.META:
-        voltar_url = request.META['HTTP_REFERER']
-    else:
-        # Fallback para a página inicial caso não haja referência anterior.
-        voltar_url = '/'
+    # Mensagens pendentes tornam a página única; renderiza sem cache
+    if len(messages.get_messages(request)):
+        return render(request, 'visualizar_pronto.html', {
+            'pronto': get_object_or_404(ProntoArmamento, id=pronto_id),
+        })
 
-    return render(request, 'visualizar_pronto.html', {
-        'pronto': pronto,
-        'voltar_url': voltar_url,
-    })
+    variante = 'excluir' if request.user.operador.nivel_acesso == 3 else 'leitura'
+    codificacao = escolher_codificacao(request)
+
+    # Prontos não mudam depois de gerados: validadores fortes por pronto
+    etag = f'"pronto-{pronto.id}-{pronto.numero}-{variante}-{codificacao}"'
+    ultima_modificacao = timegm(datetime.combine(pronto.data, time.min).timetuple())
+
+    resposta = get_conditional_response(
+        request, etag=etag, last_modified=ultima_modificacao)
+    if resposta is None:
+        corpos = obter_pronto_renderizado(request, pronto, variante)
+        resposta = HttpResponse(corpos[codificacao])
+        if codificacao != 'identity':
+            resposta['Content-Encoding'] = codificacao
+        resposta['Content-Length'] = len(corpos[codificacao])
+
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(ultima_modificacao)
+    patch_vary_headers(resposta, ('Accept-Encoding', 'Cookie'))
+    patch_cache_control(resposta, private=True, no_cache=True)
+    return resposta
 
 
 # Gerar pronto
@@ -764,19 +949,8 @@ def visualizar_pronto(request, pronto_id):
 @nivel_acesso_minimo(2)
 def gerar_pronto(request):
     if request.method == 'POST':
-        # Captura o HTML completo enviado pelo frontend
-        html_conteudo = request.POST.get('html_conteudo')
-
-        # Usar BeautifulSoup para extrair a div inteira
-        soup = BeautifulSoup(html_conteudo, 'html.parser')
-        conteudo_salvo = soup.find(
-            id="conteudo_salvo")  # Captura a div pelo ID
-
-        if conteudo_salvo:
-            # Converte o conteúdo da div para string HTML
-            conteudo_html = str(conteudo_salvo)
-        else:
-            conteudo_html = ""
+        # Snapshot montado no servidor a partir do inventário atual
+        dados = montar_dados_pronto()
 
         # Garantir número único
         ultimo_numero = ProntoArmamento.objects.aggregate(
@@ -808,7 +982,7 @@ def gerar_pronto(request):
                 funcao_2=funcao_2,
                 assinante_3=assinante_3,
                 funcao_3=funcao_3,
-                tabela=conteudo_html,
+                dados=dados,
             )
             messages.success(request, f"Pronto Nº {numero} gerado com sucesso!")
         except IntegrityError:
@@ -818,71 +992,13 @@ def gerar_pronto(request):
         return redirect('listar_prontos')
 
     hoje = timezone.now().strftime('%d de %B de %Y')
-    cases = Case.objects.all()
-    categorias = Categoria.objects.all()
     assinantes = Assinante.objects.all()
     funcoes = FuncaoAssinante.objects.all()
-
-    categorias_materiais = []
-    for categoria in categorias:
-        # Obter materiais da categoria
-        materiais = Material.objects.filter(categoria=categoria).annotate(
-            total_existente=Count('id'),
-            total_na_reserva=Count('id', filter=~Q(
-                emprestimomaterial__emprestimo__isAtiva=True)),
-            total_emprestados=Count('id', filter=Q(
-                emprestimomaterial__emprestimo__isAtiva=True))
-        ).order_by('nome')
-
-        destinos = {}
-        emprestimos = EmprestimoMaterial.objects.filter(
-            emprestimo__isAtiva=True,
-            material__categoria=categoria
-        ).select_related('emprestimo')
-
-        for emprestimo in emprestimos:
-            nome_material = emprestimo.material.nome
-            destino = emprestimo.emprestimo.destino
-
-            if nome_material not in destinos:
-                destinos[nome_material] = {}
-
-            if destino not in destinos[nome_material]:
-                destinos[nome_material][destino] = 0
-
-            destinos[nome_material][destino] += emprestimo.quantidade
-
-        materiais_agregados = {}
-        for material in materiais:
-            nome = material.nome
-            if nome not in materiais_agregados:
-                materiais_agregados[nome] = {
-                    'nome': nome,
-                    'total_existente': 0,
-                    'total_na_reserva': 0,
-                    'total_emprestados': 0,
-                    'destinos': destinos.get(nome, {})
-                }
-
-            if material.registro:
-                materiais_agregados[nome]['total_existente'] += 1
-                materiais_agregados[nome]['total_emprestados'] += 1 if EmprestimoMaterial.objects.filter(
-                    material=material, emprestimo__isAtiva=True).exists() else 0
-                materiais_agregados[nome]['total_na_reserva'] += 0 if EmprestimoMaterial.objects.filter(
-                    material=material, emprestimo__isAtiva=True).exists() else 1
-            else:
-                materiais_agregados[nome]['total_existente'] += material.quantidade_total
-                materiais_agregados[nome]['total_na_reserva'] += material.quantidade_disponivel
-                materiais_agregados[nome]['total_emprestados'] += material.quantidade_emprestada
-
-        categorias_materiais.append({
-            'categoria': categoria.nome,
-            'materiais': materiais_agregados.values()
-        })
+    _, dados = obter_pronto_armamento()
 
     return render(request, 'gerar_pronto.html', {
-        'categorias_materiais': categorias_materiais,
-        'cases': cases,
+        'categorias_materiais': dados['categorias_materiais'],
+        'cases': dados['cases'],
         'hoje': hoje,
         'assinantes': assinantes,
         'funcoes': funcoes,
@@ -892,9 +1008,12 @@ def gerar_pronto(request):
 @login_required
 @nivel_acesso_minimo(3)  # Somente nível 3 pode excluir
 def excluir_pronto(request, pronto_id):
-    pronto = get_object_or_404(ProntoArmamento, id=pronto_id)
+    pronto = get_object_or_404(
+        ProntoArmamento.objects.only(*ProntoArmamento.CAMPOS_LISTAGEM),
+        id=pronto_id)
     if request.method == 'POST':
         pronto.delete()
+        invalidar_pronto_renderizado(pronto)
         messages.success(request, f"Pronto Nº {pronto.numero} excluído com sucesso!")
         return redirect('listar_prontos')
     return render(request, 'confirmar_exclusao_pronto.html', {'pronto': pronto})
@@ -903,10 +1022,9 @@ def excluir_pronto(request, pronto_id):
 @login_required
 @nivel_acesso_minimo(1)
 def listar_prontos_anteriores(request):
-    anos = (ProntoArmamento.objects
-            .annotate(ano=ExtractYear('data'))
+    anos = (ProntoResumoMensal.objects
             .values('ano')
-            .annotate(total=Count('id'))
+            .annotate(total=Sum('total'))
             .order_by('-ano'))
     return render(request, 'listar_prontos_anteriores.html', {
         'anos': anos,
@@ -917,11 +1035,9 @@ def listar_prontos_anteriores(request):
 @login_required
 @nivel_acesso_minimo(1)
 def listar_prontos_meses(request, ano):
-    meses = (ProntoArmamento.objects
-             .filter(data__year=ano)
-             .annotate(mes=ExtractMonth('data'))
-             .values('mes')
-             .annotate(total=Count('id'))
+    meses = (ProntoResumoMensal.objects
+             .filter(ano=ano)
+             .values('mes', 'total')
              .order_by('mes'))
 
     # Adicionar o nome do mês ao resultado
@@ -938,9 +1054,12 @@ def listar_prontos_meses(request, ano):
 @login_required
 @nivel_acesso_minimo(1)
 def listar_prontos_mes(request, ano, mes):
-    prontos = ProntoArmamento.objects.filter(
-        data__year=ano,
-        data__month=mes
+    inicio, fim = intervalo_mes(ano, mes)
+    prontos = ProntoArmamento.objects.only(
+        *ProntoArmamento.CAMPOS_LISTAGEM
+    ).filter(
+        data__gte=inicio,
+        data__lt=fim
     ).order_by('-data')
     mes_nome = month_name[int(mes)]
     return render(request, 'listar_prontos.html', {
@@ -1071,7 +1190,10 @@ def listar_cases(request):
             Q(lacre__icontains=termo_busca)
         )
 
-    return render(request, 'listar_cases.html', {'cases': cases, 'termo_busca': termo_busca})
+    pagina = paginar(request, cases, ('descricao', 'id'))
+
+    return render(request, 'listar_cases.html', {
+        'cases': pagina, 'pagina': pagina, 'termo_busca': termo_busca})
 
 
 @login_required
@@ -1112,14 +1234,15 @@ def excluir_case(request, case_id):
 
 
 @login_required
-@nivel_acesso_minimo(2)
+@nivel_acesso_minimo(3)
 def listar_assinantes(request):
-    assinantes = Assinante.objects.all()
-    return render(request, 'listar_assinantes.html', {'assinantes': assinantes})
+    pagina = paginar(request, Assinante.objects.all(), ('nome', 'id'))
+    return render(request, 'listar_assinantes.html', {
+        'assinantes': pagina, 'pagina': pagina})
 
 
 @login_required
-@nivel_acesso_minimo(2)
+@nivel_acesso_minimo(3)
 def cadastrar_assinante(request):
     if request.method == 'POST':
         nome = request.POST.get('nome')
@@ -1130,7 +1253,7 @@ def cadastrar_assinante(request):
 
 
 @login_required
-@nivel_acesso_minimo(2)
+@nivel_acesso_minimo(3)
 def editar_assinante(request, assinante_id):
     assinante = get_object_or_404(Assinante, id=assinante_id)
     if request.method == 'POST':
@@ -1151,14 +1274,15 @@ def excluir_assinante(request, assinante_id):
 
 
 @login_required
-@nivel_acesso_minimo(2)
+@nivel_acesso_minimo(3)
 def listar_funcoes(request):
-    funcoes = FuncaoAssinante.objects.all()
-    return render(request, 'listar_funcoes.html', {'funcoes': funcoes})
+    pagina = paginar(request, FuncaoAssinante.objects.all(), ('nome', 'id'))
+    return render(request, 'listar_funcoes.html', {
+        'funcoes': pagina, 'pagina': pagina})
 
 
 @login_required
-@nivel_acesso_minimo(2)
+@nivel_acesso_minimo(3)
 def cadastrar_funcao(request):
     if request.method == 'POST':
         nome = request.POST.get('nome')
@@ -1169,7 +1293,7 @@ def cadastrar_funcao(request):
 
 
 @login_required
-@nivel_acesso_minimo(2)
+@nivel_acesso_minimo(3)
 def editar_funcao(request, funcao_id):
     funcao = get_object_or_404(FuncaoAssinante, id=funcao_id)
     if request.method == 'POST':
@@ -1187,3 +1311,48 @@ def excluir_funcao(request, funcao_id):
     funcao.delete()
     messages.success(request, 'Função excluída com sucesso!')
     return redirect('listar_funcoes')
+
+
+# ==============================
+# 📌 10. Arquivos de Mídia
+# ==============================
+
+@login_required
+@nivel_acesso_minimo(2)
+def servir_media(request, caminho):
+    """
+    Entrega fotos e identidades só para operadores autorizados. Com proxy
+    configurado (MEDIA_ENTREGA) o Django apenas autoriza e o proxy envia o
+    arquivo; sem ele, responde com FileResponse em blocos e validadores.
+    """
+    try:
+        arquivo = safe_join(settings.MEDIA_ROOT, caminho)
+        estado = os.stat(arquivo)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("Arquivo não encontrado.")
+    if not stat.S_ISREG(estado.st_mode):
+        raise Http404("Arquivo não encontrado.")
+
+    # Arquivos de mídia são imutáveis na prática: mtime + tamanho bastam
+    etag = f'"{estado.st_mtime_ns:x}-{estado.st_size:x}"'
+    ultima_modificacao = int(estado.st_mtime)
+
+    resposta = get_conditional_response(
+        request, etag=etag, last_modified=ultima_modificacao)
+    if resposta is None:
+        tipo, _ = mimetypes.guess_type(arquivo)
+        if settings.MEDIA_ENTREGA == 'nginx':
+            resposta = HttpResponse(content_type=tipo)
+            resposta['X-Accel-Redirect'] = (
+                settings.MEDIA_PREFIXO_INTERNO.rstrip('/') + '/' +
+                quote(caminho.replace(os.sep, '/')))
+        elif settings.MEDIA_ENTREGA == 'sendfile':
+            resposta = HttpResponse(content_type=tipo)
+            resposta['X-Sendfile'] = arquivo
+        else:
+            resposta = FileResponse(open(arquivo, 'rb'), content_type=tipo)
+
+    resposta['ETag'] = etag
+    resposta['Last-Modified'] = http_date(ultima_modificacao)
+    patch_cache_control(resposta, private=True, max_age=3600)
+    return resposta
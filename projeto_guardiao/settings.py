@@ -40,6 +40,16 @@ LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'listar_emprestimos'
 LOGOUT_REDIRECT_URL = 'login'
 
+# Carrega o usuário já com o operador (nível de acesso) numa só consulta.
+# As sessões abertas com o ModelBackend são migradas pela 0013 do guardiao.
+AUTHENTICATION_BACKENDS = ['guardiao.backends.OperadorBackend']
+
+# Segundos em que usuário + operador ficam no cache local de cada worker,
+# dispensando a consulta por requisição (0 desativa). A edição/exclusão do
+# operador invalida o cache do worker que a atendeu; nos demais a mudança
+# vale ao fim deste prazo, então mantenha-o curto.
+OPERADOR_CACHE_TTL = config('OPERADOR_CACHE_TTL', default=0, cast=int)
+
 # =====================================
 # 🚀 APLICAÇÕES INSTALADAS
 # =====================================
@@ -106,6 +116,19 @@ DATABASES = {
     'default': dj_database_url.config(default=config('DATABASE_URL'))
 }
 
+# =====================================
+# 🚀 CACHE
+# =====================================
+
+# Cache local por worker; as chaves do Pronto incluem a VersaoInventario
+# gravada no banco, então todos os workers enxergam a invalidação.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'guardiao',
+    }
+}
+
 # =====================================
 # 🚀 VALIDAÇÃO DE SENHAS
 # =====================================
@@ -147,6 +170,13 @@ STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Entrega da mídia depois da checagem de acesso feita pelo Django:
+#   ''        -> o próprio Django envia o arquivo (desenvolvimento)
+#   'nginx'   -> X-Accel-Redirect para MEDIA_PREFIXO_INTERNO (location internal)
+#   'sendfile'-> X-Sendfile com o caminho absoluto (Apache/lighttpd)
+MEDIA_ENTREGA = config('MEDIA_ENTREGA', default='')
+MEDIA_PREFIXO_INTERNO = config('MEDIA_PREFIXO_INTERNO', default='/media-interna/')
+
 # =====================================
 # 🚀 PADRÃO PARA CHAVES PRIMÁRIAS
 # =====================================
@@ -1,12 +1,16 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+
+from guardiao.views import servir_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    # Mídia passa pela checagem de acesso (fotos e identidades)
+    path(f"{settings.MEDIA_URL.lstrip('/')}<path:caminho>",
+         servir_media, name='servir_media'),
     path('', include('guardiao.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+]
 
 from django.http import JsonResponse
 
@@ -34,6 +38,3 @@ def debug_view(request):
 urlpatterns += [
     path('debug/', debug_view),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file